@@ -1,10 +1,26 @@
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from api.sessionPool import MCPSessionPool
+from config.env import EnvConfig
+
+env = EnvConfig()
+
+MCP_SERVER_NAME = "chatbot-server"
+MCP_CONNECTION = {
+     "transport": "streamable_http",
+     "url": env.get("MCP_URL", "http://127.0.0.1:8000/mcp"),
+}
 
 client = MultiServerMCPClient(
         {
-             "chatbot-server": {
-             "transport": "streamable_http",
-             "url": "http://127.0.0.1:8000/mcp",
-        }
+             MCP_SERVER_NAME: MCP_CONNECTION
    }
-)
\ No newline at end of file
+)
+
+# Sesiones MCP persistentes compartidas por todas las llamadas a herramientas del agente
+mcp_pool = MCPSessionPool(
+     MCP_CONNECTION,
+     size=int(env.get("MCP_POOL_SIZE", 4)),
+     keepalive_interval=float(env.get("MCP_KEEPALIVE_SECONDS", 30)),
+     acquire_timeout=float(env.get("MCP_ACQUIRE_TIMEOUT_SECONDS", 30)),
+     server_name=MCP_SERVER_NAME,
+)
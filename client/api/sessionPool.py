@@ -0,0 +1,181 @@
+from langchain_mcp_adapters.sessions import Connection, create_session
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+import asyncio
+
+# Código con el que el cliente streamable HTTP informa un 404 del servidor
+# (sesión desconocida, p. ej. tras reiniciarlo); mcp no lo exporta como constante
+SESSION_TERMINATED = 32600
+
+
+def _connection_lost(error: McpError) -> bool:
+    """McpError que en realidad es una falla de transporte y no un error de la herramienta."""
+    return getattr(error, "error", None) is not None and error.error.code in (CONNECTION_CLOSED, SESSION_TERMINATED)
+
+
+class _Slot:
+    """Una sesión MCP del pool y el estado de la tarea que la mantiene abierta."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session = None
+        # Cambia en cada reconexión: invalida las entradas viejas de la cola
+        self.generation = 0
+        self.in_use = False
+        self.broken = asyncio.Event()
+
+
+class MCPSessionPool:
+    """
+    Pool de sesiones MCP persistentes (streamable HTTP) para las herramientas del agente.
+
+    langchain_mcp_adapters, sin sesión explícita, abre e inicializa una sesión
+    nueva en cada llamada a una herramienta. Acá se mantienen 'size' sesiones
+    abiertas, cada una con su tarea dueña (los context managers de anyio deben
+    cerrarse en la misma tarea que los abrió), que:
+      - envía un ping cada 'keepalive_interval' segundos si la sesión está libre,
+      - reconecta con backoff exponencial si la sesión se cae.
+    Cada llamada toma una sesión libre (como mucho 'size' llamadas simultáneas)
+    y la devuelve al terminar.
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        size: int = 4,
+        keepalive_interval: float = 30,
+        acquire_timeout: float = 30,
+        reconnect_delay: float = 1,
+        max_reconnect_delay: float = 30,
+        server_name: str = "chatbot-server",
+    ):
+        self.connection = connection
+        self.size = size
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.server_name = server_name
+        self._slots = [_Slot(i) for i in range(size)]
+        self._idle: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._closing = False
+        self._idle = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._run_slot(slot)) for slot in self._slots]
+
+    async def _run_slot(self, slot: _Slot):
+        delay = self.reconnect_delay
+        while not self._closing:
+            try:
+                async with create_session(self.connection) as session:
+                    await session.initialize()
+                    slot.session = session
+                    slot.generation += 1
+                    slot.broken.clear()
+                    delay = self.reconnect_delay
+                    self._idle.put_nowait((slot, slot.generation))
+
+                    while not self._closing:
+                        try:
+                            await asyncio.wait_for(slot.broken.wait(), timeout=self.keepalive_interval)
+                            break
+                        except asyncio.TimeoutError:
+                            if not slot.in_use:
+                                await asyncio.wait_for(session.send_ping(), timeout=self.keepalive_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[mcp-pool] sesión {slot.index} caída: {e}")
+            finally:
+                slot.session = None
+                slot.generation += 1
+
+            if not self._closing:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    @asynccontextmanager
+    async def session(self):
+        """Toma una sesión libre del pool (espera hasta 'acquire_timeout')."""
+        await self.start()
+        while True:
+            slot, generation = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+            # Se descartan entradas de sesiones que se reconectaron o cayeron
+            if slot.generation == generation and slot.session is not None:
+                break
+
+        slot.in_use = True
+        try:
+            yield slot.session
+        except McpError as error:
+            # Error del protocolo/herramienta: la conexión sigue sana, salvo que sea de transporte
+            if _connection_lost(error):
+                slot.broken.set()
+            raise
+        except Exception:
+            slot.broken.set()
+            raise
+        finally:
+            slot.in_use = False
+            if slot.generation == generation and not slot.broken.is_set():
+                self._idle.put_nowait((slot, generation))
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], progress_callback=None):
+        """
+        Ejecuta una herramienta en una sesión del pool. Si la conexión falla,
+        reintenta una vez en otra sesión (las herramientas son consultas de sólo lectura).
+        """
+        for attempt in range(2):
+            try:
+                async with self.session() as session:
+                    return await session.call_tool(name, arguments, progress_callback=progress_callback)
+            except McpError as e:
+                if attempt == 1 or not _connection_lost(e):
+                    raise
+                print(f"[mcp-pool] reintentando {name} tras error de conexión: {e}")
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                if attempt == 1:
+                    raise
+                print(f"[mcp-pool] reintentando {name} tras error de conexión: {e}")
+
+    async def get_tools(self) -> list:
+        """Herramientas LangChain cuyas llamadas usan las sesiones del pool."""
+        tools, cursor = [], None
+        async with self.session() as session:
+            while True:
+                page = await session.list_tools(cursor=cursor)
+                tools.extend(page.tools)
+                cursor = page.nextCursor
+                if not cursor:
+                    break
+        # El pool expone call_tool igual que ClientSession: cada llamada toma su propia sesión
+        return [convert_mcp_tool_to_langchain_tool(self, tool, server_name=self.server_name) for tool in tools]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "connected": sum(1 for slot in self._slots if slot.session is not None),
+            "in_use": sum(1 for slot in self._slots if slot.in_use),
+        }
+
+    async def close(self):
+        self._closing = True
+        for slot in self._slots:
+            slot.broken.set()
+        if self._tasks:
+            # Cada tarea cierra su sesión; si alguna no responde se cancela
+            _, pending = await asyncio.wait(self._tasks, timeout=5)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
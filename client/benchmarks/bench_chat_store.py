@@ -0,0 +1,94 @@
+"""
+Benchmark de carga del almacenamiento de chat (chat_memory).
+
+Simula N sesiones concurrentes que, en cada turno, guardan un mensaje y
+leen el historial completo (lo mismo que hace ModelController.create_new_chat).
+Compara el camino anterior (PyMongo síncrono dentro de corutinas, que bloquea
+el event loop) con el actual (Motor, ModelService).
+
+Uso (desde la carpeta client/):
+    python -m benchmarks.bench_chat_store --sessions 50 --turns 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from pymongo import MongoClient
+
+from config.env import EnvConfig
+from services.modelService import ModelService
+from validations.chatData import ChatData, ChatMessage
+from helpers.stats import percentile
+
+BENCH_COLLECTION = "chat_memory_bench"
+
+
+class SyncChatStore:
+    """Reproduce el ModelService anterior, basado en PyMongo síncrono."""
+
+    def __init__(self):
+        client = MongoClient(EnvConfig().get("MONGO_URL"))
+        self.collectionChat = client.get_database('competition_manager')[BENCH_COLLECTION]
+
+    async def save_chat(self, chat_data: ChatData):
+        self.collectionChat.update_one(
+            {"user_id": chat_data.user_id, "id_session": chat_data.id_session},
+            {"$push": {"messages": {"$each": [m.dict() for m in chat_data.messages]}}},
+            upsert=True
+        )
+
+    async def get_messages_by_session_id(self, id_session: str):
+        doc = self.collectionChat.find_one({"id_session": id_session}, {"messages": 1, "_id": 0})
+        return [ChatMessage(**m) for m in doc["messages"]] if doc else []
+
+
+async def run_session(store, turns: int, latencies: list):
+    session_id = f"bench-{uuid.uuid4()}"
+    for turn in range(turns):
+        chat_data = ChatData(
+            id_session=session_id,
+            user_id="bench-user",
+            messages=[ChatMessage(types="user", message=f"mensaje de prueba {turn}")]
+        )
+        start = time.perf_counter()
+        await store.save_chat(chat_data)
+        await store.get_messages_by_session_id(session_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_scenario(name: str, store, sessions: int, turns: int):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(store, turns, latencies) for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<8} turnos={len(latencies):>6}  "
+        f"p50={statistics.median(latencies):8.2f} ms  "
+        f"p99={percentile(latencies, 99):8.2f} ms  "
+        f"throughput={len(latencies) / elapsed:8.1f} turnos/s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    async_store = ModelService(f"{BENCH_COLLECTION}_sessions", f"{BENCH_COLLECTION}_pages")
+    await async_store.ensure_indexes()
+    sync_store = SyncChatStore()
+
+    try:
+        await run_scenario("pymongo", sync_store, args.sessions, args.turns)
+        await run_scenario("motor", async_store, args.sessions, args.turns)
+    finally:
+        await async_store.collectionSessions.drop()
+        await async_store.collectionPages.drop()
+        await sync_store.collectionChat.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Benchmark del costo por llamada a herramienta MCP desde el cliente.
+
+Compara las herramientas de MultiServerMCPClient.get_tools() (abren e
+inicializan una sesión streamable HTTP por llamada) con las del pool de
+sesiones persistentes (api.client.mcp_pool), en serie y con concurrencia.
+
+Requiere el servidor MCP levantado (desde server/: python main.py).
+
+Uso (desde la carpeta client/):
+    python -m benchmarks.bench_mcp_session --calls 200 --concurrency 8 --tool total_usuarios
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from api.client import client, mcp_pool
+from helpers.stats import percentile
+
+
+async def run_scenario(name: str, tool, calls: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_call():
+        async with semaphore:
+            start = time.perf_counter()
+            await tool.ainvoke({})
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<22} llamadas={calls:>5}  "
+        f"media={statistics.mean(latencies):8.2f} ms  "
+        f"p50={statistics.median(latencies):8.2f} ms  "
+        f"p99={percentile(latencies, 99):8.2f} ms  "
+        f"throughput={calls / elapsed:8.1f} llamadas/s"
+    )
+
+
+def find_tool(tools, name):
+    for tool in tools:
+        if tool.name == name:
+            return tool
+    raise SystemExit(f"El servidor no expone la herramienta '{name}'")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tool", default="total_usuarios", help="herramienta barata y sin argumentos")
+    args = parser.parse_args()
+
+    per_call_tool = find_tool(await client.get_tools(), args.tool)
+    pooled_tool = find_tool(await mcp_pool.get_tools(), args.tool)
+
+    try:
+        for concurrency in (1, args.concurrency):
+            await run_scenario(f"sesión por llamada x{concurrency}", per_call_tool, args.calls, concurrency)
+            await run_scenario(f"pool ({mcp_pool.size}) x{concurrency}", pooled_tool, args.calls, concurrency)
+    finally:
+        await mcp_pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
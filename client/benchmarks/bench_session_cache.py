@@ -0,0 +1,72 @@
+"""
+Benchmark del caché de sesiones (services.sessionCache) contra Mongo.
+
+Simula N sesiones concurrentes con historiales largos: cada turno agrega el
+mensaje del usuario (append_and_read) y vuelve a leer el contexto
+(get_session_context, el camino de las sesiones sin 'recent' y de las
+lecturas de otros endpoints). Compara el caché apagado con los modos
+'local' y 'versioned'.
+
+Uso (desde la carpeta client/):
+    python -m benchmarks.bench_session_cache --sessions 50 --turns 20 --history 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from services.modelService import ModelService
+from services.sessionCache import MODES, SessionCache
+from validations.chatData import ChatData, ChatMessage
+from helpers.stats import percentile
+
+BENCH_COLLECTION = "chat_cache_bench"
+
+
+def chat(session_id: str, types: str, text: str) -> ChatData:
+    return ChatData(id_session=session_id, user_id="bench-user", messages=[ChatMessage(types=types, message=text)])
+
+
+async def run_session(store, history: int, turns: int, latencies: list):
+    session_id = f"bench-{uuid.uuid4()}"
+    # Historial previo escrito sin pasar por el caché
+    for i in range(history):
+        await store.save_chat(chat(session_id, "user" if i % 2 == 0 else "ai", f"mensaje histórico {i} " * 10))
+    store.cache.invalidate(session_id)
+
+    for turn in range(turns):
+        start = time.perf_counter()
+        _, pages = await store.append_and_read(chat(session_id, "user", f"pregunta {turn}"))
+        await pages
+        await store.get_session_context(session_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await store.save_chat(chat(session_id, "ai", f"respuesta {turn} " * 20))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--history", type=int, default=200, help="mensajes previos por sesión")
+    args = parser.parse_args()
+
+    for mode in MODES:
+        store = ModelService(f"{BENCH_COLLECTION}_sessions", f"{BENCH_COLLECTION}_pages", cache=SessionCache(mode=mode))
+        await store.ensure_indexes()
+        latencies = []
+        try:
+            await asyncio.gather(*(run_session(store, args.history, args.turns, latencies) for _ in range(args.sessions)))
+        finally:
+            await store.collectionSessions.drop()
+            await store.collectionPages.drop()
+        stats = store.cache.stats()
+        print(
+            f"{mode:<10} turnos={len(latencies):>6}  "
+            f"p50={statistics.median(latencies):8.2f} ms  p99={percentile(latencies, 99):8.2f} ms  "
+            f"hit_rate={stats['hit_rate']:.2f}  memoria={stats['bytes'] / 1024:8.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
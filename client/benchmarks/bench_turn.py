@@ -0,0 +1,113 @@
+"""
+Benchmark de un turno de chat completo contra Mongo, con la latencia del
+modelo simulada (asyncio.sleep).
+
+Compara el camino anterior de ModelController (save_chat del usuario +
+get_session_context + save_chat de la IA esperado antes de responder) con
+TurnPipeline (append_and_read en un solo viaje + respuesta de la IA guardada
+en segundo plano). Informa el tiempo de DB en el camino crítico y la latencia
+total de cada turno.
+
+Uso (desde la carpeta client/):
+    python -m benchmarks.bench_turn --sessions 100 --turns 10 --llm-ms 300
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from services.modelService import ModelService
+from services.turnService import TurnPipeline
+from validations.chatData import ChatData, ChatMessage
+from helpers.stats import percentile
+
+BENCH_COLLECTION = "chat_turn_bench"
+
+
+class WindowOnly:
+    """Arma la ventana sin resumir (el resumen llama al LLM y no es lo que se mide)."""
+
+    async def build_context(self, session_id, messages, summary, summary_upto, offset):
+        return summary, messages[-12:]
+
+
+def user_message(session_id: str, turn: int) -> ChatData:
+    return ChatData(
+        id_session=session_id,
+        user_id="bench-user",
+        messages=[ChatMessage(types="user", message=f"mensaje de prueba {turn}")]
+    )
+
+
+def ai_message(session_id: str, turn: int) -> ChatData:
+    return ChatData(
+        id_session=session_id,
+        user_id="bench-user",
+        messages=[ChatMessage(types="ai", message=f"respuesta de prueba {turn} " * 20)]
+    )
+
+
+async def legacy_session(store, turns, llm_s, db_times, turn_times):
+    session_id = f"bench-{uuid.uuid4()}"
+    for turn in range(turns):
+        start = time.perf_counter()
+        await store.save_chat(user_message(session_id, turn))
+        await store.get_session_context(session_id)
+        db_ms = (time.perf_counter() - start) * 1000
+        await asyncio.sleep(llm_s)
+        save_start = time.perf_counter()
+        await store.save_chat(ai_message(session_id, turn))
+        db_times.append(db_ms + (time.perf_counter() - save_start) * 1000)
+        turn_times.append((time.perf_counter() - start) * 1000)
+
+
+async def pipeline_session(pipeline, turns, llm_s, db_times, turn_times):
+    session_id = f"bench-{uuid.uuid4()}"
+    for turn in range(turns):
+        start = time.perf_counter()
+        _, _, db_ms = await pipeline.begin(user_message(session_id, turn))
+        await asyncio.sleep(llm_s)
+        await pipeline.finish(ai_message(session_id, turn))
+        db_times.append(db_ms)
+        turn_times.append((time.perf_counter() - start) * 1000)
+
+
+async def run_scenario(name, sessions, make_session):
+    db_times, turn_times = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(make_session(db_times, turn_times) for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<9} turnos={len(turn_times):>6}  "
+        f"db p50={statistics.median(db_times):7.2f} ms  p99={percentile(db_times, 99):7.2f} ms  "
+        f"turno p50={statistics.median(turn_times):8.2f} ms  p99={percentile(turn_times, 99):8.2f} ms  "
+        f"throughput={len(turn_times) / elapsed:7.1f} turnos/s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--llm-ms", type=float, default=300, help="latencia simulada del modelo")
+    args = parser.parse_args()
+    llm_s = args.llm_ms / 1000
+
+    store = ModelService(f"{BENCH_COLLECTION}_sessions", f"{BENCH_COLLECTION}_pages")
+    await store.ensure_indexes()
+    pipeline = TurnPipeline(store, WindowOnly(), background=True)
+
+    try:
+        await run_scenario("anterior", args.sessions,
+                           lambda db, turns: legacy_session(store, args.turns, llm_s, db, turns))
+        await run_scenario("pipeline", args.sessions,
+                           lambda db, turns: pipeline_session(pipeline, args.turns, llm_s, db, turns))
+        await pipeline.drain()
+    finally:
+        await store.collectionSessions.drop()
+        await store.collectionPages.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
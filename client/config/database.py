@@ -1,13 +1,28 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from config.env import EnvConfig
 
 
 class DatabaseConfig:
+     # Un único cliente (y por lo tanto un único pool de conexiones) por proceso.
+     _client = None
+
      def __init__(self):
           env = EnvConfig()
-          mongo_url = env.get("MONGO_URL")
-          self.client = MongoClient(mongo_url)
+          if DatabaseConfig._client is None:
+               mongo_url = env.get("MONGO_URL")
+               DatabaseConfig._client = AsyncIOMotorClient(
+                    mongo_url,
+                    maxPoolSize=int(env.get("MONGO_MAX_POOL_SIZE", 50)),
+                    minPoolSize=int(env.get("MONGO_MIN_POOL_SIZE", 5)),
+                    maxIdleTimeMS=int(env.get("MONGO_MAX_IDLE_TIME_MS", 60000)),
+                    waitQueueTimeoutMS=int(env.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+               )
+          self.client = DatabaseConfig._client
           self.db = self.client.get_database('competition_manager')
 
      def get_collection(self, collection_name: str):
-          return self.db[collection_name]
\ No newline at end of file
+          return self.db[collection_name]
+
+     async def warmup(self):
+          """Abre la primera conexión del pool (el resto hasta minPoolSize las abre el driver en segundo plano)."""
+          await self.client.admin.command("ping")
@@ -5,5 +5,5 @@ class EnvConfig:
      def __init__(self, env_file: str = ".env"):
           load_dotenv(env_file)
      
-     def get(self, key: str):
-          return os.getenv(key)
\ No newline at end of file
+     def get(self, key: str, default=None):
+          return os.getenv(key, default)
\ No newline at end of file
@@ -1,22 +1,112 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import create_agent
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import json
 import os
 load_dotenv()
 from config.env import EnvConfig
-from api.client import client
+from api.client import mcp_pool
 
 env = EnvConfig()
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 
-async def getModel():
-    geminiModel = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
-        api_key=gemini_api_key  
+
+def _tools_fingerprint(tools) -> str:
+    """Huella del catálogo de herramientas (nombre, descripción y esquema de argumentos)."""
+    catalogue = sorted(
+        (tool.name, tool.description or "", json.dumps(tool.args_schema, sort_keys=True, default=str))
+        for tool in tools
     )
-    
-    tools = await client.get_tools()
-    geminiAgent = create_agent(geminiModel, tools)
-    
-    return geminiAgent  
\ No newline at end of file
+    return hashlib.sha256(json.dumps(catalogue).encode("utf-8")).hexdigest()
+
+
+class AgentRegistry:
+    """
+    Registro único (por proceso) del agente LangGraph.
+
+    - Inicialización perezosa y single-flight: las peticiones concurrentes que
+      llegan antes de que exista el agente esperan a una sola construcción.
+    - warmup() lo construye al arrancar, así ninguna petición paga el
+      descubrimiento de herramientas.
+    - Una tarea de fondo vuelve a pedir el catálogo al servidor MCP y sólo
+      recompila el agente si cambió.
+    """
+
+    def __init__(self, refresh_interval: float = 60):
+        self.refresh_interval = refresh_interval
+        self._llm = None
+        self._agent = None
+        self._fingerprint = None
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    @property
+    def agent(self):
+        return self._agent
+
+    def get_llm(self):
+        if self._llm is None:
+            self._llm = ChatGoogleGenerativeAI(
+                model="gemini-2.5-flash",
+                temperature=0,
+                api_key=gemini_api_key
+            )
+        return self._llm
+
+    async def _build(self, tools=None):
+        if tools is None:
+            tools = await mcp_pool.get_tools()
+        # El reemplazo es atómico: las peticiones en curso siguen con el agente anterior
+        self._agent = create_agent(self.get_llm(), tools)
+        self._fingerprint = _tools_fingerprint(tools)
+        return self._agent
+
+    async def get_agent(self):
+        if self._agent is not None:
+            return self._agent
+        async with self._lock:
+            if self._agent is None:
+                await self._build()
+        return self._agent
+
+    async def refresh(self) -> bool:
+        """Recompila el agente si cambió el catálogo de herramientas. Devuelve True si cambió."""
+        tools = await mcp_pool.get_tools()
+        if _tools_fingerprint(tools) == self._fingerprint:
+            return False
+        async with self._lock:
+            await self._build(tools)
+        print(f"[agent] catálogo de herramientas actualizado ({len(tools)} herramientas)")
+        return True
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error refrescando el catálogo de herramientas: {e}")
+
+    async def warmup(self):
+        """Construye el agente y arranca el refresco periódico del catálogo."""
+        if self._refresh_task is None and self.refresh_interval > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+        await self.get_agent()
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        await mcp_pool.close()
+
+
+agent_registry = AgentRegistry(refresh_interval=float(env.get("AGENT_TOOLS_REFRESH_SECONDS", 60)))
+
+
+async def getModel():
+    return await agent_registry.get_agent()
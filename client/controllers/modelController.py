@@ -1,8 +1,22 @@
 from services.modelService import ModelService
 from validations.chatData import ChatData, ChatMessage
-from services.chatBotService import ChatBotService
+from services.chatBotService import ChatBotService, SYSTEM_PROMPT
+from services.historyService import HistoryManager, estimate_tokens
+from services.turnService import TurnPipeline
+from services.reportService import report_queue, ReportQueueFullError, JOB_DONE
 from fastapi import HTTPException
-from typing import List, Tuple, Union,Dict,Any
+from typing import List, Tuple, Union,Dict,Any, AsyncIterator, Optional
+import time
+
+
+def report_links(pdf_job_id: Optional[str]) -> Dict[str, Optional[str]]:
+    """URLs de descarga y de estado del PDF encolado (None si no se pidió reporte)."""
+    if not pdf_job_id:
+        return {"pdf_url": None, "pdf_status_url": None}
+    return {
+        "pdf_url": f"/api/reports/download/{pdf_job_id}",
+        "pdf_status_url": f"/api/reports/jobs/{pdf_job_id}",
+    }
 
 
 class ModelController:
@@ -10,38 +24,46 @@ class ModelController:
         # Asumiendo que ModelService maneja la base de datos (guardar historial)
         self.collectionChat = ModelService() 
         self.model_service = ChatBotService()
+        # Ventana de mensajes + resumen acotados por presupuesto de tokens (descontando el System Prompt)
+        self.history_manager = HistoryManager(self.collectionChat, reserved_tokens=estimate_tokens(SYSTEM_PROMPT))
+        # Un viaje a Mongo antes del modelo; la respuesta de la IA se guarda en segundo plano
+        self.turns = TurnPipeline(self.collectionChat, self.history_manager)
 
     async def create_new_chat(self, chat_data: ChatData) -> Tuple[str, Union[str, None]]:
         """
         Coordina la recepción del mensaje, la interacción con el LLM y el guardado.
-        Devuelve la respuesta y el nombre del archivo PDF.
+        Devuelve la respuesta y el id del trabajo del PDF (si se pidió un reporte).
         """
         try:
             session_id = chat_data.id_session
             
-            # 1. Guardar mensaje del usuario
-            self.collectionChat.save_chat(chat_data)
-            history_messages: List[ChatMessage] = self.collectionChat.get_messages_by_session_id(session_id)
-            
-            # 2. Cargar el modelo si es necesario
+            # 1. Cargar el modelo si es necesario
             if self.model_service.model is None:
                 await self.model_service.load_model()
+
+            # 2. Guardar mensaje del usuario y leer el contexto en la misma operación
+            summary, history_messages, db_ms = await self.turns.begin(chat_data)
             
             # 3. Llamar al servicio y desempaquetar la tupla
-            response_content, pdf_filename = await self.model_service.generate_response_with_history(history_messages)
+            llm_start = time.perf_counter()
+            response_content, pdf_job_id = await self.model_service.generate_response_with_history(history_messages, summary, session_id)
+            self.turns.stats.record(db_ms, (time.perf_counter() - llm_start) * 1000)
             
-            # 4. Guardar la respuesta de la IA
+            # 4. Guardar la respuesta de la IA (en segundo plano con un solo worker)
             ai_message = ChatMessage(types="ai", message=response_content)
             ai_chat_data = ChatData(
                 id_session=session_id,
                 user_id=chat_data.user_id,
                 messages=[ai_message]
             )
-            self.collectionChat.save_chat(ai_chat_data)
+            await self.turns.finish(ai_chat_data)
 
             # 5. DEVOLVER LA TUPLA para que el router la procese
-            return response_content, pdf_filename
+            return response_content, pdf_job_id
             
+        except HTTPException:
+            # Errores del cliente (p. ej. sesión de otro usuario) conservan su código
+            raise
         except Exception as e:
             # Elevar HTTPException para que FastAPI lo maneje y devuelva un 500
             print(f"Error en create_new_chat: {e}")
@@ -50,16 +72,73 @@ class ModelController:
                 detail=f"Error interno en el procesamiento del chat: {str(e)}"
             )
         
-    async def getSeccionBySession(self, session_id: str) -> List[ChatMessage]:
+    async def stream_chat(self, chat_data: ChatData) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Igual que create_new_chat pero emitiendo los eventos del agente a medida
+        que ocurren. Al terminar guarda la respuesta de la IA y emite 'done'
+        con el mensaje final y las URLs del PDF (si se encoló uno).
+
+        El turno corre en una tarea de TurnPipeline: si se corta el SSE
+        (desconexión o apagado) la respuesta se guarda igual.
+        """
+        async for event in self.turns.detach(self._stream_turn(chat_data)):
+            yield event
+
+    async def _stream_turn(self, chat_data: ChatData) -> AsyncIterator[Dict[str, Any]]:
+        session_id = chat_data.id_session
+        try:
+            # 1. Cargar el modelo si es necesario
+            if self.model_service.model is None:
+                await self.model_service.load_model()
+
+            # 2. Guardar mensaje del usuario y armar el contexto (un viaje a Mongo)
+            summary, history_messages, db_ms = await self.turns.begin(chat_data)
+
+            # 3. Reenviar los eventos del agente
+            llm_start = time.perf_counter()
+            response_content, pdf_job_id = None, None
+            async for event in self.model_service.stream_response_with_history(history_messages, summary, session_id):
+                if event["event"] == "final":
+                    response_content, pdf_job_id = event["data"]
+                else:
+                    yield event
+            self.turns.stats.record(db_ms, (time.perf_counter() - llm_start) * 1000)
+
+            # 4. Guardar la respuesta de la IA (en segundo plano con un solo worker)
+            ai_chat_data = ChatData(
+                id_session=session_id,
+                user_id=chat_data.user_id,
+                messages=[ChatMessage(types="ai", message=response_content)]
+            )
+            await self.turns.finish(ai_chat_data)
+
+            yield {
+                "event": "done",
+                "data": {"message": response_content, **report_links(pdf_job_id)}
+            }
+
+        except HTTPException as e:
+            yield {"event": "error", "data": {"detail": e.detail, "status_code": e.status_code}}
+        except Exception as e:
+            # Con la respuesta ya iniciada no se puede devolver un 500: se informa como evento
+            print(f"Error en stream_chat: {e}")
+            yield {
+                "event": "error",
+                "data": {"detail": f"Error interno en el procesamiento del chat: {str(e)}"}
+            }
+
+    async def getSeccionBySession(self, session_id: str, page: Optional[int] = None) -> Union[List[ChatMessage], Dict[str, Any]]:
      """
-     Obtiene el historial completo de mensajes para una sesión dada, 
-     usando el session_id como parámetro.
+     Obtiene el historial de mensajes para una sesión dada, 
+     usando el session_id como parámetro. Con 'page' devuelve sólo esa página
+     (0 = la más antigua) junto con los totales de la sesión.
      """
      try:
-         # 🚨 Se elimina self.collectionChat.save_chat(chat_data)
-     
-         # 1. Recuperar el historial COMPLETO de la sesión
-         history_messages: List[ChatMessage] = self.collectionChat.get_messages_by_session_id(session_id)
+         # 1. Recuperar una página o el historial COMPLETO de la sesión
+         if page is not None:
+             return await self.collectionChat.get_messages_page(session_id, page)
+
+         history_messages: List[ChatMessage] = await self.collectionChat.get_messages_by_session_id(session_id)
      
          # 2. Devolver la lista de mensajes
          return history_messages
@@ -70,21 +149,42 @@ class ModelController:
              status_code=500, 
              detail=f"Error al obtener el historial de la sesión: {str(e)}"
          )
-    async def getChatsById(self, user_id: str) -> List[Dict[str, Any]]:
+    async def getChatsById(self, user_id: str, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        Busca y retorna todas las sesiones de chat asociadas a un user_id.
-        Asume que el Service ya serializa los ObjectId a string.
+        Devuelve una página del índice de sesiones de un user_id (sólo
+        metadatos) y el cursor de la siguiente. Los mensajes de una sesión se
+        piden aparte con getSeccionBySession.
         """
         try:
-            # Llamada al Service. El Service devuelve la lista de diccionarios serializados.
-            myHistory: List[Dict[str, Any]] = await self.collectionChat.getChatById(user_id)
-            
-            return myHistory
-            
+            return await self.collectionChat.list_sessions(user_id, limit, cursor)
+
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             # Manejo de error para el router
             print(f"Error en getChatsById: {e}")
             raise HTTPException(
                 status_code=500, 
                 detail=f"Error al obtener las sesiones de chat por user_id: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+    def submit_report(self, content: str, session_id: str) -> Dict[str, Any]:
+        """Encola un PDF con el contenido dado y devuelve el trabajo."""
+        try:
+            job_id = report_queue.submit(content, session_id)
+        except ReportQueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+        return self.get_report_job(job_id)
+
+    def get_report_job(self, job_id: str) -> Dict[str, Any]:
+        job = report_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="El trabajo de reporte no existe.")
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "pdf_url": report_links(job_id)["pdf_url"] if job["status"] == JOB_DONE else None,
+        }
@@ -35,4 +35,26 @@ def extraer_respuesta_aimessage(respuesta_modelo: Union[Dict[str, Any], Any]) ->
         return str(contenido)
 
     # 3. Manejo de fallback
-    return f"Error: No se pudo extraer el contenido. Tipo de objeto recibido: {type(respuesta_modelo)}"
\ No newline at end of file
+    return f"Error: No se pudo extraer el contenido. Tipo de objeto recibido: {type(respuesta_modelo)}"
+
+def extraer_texto_chunk(chunk: Any) -> str:
+    """
+    Extrae el texto de un fragmento de streaming del modelo (AIMessageChunk).
+    El contenido puede ser una cadena o una lista de partes {'type': 'text', 'text': ...}.
+    Devuelve "" si el fragmento no trae texto (p. ej. sólo una llamada a herramienta).
+    """
+    contenido = getattr(chunk, 'content', None)
+
+    if isinstance(contenido, str):
+        return contenido
+
+    if isinstance(contenido, list):
+        partes = []
+        for parte in contenido:
+            if isinstance(parte, str):
+                partes.append(parte)
+            elif isinstance(parte, dict) and parte.get('type', 'text') == 'text' and 'text' in parte:
+                partes.append(str(parte['text']))
+        return "".join(partes)
+
+    return ""
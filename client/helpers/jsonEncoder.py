@@ -0,0 +1,40 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any):
+    """Tipos que orjson no conoce: los de Mongo y los modelos de pydantic (datetime ya es nativo)."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Tipo no serializable a JSON: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """Serializa a JSON (UTF-8) resolviendo ObjectId, Decimal128 y modelos en el encoder."""
+    return orjson.dumps(value, default=_default, option=OPTIONS)
+
+
+def dumps_str(value: Any) -> str:
+    return dumps(value).decode("utf-8")
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    Respuesta JSON serializada con orjson. Se devuelve directamente desde el
+    endpoint para saltear jsonable_encoder (que recorre y copia cada documento).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,8 @@
+from typing import Sequence
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Percentil 'p' (0-100) por el método del rango más cercano; 'values' no puede estar vacío."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
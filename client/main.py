@@ -1,9 +1,50 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+import argparse
+import asyncio
+import os
 import uvicorn
-from routers.modelRouter import modelRouter
+from routers.modelRouter import modelRouter, controller
+from config.database import DatabaseConfig
+from config.env import EnvConfig
+from config.llm import agent_registry
+from services.reportService import report_queue, report_store
 
-app = FastAPI(title="Gestor de Competencia - Formosa", version="0.1.0")
+env = EnvConfig()
+
+
+async def warmup_database():
+    # Pool de Mongo abierto e índices del historial en formato bucket (cabeceras + páginas)
+    await DatabaseConfig().warmup()
+    await controller.collectionChat.ensure_indexes()
+
+
+async def warmup_agent():
+    # Precalentar el agente (y las sesiones MCP): ninguna petición paga el descubrimiento de herramientas
+    try:
+        await agent_registry.warmup()
+    except Exception as e:
+        # Si el servidor MCP todavía no está arriba, se construirá en la primera petición
+        print(f"No se pudo precalentar el agente: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Uvicorn no acepta peticiones hasta que termina el arranque de cada worker
+    await asyncio.gather(warmup_database(), warmup_agent())
+    # Pool de workers para los PDF (fuera del event loop) y límite de disco de reportes
+    report_queue.start()
+    report_store.evict()
+    print(f"[worker {os.getpid()}] listo")
+    yield
+    # Apagado ordenado: uvicorn ya dejó de aceptar conexiones y esperó las peticiones en curso
+    # (hasta --graceful-timeout); quedan las respuestas de la IA que se están guardando
+    await controller.turns.drain()
+    await agent_registry.close()
+    await report_queue.close()
+
+app = FastAPI(title="Gestor de Competencia - Formosa", version="0.1.0", lifespan=lifespan)
 
 # 🌐 Configuración de CORS
 origins = [
@@ -23,5 +64,47 @@ app.add_middleware(
 
 app.include_router(modelRouter)
 
+
+def run(argv=None):
+    """
+    Lanzador. Sin --workers arranca en modo desarrollo (un proceso con recarga
+    automática); con --workers N arranca N procesos de producción.
+
+    Cada worker tiene sus propios singletons (pool de Mongo, sesiones MCP,
+    caché de sesiones, cola de PDF). Con más de un worker:
+      - el caché de sesiones valida versiones en las lecturas (SESSION_CACHE_MODE
+        'local' pasa a 'versioned');
+      - la respuesta de la IA se guarda antes de responder
+        (CHAT_BACKGROUND_WRITES=false), porque el turno siguiente de la sesión
+        puede llegar a otro worker;
+      - el estado de los reportes se comparte por el directorio de reportes.
+    """
+    parser = argparse.ArgumentParser(description="API del chatbot (cliente MCP)")
+    parser.add_argument("--host", default=env.get("CLIENT_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env.get("CLIENT_PORT", 5001)))
+    parser.add_argument("--workers", type=int, default=int(env.get("CLIENT_WORKERS", 0)),
+                        help="cantidad de procesos (0: desarrollo con recarga automática)")
+    parser.add_argument("--graceful-timeout", type=float, default=float(env.get("CLIENT_GRACEFUL_TIMEOUT", 30)),
+                        help="segundos que se esperan las peticiones en curso al apagar")
+    args = parser.parse_args(argv)
+
+    if args.workers <= 0:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    if args.workers > 1:
+        # Los workers heredan el entorno y lo leen al importar la app
+        if env.get("SESSION_CACHE_MODE", "versioned") == "local":
+            os.environ["SESSION_CACHE_MODE"] = "versioned"
+        os.environ["CHAT_BACKGROUND_WRITES"] = "false"
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
 if __name__ == "__main__":
-     uvicorn.run("main:app", port=5001,reload=True)
\ No newline at end of file
+     run()
\ No newline at end of file
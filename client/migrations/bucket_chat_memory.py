@@ -0,0 +1,106 @@
+"""
+Migra el historial del formato anterior (un documento por sesión en
+'chat_memory' con todo el array 'messages') al formato bucket de ModelService
+('chat_sessions' + páginas en 'chat_messages').
+
+Es idempotente: las sesiones que ya tienen cabecera se omiten (salvo --force,
+que las vuelve a escribir). La colección original no se modifica a menos que
+se pase --drop-legacy.
+
+Uso (desde la carpeta client/):
+    python -m migrations.bucket_chat_memory [--dry-run] [--force] [--drop-legacy]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import InsertOne
+
+from config.database import DatabaseConfig
+from services.modelService import ModelService, PAGE_SIZE, PREVIEW_LENGTH, RECENT_MESSAGES, TITLE_LENGTH
+
+LEGACY_COLLECTION = "chat_memory"
+
+
+def build_documents(legacy: dict):
+    """Devuelve (cabecera, páginas) para un documento de chat_memory."""
+    messages = legacy.get("messages", [])
+    created_at = legacy["_id"].generation_time.replace(tzinfo=None) if isinstance(legacy.get("_id"), ObjectId) else datetime.utcnow()
+
+    header = {
+        "user_id": legacy.get("user_id"),
+        "id_session": legacy["id_session"],
+        "message_count": len(messages),
+        "created_at": created_at,
+        "updated_at": created_at,
+        "title": messages[0]["message"][:TITLE_LENGTH] if messages else "",
+        "last_message_preview": messages[-1]["message"][:PREVIEW_LENGTH] if messages else "",
+        "recent": [{"types": m["types"], "message": m["message"]} for m in messages[-RECENT_MESSAGES:]],
+    }
+    if "summary" in legacy:
+        header["summary"] = legacy["summary"]
+        header["summary_upto"] = legacy.get("summary_upto", 0)
+
+    pages = []
+    for start in range(0, len(messages), PAGE_SIZE):
+        chunk = messages[start:start + PAGE_SIZE]
+        pages.append({
+            "id_session": legacy["id_session"],
+            "page": start // PAGE_SIZE,
+            "count": len(chunk),
+            "messages": [
+                {"seq": start + i, "types": msg["types"], "message": msg["message"]}
+                for i, msg in enumerate(chunk)
+            ],
+        })
+    return header, pages
+
+
+async def migrate(dry_run: bool, force: bool, drop_legacy: bool):
+    legacy_collection = DatabaseConfig().get_collection(LEGACY_COLLECTION)
+    service = ModelService()
+    await service.ensure_indexes()
+
+    migrated, skipped, total_messages = 0, 0, 0
+    async for legacy in legacy_collection.find({}):
+        if not legacy.get("id_session"):
+            skipped += 1
+            continue
+        exists = await service.collectionSessions.find_one({"id_session": legacy["id_session"]}, {"_id": 1})
+        if exists and not force:
+            skipped += 1
+            continue
+
+        header, pages = build_documents(legacy)
+        total_messages += header["message_count"]
+        migrated += 1
+        if dry_run:
+            continue
+
+        if exists:
+            await service.collectionSessions.delete_one({"id_session": legacy["id_session"]})
+            await service.collectionPages.delete_many({"id_session": legacy["id_session"]})
+        await service.collectionSessions.insert_one(header)
+        if pages:
+            await service.collectionPages.bulk_write([InsertOne(page) for page in pages], ordered=True)
+
+    action = "a migrar" if dry_run else "migradas"
+    print(f"Sesiones {action}: {migrated} ({total_messages} mensajes). Omitidas: {skipped}.")
+
+    if drop_legacy and not dry_run:
+        await legacy_collection.drop()
+        print(f"Colección '{LEGACY_COLLECTION}' eliminada.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="sólo contar, no escribir")
+    parser.add_argument("--force", action="store_true", help="reescribir sesiones ya migradas")
+    parser.add_argument("--drop-legacy", action="store_true", help="eliminar chat_memory al terminar")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.dry_run, args.force, args.drop_legacy))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse 
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
+from fastapi.responses import FileResponse, Response
+from sse_starlette.sse import EventSourceResponse
 
-from controllers.modelController import ModelController
+from controllers.modelController import ModelController, report_links
 from validations.chatData import ChatData
-from services.chatBotService import PDF_DIR # Importar la ubicación del directorio PDF
+from validations.reportData import ReportRequest
+from services.reportService import report_store, report_queue, JOB_DONE, JOB_FAILED
+from services.modelService import SESSIONS_PAGE_SIZE, SESSIONS_MAX_PAGE_SIZE
+from helpers.jsonEncoder import MongoJSONResponse, dumps_str
 import os 
 
 
@@ -15,58 +20,122 @@ controller = ModelController()
 async def create_chat(chat_data: ChatData):
     """
     Envía un mensaje al modelo, recibe la respuesta y devuelve
-    la URL de descarga si se generó un reporte PDF.
+    las URLs de descarga y de estado si se encoló un reporte PDF.
     """
-    # El controlador devuelve la tupla (response_text, pdf_filename)
-    response_text, pdf_filename = await controller.create_new_chat(chat_data)
+    # El controlador devuelve la tupla (response_text, pdf_job_id)
+    response_text, pdf_job_id = await controller.create_new_chat(chat_data)
     
-    response_data = {
-        "message": response_text,
-        "pdf_url": None  # Por defecto no hay PDF
-    }
-    
-    # Si se generó un PDF, adjuntamos la URL de descarga
-    if pdf_filename:
-        # Construye la URL completa que apunta al endpoint de descarga
-        response_data["pdf_url"] = f"/api/reports/download/{pdf_filename}"
-        
-    return response_data
+    # Si se encoló un PDF, adjuntamos la URL de descarga (None por defecto)
+    return {"message": response_text, **report_links(pdf_job_id)}
+
+# 1b. ENDPOINT DE CHAT EN STREAMING (SSE)
+@modelRouter.post("/chatBot/stream", tags=["ChatBots"])
+async def create_chat_stream(chat_data: ChatData):
+    """
+    Igual que /chatBot pero responde con server-sent events a medida que el
+    agente trabaja: 'tool_start', 'tool_end', 'token', y al final 'done'
+    (mensaje completo + pdf_url) o 'error'.
+    """
+    async def event_stream():
+        async for event in controller.stream_chat(chat_data):
+            yield {"event": event["event"], "data": dumps_str(event["data"])}
+
+    return EventSourceResponse(event_stream())
 
-# 2. ENDPOINT DE DESCARGA DE PDF
+# 2. TRABAJOS DE REPORTE (submit -> job id -> estado -> descarga)
+@modelRouter.post("/reports/jobs", tags=["Reports"], status_code=202)
+async def submit_report(report: ReportRequest):
+    """
+    Encola el renderizado de un PDF. Responde 202 con el id del trabajo, o
+    429 si la cola está llena.
+    """
+    return controller.submit_report(report.content, report.id_session)
+
+@modelRouter.get("/reports/jobs/{job_id}", tags=["Reports"])
+async def get_report_job(job_id: str):
+    """Estado del trabajo: pending, running, done (con pdf_url) o failed."""
+    return controller.get_report_job(job_id)
+
+# 3. ENDPOINT DE DESCARGA DE PDF
 @modelRouter.get("/reports/download/{filename:path}", tags=["Reports"])
-async def download_report(filename: str):
+async def download_report(filename: str, request: Request):
     """
-    Permite la descarga de un reporte PDF generado previamente.
+    Permite la descarga de un reporte PDF ya generado, por id de trabajo
+    o por clave/nombre de archivo. El nombre es el hash del contenido, así
+    que sirve de ETag fuerte: con If-None-Match se responde 304 y las
+    descargas parciales usan Range (FileResponse envía el archivo por partes).
     """
-    file_path = os.path.join(PDF_DIR, filename)
-    
-    # Verificación de seguridad: El archivo debe existir
-    if not os.path.exists(file_path):
+    job = report_queue.get(filename)
+    if job is not None:
+        if job["status"] == JOB_FAILED:
+            raise HTTPException(status_code=500, detail=f"No se pudo generar el reporte: {job['error']}")
+        if job["status"] != JOB_DONE:
+            raise HTTPException(
+                status_code=409,
+                detail="El reporte todavía se está generando.",
+                headers={"Retry-After": "2"}
+            )
+        filename = job["filename"]
+
+    # Verificación de seguridad: el archivo debe existir dentro del directorio de reportes
+    file_path = report_store.resolve(filename)
+    if file_path is None:
         raise HTTPException(
             status_code=404, 
             detail="El reporte solicitado no se encuentra."
         )
-    
-    # Devolver el archivo usando FileResponse
+
+    key = os.path.splitext(os.path.basename(file_path))[0]
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or f'"{key}"' in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    report_store.touch(file_path)
+    # Devolver el archivo usando FileResponse (soporta Range / 206)
     return FileResponse(
         path=file_path,
-        filename=filename,
-        media_type='application/pdf'
+        filename=os.path.basename(file_path),
+        media_type='application/pdf',
+        headers=headers
     )
 
+@modelRouter.get("/chatBot/stats", tags=["ChatBots"])
+async def get_turn_stats():
+    """
+    Tiempos por turno de los últimos turnos: DB en el camino crítico y modelo
+    (avg, p50, p99 en ms), más el estado del caché de sesiones. Los valores
+    son del worker que atiende la petición.
+    """
+    return {
+        "worker": os.getpid(),
+        **controller.turns.stats.snapshot(),
+        "session_cache": controller.collectionChat.cache.stats(),
+    }
+
 @modelRouter.get("/chatBot/history/{session_id}", tags=["ChatBots"])
-async def get_chat_history(session_id: str):
+async def get_chat_history(session_id: str, page: Optional[int] = Query(None, ge=0)):
     """
     Recupera el historial de mensajes de una sesión existente usando 
-    el ID de sesión como parámetro de ruta.
+    el ID de sesión como parámetro de ruta. Con ?page=N devuelve sólo esa
+    página de mensajes (0 = la más antigua) y los totales para paginar.
     """
     # Llamamos al controlador pasándole directamente el session_id
-    history = await controller.getSeccionBySession(session_id)
+    history = await controller.getSeccionBySession(session_id, page)
     
-    # Devuelve la lista de objetos ChatMessage
-    return history
+    # Devuelve la lista de objetos ChatMessage (serializada con orjson)
+    return MongoJSONResponse(history)
 
 @modelRouter.get("/chatBot/myHistory/{user_id}", tags=["ChatBots"])
-async def get_chat_history(user_id: str):
-    history = await controller.getChatsById(user_id)
-    return history
\ No newline at end of file
+async def get_my_history(
+    user_id: str,
+    limit: int = Query(SESSIONS_PAGE_SIZE, ge=1, le=SESSIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """
+    Lista las sesiones del usuario (más recientes primero) con id, título,
+    vista previa del último mensaje, cantidad de mensajes y updated_at.
+    Para la página siguiente se envía el 'next_cursor' recibido como ?cursor=.
+    """
+    history = await controller.getChatsById(user_id, limit, cursor)
+    return MongoJSONResponse(history)
@@ -1,39 +1,14 @@
-from config.llm import getModel
-from helpers.extractResponse import extraer_respuesta_aimessage
+from config.llm import agent_registry
+from helpers.extractResponse import extraer_respuesta_aimessage, extraer_texto_chunk
 from validations.chatData import ChatMessage 
-from typing import List, Tuple, Union
-import datetime
-import os 
-from fpdf import FPDF # Librería para PDF
+from services.reportService import report_queue, ReportQueueFullError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from services.historyService import SUMMARY_HEADER
 from rich import print
 
-# Directorio donde guardaremos los PDFs generados
-PDF_DIR = "reports_generated"
-os.makedirs(PDF_DIR, exist_ok=True) # Crea el directorio si no existe
-
-class ChatBotService:
-    def __init__(self):
-        self.model = None
-        self.fecha_actual = datetime.datetime.now()
-
-    async def load_model(self):
-        self.model = await getModel()
-        if self.model is None:
-            # Eleva una excepción si no se puede cargar el modelo
-            raise RuntimeError("El modelo no se pudo cargar. getModel() devolvió None.")
-
-    async def generate_response_with_history(self, history_messages: List[ChatMessage]) -> Tuple[str, Union[str, None]]:
-        """
-        Genera la respuesta del modelo y el PDF si se solicita un reporte.
-        Devuelve (response_text, pdf_filename)
-        """
-        if self.model is None:
-            raise RuntimeError("No se puede generar respuesta: el modelo no está cargado. Llama a load_model() primero.")
-        
-        try:
-            # 1. Definir el System Prompt para guiar al modelo
-            SYSTEM_PROMPT = f"""
-            Eres un Asistente Analítico de Mercado (AAM). Tu rol es proporcionar análisis concisos, precisos y profesionales.
+# System Prompt que guía al modelo (HistoryManager lo descuenta del presupuesto de tokens)
+SYSTEM_PROMPT = """
+        Eres un Asistente Analítico de Mercado (AAM). Tu rol es proporcionar análisis concisos, precisos y profesionales.
 
 		  **REGLAS Y FUNCIONALIDAD:**
 		  
@@ -52,14 +27,48 @@ class ChatBotService:
 		  7. **NO uses formato Markdown.** Esto incluye: NO usar negritas (`**`), cursivas (`*`), ni listas con guiones o asteriscos (`-`, `*`).
 		  8. **Estructura Visual:** Para simular encabezados y secciones, usa **TEXTO EN MAYÚSCULAS** y separa los párrafos y secciones con un doble salto de línea (dos `ENTER`).
 		  
+		  **HERRAMIENTAS:**
+		  
+		  9. Si necesitas varios datos para una misma respuesta (p. ej. un panorama del mercado), pídelos todos juntos con la herramienta `ejecutar_lote` en lugar de llamar a las herramientas una por una.
+		  
 		  **OBJETIVO:** El texto entregado debe ser un bloque limpio, plano y estructurado únicamente con mayúsculas y saltos de línea.
-            """
-            
-            # 2. Construir la lista de mensajes (System Prompt + Historial)
-            formatted_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-            for msg in history_messages:
-                role = "user" if msg.types == "user" else "assistant"
-                formatted_messages.append({"role": role, "content": msg.message})
+        """
+
+
+class ChatBotService:
+    @property
+    def model(self):
+        # Siempre el agente vigente del registro (se recompila si cambian las herramientas)
+        return agent_registry.agent
+
+    async def load_model(self):
+        await agent_registry.get_agent()
+        if self.model is None:
+            # Eleva una excepción si no se puede cargar el modelo
+            raise RuntimeError("El modelo no se pudo cargar. getModel() devolvió None.")
+
+    def _build_messages(self, history_messages: List[ChatMessage], summary: Optional[str] = None) -> List[dict]:
+        """Arma la lista de mensajes para el agente: System Prompt + resumen previo + historial reciente."""
+        # Construir la lista de mensajes (System Prompt + Historial)
+        formatted_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if summary:
+            formatted_messages.append({"role": "system", "content": f"{SUMMARY_HEADER}{summary}"})
+        for msg in history_messages:
+            role = "user" if msg.types == "user" else "assistant"
+            formatted_messages.append({"role": role, "content": msg.message})
+        return formatted_messages
+
+    async def generate_response_with_history(self, history_messages: List[ChatMessage], summary: Optional[str] = None, session_id: str = "") -> Tuple[str, Union[str, None]]:
+        """
+        Genera la respuesta del modelo y el PDF si se solicita un reporte.
+        Devuelve (response_text, pdf_job_id)
+        """
+        if self.model is None:
+            raise RuntimeError("No se puede generar respuesta: el modelo no está cargado. Llama a load_model() primero.")
+        
+        try:
+            # 1-2. System Prompt + Historial
+            formatted_messages = self._build_messages(history_messages, summary)
                 
             # 3. Invocar al modelo
             response = await self.model.ainvoke({"messages": formatted_messages})
@@ -73,47 +82,70 @@ class ChatBotService:
 
             
             
-            pdf_filename = None
-            
-            # 5. Lógica de Detección de Reporte y Generación de PDF
-            if "[REPORTE_INICIADO]" in response_text:
-                pdf_content = response_text.replace("[REPORTE_INICIADO]", "").strip()
-                
-                # Generar el PDF
-                pdf_filename = self._generate_report_pdf(pdf_content)
-                
-                # Modificar la respuesta al usuario para indicar que el PDF fue creado
-                response_text = f"**[PDF Creado]**\nSu análisis ha sido completado y generado en formato PDF. Puede descargarlo a través del enlace.\n\n{pdf_content}"
-            
-            return response_text, pdf_filename
+            # 5. Detección de Reporte y Generación de PDF
+            return self._finalize_response(response_text, session_id)
 
         except Exception as e:
             # En caso de error, devuelve un mensaje de error y no se genera PDF
             print(f"Error en generate_response_with_history: {e}")
             return f"ERROR: Fallo al procesar la solicitud del modelo. Por favor, inténtelo de nuevo. Detalle: {str(e)}", None
   
-    def _generate_report_pdf(self, content: str) -> str:
-        """Función interna para crear y guardar el archivo PDF."""
-        pdf = FPDF(orientation='P', unit='mm', format='A4')
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_title('Reporte de Análisis de Mercado (AAM)')
+    def _finalize_response(self, response_text: str, session_id: str = "") -> Tuple[str, Union[str, None]]:
+        """
+        Detecta la etiqueta de reporte, encola el PDF y ajusta el texto para el usuario.
+        Devuelve (response_text, pdf_job_id).
+        """
+        pdf_job_id = None
         
-        pdf.set_font('Arial', 'B', 18)
-        pdf.cell(0, 15, 'Reporte Analítico Generado por AAM', 0, 1, 'C')
+        # 5. Lógica de Detección de Reporte y Generación de PDF
+        if "[REPORTE_INICIADO]" in response_text:
+            pdf_content = response_text.replace("[REPORTE_INICIADO]", "").strip()
+            
+            try:
+                # Encolar el PDF: se descarga cuando el trabajo termina
+                pdf_job_id = self._generate_report_pdf(pdf_content, session_id)
+                # Modificar la respuesta al usuario para indicar que el PDF fue creado
+                response_text = f"**[PDF Creado]**\nSu análisis ha sido completado y se está generando en formato PDF. Puede descargarlo a través del enlace.\n\n{pdf_content}"
+            except ReportQueueFullError as e:
+                print(f"Reporte no encolado: {e}")
+                response_text = f"**[PDF no disponible]**\nHay demasiados reportes en proceso; vuelva a solicitarlo en unos minutos.\n\n{pdf_content}"
+        
+        return response_text, pdf_job_id
 
-        fecha_hora = self.fecha_actual.strftime("%d-%m-%Y %H:%M:%S")
-        pdf.set_font('Arial', '', 10)
-        pdf.cell(0, 5, f'Fecha de Generación: {fecha_hora}', 0, 1, 'R')
-        pdf.ln(5)
+    async def stream_response_with_history(self, history_messages: List[ChatMessage], summary: Optional[str] = None, session_id: str = "") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Variante en streaming de generate_response_with_history.
+        Emite eventos {"event": ..., "data": ...} a medida que el agente trabaja:
+        'tool_start' / 'tool_end' por cada herramienta, 'token' por cada fragmento
+        de texto del modelo y, al final, 'final' con (response_text, pdf_job_id).
+        """
+        if self.model is None:
+            raise RuntimeError("No se puede generar respuesta: el modelo no está cargado. Llama a load_model() primero.")
 
-        pdf.set_font('Arial', '', 12)
-        # Usar utf-8 para manejar caracteres especiales
-        pdf.multi_cell(0, 7, content) 
+        formatted_messages = self._build_messages(history_messages, summary)
+        final_message = None
 
-        timestamp = self.fecha_actual.strftime("%Y%m%d_%H%M%S")
-        filename = f"reporte_analisis_{timestamp}.pdf"
-        full_path = os.path.join(PDF_DIR, filename)
-        pdf.output(full_path)
-        
-        return filename
\ No newline at end of file
+        async for event in self.model.astream_events({"messages": formatted_messages}, version="v2"):
+            kind = event["event"]
+            if kind == "on_tool_start":
+                yield {"event": "tool_start", "data": {"tool": event["name"], "input": event["data"].get("input")}}
+            elif kind == "on_tool_end":
+                yield {"event": "tool_end", "data": {"tool": event["name"]}}
+            elif kind == "on_chat_model_stream":
+                text = extraer_texto_chunk(event["data"].get("chunk"))
+                if text:
+                    yield {"event": "token", "data": {"text": text}}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                # Fin del grafo raíz: su salida trae el estado final de mensajes
+                output = event["data"].get("output") or {}
+                if isinstance(output, dict) and output.get("messages"):
+                    final_message = output["messages"][-1]
+
+        if final_message is None:
+            raise RuntimeError("El agente terminó sin devolver un mensaje final.")
+        response_text = extraer_respuesta_aimessage(final_message)
+        yield {"event": "final", "data": self._finalize_response(response_text, session_id)}
+
+    def _generate_report_pdf(self, content: str, session_id: str) -> str:
+        """Encola el renderizado del PDF (fuera del event loop) y devuelve el id del trabajo."""
+        return report_queue.submit(content, session_id)
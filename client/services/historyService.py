@@ -0,0 +1,144 @@
+from config.env import EnvConfig
+from config.llm import agent_registry
+from helpers.extractResponse import extraer_respuesta_aimessage
+from validations.chatData import ChatMessage
+from typing import Dict, List, Optional, Tuple
+import asyncio
+
+env = EnvConfig()
+
+# Encabezado del mensaje de sistema con el resumen (ChatBotService._build_messages)
+SUMMARY_HEADER = "RESUMEN DE LA CONVERSACIÓN ANTERIOR:\n"
+
+SUMMARY_PROMPT = """
+Eres el encargado de mantener la memoria de una conversación entre un usuario y un
+Asistente Analítico de Mercado. Actualiza el RESUMEN ACTUAL incorporando los NUEVOS
+MENSAJES. Conserva cifras, nombres de productos, marcas, empresas, fechas y cualquier
+pedido o preferencia del usuario que siga vigente. Descarta saludos y repeticiones.
+Responde sólo con el resumen, en texto plano y en no más de {max_words} palabras.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens (~4 caracteres por token), suficiente para acotar el prompt."""
+    return len(text) // 4 + 4
+
+
+class HistoryManager:
+    """
+    Arma el contexto que se envía al modelo en cada turno:
+    los últimos N mensajes textuales + un resumen acumulado de los anteriores,
+    respetando un presupuesto de tokens que incluye el System Prompt
+    ('reserved_tokens') y el mensaje del resumen.
+
+    El resumen se guarda junto a la sesión (ModelService.save_session_summary)
+    con la cantidad de mensajes que cubre, así sólo se resumen los mensajes que
+    salen de la ventana y no toda la conversación en cada turno.
+
+    No se resume en cada turno: los mensajes que salen de la ventana se
+    siguen enviando textuales hasta juntar 'summary_threshold' (por defecto
+    media ventana) o hasta que dejan de entrar en el presupuesto. Con
+    background=True (HISTORY_BACKGROUND_SUMMARY) el resumen se calcula y se
+    guarda fuera del camino crítico: el turno sale con el resumen anterior y
+    la ventana que entra, y el turno siguiente ya lee el resumen nuevo.
+    """
+
+    def __init__(self, chat_store, window_messages: int = None, token_budget: int = None, summary_tokens: int = None,
+                 reserved_tokens: int = 0, summary_threshold: int = None, background: bool = None):
+        self.chat_store = chat_store
+        self.window_messages = window_messages or int(env.get("HISTORY_WINDOW_MESSAGES", 12))
+        self.token_budget = token_budget or int(env.get("HISTORY_TOKEN_BUDGET", 6000))
+        self.summary_tokens = summary_tokens or int(env.get("HISTORY_SUMMARY_TOKENS", 600))
+        self.reserved_tokens = reserved_tokens
+        self.summary_threshold = summary_threshold or int(env.get("HISTORY_SUMMARY_THRESHOLD", max(self.window_messages // 2, 1)))
+        if background is None:
+            background = env.get("HISTORY_BACKGROUND_SUMMARY", "true").lower() == "true"
+        self.background = background
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def _summary_cost(self, summary: Optional[str]) -> int:
+        """Tokens que ocupa el mensaje del resumen (o los que puede llegar a ocupar uno nuevo)."""
+        current = estimate_tokens(SUMMARY_HEADER + summary) if summary else 0
+        return max(current, self.summary_tokens)
+
+    @staticmethod
+    def _fit(messages: List[ChatMessage], start: int, budget: int) -> int:
+        """Corre 'start' hacia adelante hasta que messages[start:] entra en 'budget'."""
+        tokens = sum(estimate_tokens(m.message) for m in messages[start:])
+        while tokens > budget and start < len(messages) - 1:
+            tokens -= estimate_tokens(messages[start].message)
+            start += 1
+        return start
+
+    def _window_start(self, messages: List[ChatMessage], summary_upto: int, budget: int) -> int:
+        """Índice del primer mensaje que se envía textual."""
+        # Lo ya resumido nunca se repite; si aun así no entra, se resumen más mensajes
+        return self._fit(messages, max(len(messages) - self.window_messages, summary_upto, 0), budget)
+
+    async def _summarize(self, previous: Optional[str], messages: List[ChatMessage]) -> str:
+        transcript = "\n".join(
+            f"{'USUARIO' if m.types == 'user' else 'ASISTENTE'}: {m.message}" for m in messages
+        )
+        prompt = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_words=int(self.summary_tokens * 0.75))},
+            {"role": "user", "content": f"RESUMEN ACTUAL:\n{previous or '(vacío)'}\n\nNUEVOS MENSAJES:\n{transcript}"},
+        ]
+        response = await agent_registry.get_llm().ainvoke(prompt)
+        return extraer_respuesta_aimessage(response).strip()
+
+    async def _update_summary(self, id_session: str, previous: Optional[str], messages: List[ChatMessage], upto: int) -> Optional[str]:
+        try:
+            summary = await self._summarize(previous, messages)
+            await self.chat_store.save_session_summary(id_session, summary, upto)
+            return summary
+        except Exception as e:
+            # Sin resumen nuevo se sigue con el anterior: sólo se pierde contexto antiguo
+            print(f"Error resumiendo el historial de la sesión {id_session}: {e}")
+            return None
+
+    def _update_in_background(self, id_session: str, previous: Optional[str], messages: List[ChatMessage], upto: int):
+        # Un resumen por sesión a la vez: el siguiente turno retoma lo que falte
+        if id_session in self._pending:
+            return
+        task = asyncio.create_task(self._update_summary(id_session, previous, messages, upto))
+        self._pending[id_session] = task
+        task.add_done_callback(lambda done: self._pending.pop(id_session, None))
+
+    async def build_context(
+        self,
+        id_session: str,
+        messages: List[ChatMessage],
+        summary: Optional[str] = None,
+        summary_upto: int = 0,
+        offset: int = 0,
+    ) -> Tuple[Optional[str], List[ChatMessage]]:
+        """
+        Devuelve (resumen, ventana) para la sesión. Si los mensajes nuevos que
+        quedaron fuera de la ventana superan el umbral (o el presupuesto),
+        actualiza el resumen y lo persiste.
+        'offset' es la posición absoluta de messages[0] cuando sólo se cargó la
+        cola del historial ('summary_upto' es siempre absoluto).
+        """
+        covered = max(summary_upto - offset, 0)
+        budget = self.token_budget - self.reserved_tokens - self._summary_cost(summary)
+        start = self._window_start(messages, covered, budget)
+        if start <= covered:
+            return summary, messages[covered:]
+
+        # Pocos mensajes fuera de la ventana y todavía entran: se envían textuales
+        unsummarized = self._fit(messages, covered, budget)
+        if start - covered < self.summary_threshold and unsummarized == covered:
+            return summary, messages[covered:]
+
+        if not self.background:
+            updated = await self._update_summary(id_session, summary, messages[covered:start], start + offset)
+            return (updated or summary), messages[start:]
+
+        self._update_in_background(id_session, summary, messages[covered:start], start + offset)
+        # Mientras tanto: resumen anterior + los mensajes sin resumir que entren en el presupuesto
+        return summary, messages[unsummarized:]
+
+    async def drain(self):
+        """Espera los resúmenes en curso (al apagar el servidor)."""
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
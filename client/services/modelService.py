@@ -1,78 +1,312 @@
 from config.database import DatabaseConfig
+from config.env import EnvConfig
 from validations.chatData import ChatData,ChatMessage
-from typing import List, Optional,Dict,Any
+from services.sessionCache import SessionCache, session_cache
+from typing import List, Optional,Dict,Any,Tuple
 from fastapi import HTTPException
 from bson import ObjectId
+import asyncio
+import base64
+import json
+from collections import defaultdict
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Cantidad fija de mensajes por página (bucket) de una sesión
+PAGE_SIZE = int(EnvConfig().get("CHAT_PAGE_SIZE", 50))
+# Mensajes más recientes que se guardan también en la cabecera (lectura del turno en un solo viaje)
+RECENT_MESSAGES = int(EnvConfig().get("CHAT_RECENT_MESSAGES", 40))
+PREVIEW_LENGTH = 120
+TITLE_LENGTH = 80
+# Sesiones por página en el listado de /chatBot/myHistory
+SESSIONS_PAGE_SIZE = 20
+SESSIONS_MAX_PAGE_SIZE = 100
+SESSION_PROJECTION = {"id_session": 1, "title": 1, "last_message_preview": 1, "message_count": 1, "updated_at": 1}
+
+
+def encode_cursor(updated_at: datetime, last_id: ObjectId) -> str:
+    """Cursor opaco con la posición (updated_at, _id) de la última sesión devuelta."""
+    raw = json.dumps({"u": updated_at.isoformat(), "id": str(last_id)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(raw["u"]), ObjectId(raw["id"])
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
 
 class ModelService:
-     def __init__(self):
+     """
+     Historial de chat en formato "bucket":
+       - chat_sessions: un documento cabecera por sesión (user_id, id_session,
+         message_count, título, vista previa, fechas, resumen acumulado y
+         'recent': copia de los últimos RECENT_MESSAGES mensajes).
+       - chat_messages: páginas de hasta PAGE_SIZE mensajes por sesión
+         ({id_session, page, messages: [{seq, types, message}]}).
+     Así ningún documento crece sin límite y se puede leer el historial por páginas.
+
+     El contexto de las sesiones activas se mantiene además en un SessionCache
+     (write-through, versionado con message_count).
+     """
+
+     def __init__(self, sessions_collection: str = "chat_sessions", pages_collection: str = "chat_messages",
+                  cache: Optional[SessionCache] = None):
           db_config = DatabaseConfig()
-          self.collectionChat = db_config.get_collection("chat_memory")
-     
-     def save_chat(self, chat_data: ChatData):
+          self.collectionSessions = db_config.get_collection(sessions_collection)
+          self.collectionPages = db_config.get_collection(pages_collection)
+          self.cache = cache if cache is not None else session_cache
+
+     async def ensure_indexes(self):
+        await self.collectionSessions.create_index([("id_session", ASCENDING)], unique=True)
+        await self.collectionSessions.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)])
+        await self.collectionPages.create_index([("id_session", ASCENDING), ("page", ASCENDING)], unique=True)
+
+     @staticmethod
+     def _as_messages(chat_data: ChatData) -> List[ChatMessage]:
         if isinstance(chat_data.messages, ChatMessage):
-            message_doc = chat_data.messages.dict()
-        elif isinstance(chat_data.messages, list):
-            message_doc = {"$each": [m.dict() for m in chat_data.messages]}
+            return [chat_data.messages]
+        if isinstance(chat_data.messages, list):
+            return chat_data.messages
+        raise ValueError("chat_data.messages debe ser ChatMessage o List[ChatMessage]")
+
+     async def _append_to_header(self, chat_data: ChatData, messages: List[ChatMessage], projection: Dict[str, Any]):
+        """
+        Reserva posiciones en la cabecera (el $inc es atómico entre turnos
+        concurrentes) y agrega los mensajes a 'recent', la cola de los últimos
+        RECENT_MESSAGES mensajes que se lee junto con la cabecera.
+        """
+        now = datetime.utcnow()
+        query = {"user_id": chat_data.user_id, "id_session": chat_data.id_session}
+        update = {
+            "$inc": {"message_count": len(messages)},
+            "$push": {"recent": {"$each": [m.dict() for m in messages], "$slice": -RECENT_MESSAGES}},
+            "$set": {"updated_at": now, "last_message_preview": messages[-1].message[:PREVIEW_LENGTH]},
+            "$setOnInsert": {"created_at": now, "title": messages[0].message[:TITLE_LENGTH]},
+        }
+        # Dos turnos concurrentes pueden crear la misma sesión: el segundo reintenta como update.
+        # Si vuelve a chocar, el índice único (sólo id_session) indica que la sesión es de otro usuario.
+        for attempt in range(2):
+            try:
+                return await self.collectionSessions.find_one_and_update(
+                    query, update, projection=projection, upsert=True, return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                if attempt:
+                    raise HTTPException(status_code=403, detail="La sesión pertenece a otro usuario.")
+
+     async def _write_pages(self, id_session: str, first_seq: int, messages: List[ChatMessage]):
+        """Escribe cada mensaje en la página que le corresponde (historial completo)."""
+        pages = defaultdict(list)
+        for offset, message in enumerate(messages):
+            seq = first_seq + offset
+            pages[seq // PAGE_SIZE].append({"seq": seq, **message.dict()})
+        for page, docs in pages.items():
+            await self._push_to_page(id_session, page, docs)
+
+     async def save_chat(self, chat_data: ChatData):
+        messages = self._as_messages(chat_data)
+        if not messages:
+            return
+        header = await self._append_to_header(chat_data, messages, {"message_count": 1})
+        self.cache.append(chat_data.id_session, header["message_count"], messages)
+        await self._write_pages(chat_data.id_session, header["message_count"] - len(messages), messages)
+
+     async def append_and_read(self, chat_data: ChatData) -> Tuple[Dict[str, Any], "asyncio.Task"]:
+        """
+        Turno en un solo viaje a Mongo: agrega los mensajes a la cabecera y, en
+        la misma operación, devuelve el contexto de la sesión (resumen y cola
+        'recent'), con el mismo formato que get_session_context.
+
+        La escritura en las páginas queda en una tarea que se devuelve para
+        esperarla fuera del camino crítico. Si la cola no alcanza a cubrir lo
+        que falta resumir ('complete' en False: sesiones anteriores a 'recent'
+        o resúmenes atrasados), hay que leer las páginas con get_session_context.
+
+        Si la sesión está en el caché y nadie más escribió en el medio, los
+        mensajes salen de ahí (sin reconstruir los ChatMessage de 'recent').
+        """
+        messages = self._as_messages(chat_data)
+        if not messages:
+            raise ValueError("El turno no tiene mensajes para guardar")
+        id_session = chat_data.id_session
+        projection = {"message_count": 1, "recent": 1, "summary": 1, "summary_upto": 1, "_id": 0}
+        # Con un solo proceso la entrada del caché no puede quedar vieja: no hace falta traer 'recent'
+        cached = self.cache.get(id_session) is not None
+        if cached and not self.cache.versioned:
+            del projection["recent"]
+        header = await self._append_to_header(chat_data, messages, projection)
+        total = header["message_count"]
+        pages_task = asyncio.create_task(self._write_pages(id_session, total - len(messages), messages))
+        summary_upto = header.get("summary_upto", 0)
+
+        entry = self.cache.append(id_session, total, messages, header.get("summary"), summary_upto)
+        self.cache.record(entry is not None)
+        if entry is not None:
+            return {
+                "messages": list(entry.messages),
+                "offset": entry.offset,
+                "summary": entry.summary,
+                "summary_upto": entry.summary_upto,
+                "complete": True,
+            }, pages_task
+
+        recent = header.get("recent", [])
+        offset = total - len(recent)
+        context = {
+            "messages": [ChatMessage(types=m["types"], message=m["message"]) for m in recent],
+            "offset": offset,
+            "summary": header.get("summary"),
+            "summary_upto": summary_upto,
+            "complete": summary_upto >= offset,
+        }
+        if context["complete"]:
+            self.cache.put(id_session, total, offset, context["messages"], context["summary"], summary_upto)
+        return context, pages_task
+
+     async def _push_to_page(self, id_session: str, page: int, docs: List[Dict[str, Any]]):
+        update = {"$push": {"messages": {"$each": docs}}, "$inc": {"count": len(docs)}}
+        try:
+            await self.collectionPages.update_one({"id_session": id_session, "page": page}, update, upsert=True)
+        except DuplicateKeyError:
+            # Dos upserts concurrentes crearon la misma página: el segundo reintenta como update
+            await self.collectionPages.update_one({"id_session": id_session, "page": page}, update)
+
+     @staticmethod
+     def _to_messages(pages: List[Dict[str, Any]]) -> List[ChatMessage]:
+        docs = sorted((msg for page in pages for msg in page.get("messages", [])), key=lambda m: m["seq"])
+        return [ChatMessage(types=msg['types'], message=msg['message']) for msg in docs]
+
+     async def _read_pages(self, id_session: str, from_page: int = 0) -> List[Dict[str, Any]]:
+        cursor = self.collectionPages.find(
+            {"id_session": id_session, "page": {"$gte": from_page}},
+            {"messages": 1, "_id": 0}
+        ).sort("page", ASCENDING)
+        return await cursor.to_list(length=None)
+
+     async def get_messages_by_session_id(self, id_session: str) -> List[ChatMessage]:
+        # Sólo sirve desde el caché si la entrada todavía tiene el historial completo (nada resumido)
+        entry = self.cache.get(id_session)
+        if entry is not None and entry.offset == 0:
+            version = None
+            if self.cache.versioned:
+                header = await self.collectionSessions.find_one({"id_session": id_session}, {"message_count": 1, "_id": 0})
+                version = header.get("message_count", 0) if header else 0
+            entry = self.cache.lookup(id_session, version, from_offset=0)
+            if entry is not None:
+                return list(entry.messages)
         else:
-            raise ValueError("chat_data.messages debe ser ChatMessage o List[ChatMessage]")
+            self.cache.record(False)
+        return self._to_messages(await self._read_pages(id_session))
 
-        self.collectionChat.update_one(
-            {"user_id": chat_data.user_id, "id_session": chat_data.id_session},
-            {"$push": {"messages": message_doc}},
-            upsert=True
-        )
-     
-     def get_messages_by_session_id(self, id_session: str) -> List[ChatMessage]:
-        chat_document = self.collectionChat.find_one(
+     async def get_messages_page(self, id_session: str, page: int) -> Dict[str, Any]:
+        """Devuelve una página del historial (0 = la más antigua) junto con los totales."""
+        header = await self.collectionSessions.find_one({"id_session": id_session}, {"message_count": 1, "_id": 0})
+        total = header.get("message_count", 0) if header else 0
+        total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        page_doc = await self.collectionPages.find_one({"id_session": id_session, "page": page}, {"messages": 1, "_id": 0})
+        return {
+            "page": page,
+            "page_size": PAGE_SIZE,
+            "total_messages": total,
+            "total_pages": total_pages,
+            "messages": self._to_messages([page_doc] if page_doc else []),
+        }
+
+     async def get_session_context(self, id_session: str) -> Dict[str, Any]:
+        """
+        Devuelve el resumen acumulado ('summary', 'summary_upto') y los mensajes
+        que todavía no cubre. Sólo se leen las páginas a partir de 'summary_upto':
+        'offset' es la posición absoluta del primer mensaje devuelto.
+        """
+        entry = self.cache.get(id_session)
+        if entry is not None and not self.cache.versioned:
+            self.cache.record(True)
+            return self._context_from(entry)
+
+        header = await self.collectionSessions.find_one(
             {"id_session": id_session},
-            {"messages": 1, "_id": 0} 
-        )
-        
-        if chat_document and 'messages' in chat_document:
-            return [
-                ChatMessage(types=msg['types'], message=msg['message'])
-                for msg in chat_document['messages']
-            ]
-        
-        return []
-     
+            {"summary": 1, "summary_upto": 1, "message_count": 1, "_id": 0}
+        ) or {}
+        summary_upto = header.get("summary_upto", 0)
+        total = header.get("message_count", 0)
+
+        entry = self.cache.lookup(id_session, total, from_offset=summary_upto)
+        if entry is not None:
+            self.cache.update_summary(id_session, header.get("summary"), summary_upto)
+            return self._context_from(entry)
+
+        from_page = summary_upto // PAGE_SIZE
+        messages = self._to_messages(await self._read_pages(id_session, from_page))
+        offset = from_page * PAGE_SIZE
+        # Las páginas pueden ir detrás de la cabecera (escrituras en segundo plano): sólo se cachea lo coherente
+        if header and offset + len(messages) == total:
+            self.cache.put(id_session, total, offset, messages, header.get("summary"), summary_upto)
+        return {
+            "messages": messages,
+            "offset": offset,
+            "summary": header.get("summary"),
+            "summary_upto": summary_upto,
+        }
+
      @staticmethod
-     def serialize_mongo_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
-        """Convierte ObjectId a string en un documento de MongoDB para JSON."""
-        if doc is None:
-            return None
-        
-        serialized_doc = doc.copy() 
-        
-        # Convierte el ObjectId a string
-        if "_id" in serialized_doc and isinstance(serialized_doc["_id"], ObjectId):
-            serialized_doc["_id"] = str(serialized_doc["_id"])
-            
-        return serialized_doc
-    
-    # 🚨 MÉTODO getChatById CORREGIDO 🚨
-     async def getChatById(self, user_id: str) -> List[Dict[str, Any]]:
+     def _context_from(entry) -> Dict[str, Any]:
+        return {
+            "messages": list(entry.messages),
+            "offset": entry.offset,
+            "summary": entry.summary,
+            "summary_upto": entry.summary_upto,
+        }
+
+     async def save_session_summary(self, id_session: str, summary: str, summary_upto: int):
+        """Guarda el resumen sólo si cubre más mensajes que el actual (turnos concurrentes)."""
+        result = await self.collectionSessions.update_one(
+            {
+                "id_session": id_session,
+                "$or": [{"summary_upto": {"$exists": False}}, {"summary_upto": {"$lt": summary_upto}}]
+            },
+            {"$set": {"summary": summary, "summary_upto": summary_upto}}
+        )
+        if result.matched_count:
+            self.cache.update_summary(id_session, summary, summary_upto)
+        else:
+            # Otro turno guardó un resumen más nuevo: la entrada se recarga de Mongo
+            self.cache.invalidate(id_session)
+
+     async def list_sessions(self, user_id: str, limit: int = SESSIONS_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        Busca y retorna TODAS las sesiones de chat asociadas a un user_id.
-        Aplica serialización para convertir ObjectId a string.
+        Índice de sesiones de un usuario, de la más reciente a la más antigua.
+        Sólo devuelve metadatos (sin mensajes) y pagina por cursor sobre
+        (updated_at, _id), usando el índice (user_id, updated_at, _id).
         """
-        try:
-            # 1. Obtener el cursor
-            chat_cursor = self.collectionChat.find({"user_id": user_id})
-    
-            # 2. Obtener la lista de documentos (Asumiendo PyMongo síncrono)
-            chats = list(chat_cursor) 
-    
-            # 3. Serializar la lista usando el método estático
-            # Llamamos al método estático usando el nombre de la clase (ModelService)
-            serialized_chats = [ModelService.serialize_mongo_doc(chat) for chat in chats] 
-    
-            return serialized_chats
-    
-        except Exception as e:
-            # En caso de un error de BD, elevamos la excepción.
-            print(f"Error en ModelService.getChatById: {e}")
-            # NOTA: Aquí solo se imprime el error, pero el Controller lo manejará
-            # con HTTPException.
-            return [] # Retorna lista vacía en caso de error de BD
\ No newline at end of file
+        query: Dict[str, Any] = {"user_id": user_id}
+        if cursor:
+            updated_at, last_id = decode_cursor(cursor)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": last_id}},
+            ]
+
+        # Se pide un documento de más para saber si hay otra página
+        docs = await self.collectionSessions.find(query, SESSION_PROJECTION) \
+            .sort([("updated_at", DESCENDING), ("_id", DESCENDING)]) \
+            .limit(limit + 1) \
+            .to_list(length=limit + 1)
+
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        return {
+            "sessions": [
+                {
+                    "id_session": doc["id_session"],
+                    "title": doc.get("title", ""),
+                    "last_message_preview": doc.get("last_message_preview", ""),
+                    "message_count": doc.get("message_count", 0),
+                    "updated_at": doc.get("updated_at"),
+                }
+                for doc in docs
+            ],
+            "next_cursor": encode_cursor(docs[-1]["updated_at"], docs[-1]["_id"]) if has_more else None,
+        }
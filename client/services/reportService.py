@@ -0,0 +1,336 @@
+from config.env import EnvConfig
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from fpdf import FPDF # Librería para PDF
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import time
+
+env = EnvConfig()
+
+# Directorio donde guardaremos los PDFs generados (lo crea ReportStore)
+PDF_DIR = "reports_generated"
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class ReportQueueFullError(Exception):
+    """Hay demasiados reportes en cola: el llamador debe reintentar más tarde."""
+
+
+def render_report_pdf(content: str, generated_at: datetime.datetime, full_path: str) -> str:
+    """
+    Arma y escribe el PDF del reporte. Corre en el pool de workers (por eso es
+    una función de módulo: tiene que poder enviarse a otro proceso).
+    Escribe en un temporal y lo renombra, así nunca se sirve un PDF a medias.
+    """
+    pdf = FPDF(orientation='P', unit='mm', format='A4')
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_title('Reporte de Análisis de Mercado (AAM)')
+
+    pdf.set_font('Arial', 'B', 18)
+    pdf.cell(0, 15, 'Reporte Analítico Generado por AAM', 0, 1, 'C')
+
+    fecha_hora = generated_at.strftime("%d-%m-%Y %H:%M:%S")
+    pdf.set_font('Arial', '', 10)
+    pdf.cell(0, 5, f'Fecha de Generación: {fecha_hora}', 0, 1, 'R')
+    pdf.ln(5)
+
+    pdf.set_font('Arial', '', 12)
+    # Usar utf-8 para manejar caracteres especiales
+    pdf.multi_cell(0, 7, content)
+
+    tmp_path = f"{full_path}.{os.getpid()}.tmp"
+    pdf.output(tmp_path)
+    os.replace(tmp_path, full_path)
+    return full_path
+
+
+class ReportStore:
+    """
+    Almacén de PDFs direccionado por contenido.
+
+    Cada reporte se guarda como '<hash de sesión>_<hash de contenido>.pdf':
+    dos reportes idénticos de la misma sesión son el mismo archivo (no se
+    vuelve a renderizar) y nunca se pisan reportes distintos. La clave
+    también sirve de ETag, porque el contenido de una clave no cambia.
+
+    evict() mantiene el directorio acotado: borra los archivos más viejos
+    que 'max_age' y después los menos usados hasta quedar bajo 'max_bytes'.
+
+    El estado de los trabajos sin terminar también vive en el directorio
+    ('<clave>.status.json'), así cualquier worker del mismo host responde por
+    un trabajo aunque lo haya encolado otro.
+    """
+
+    def __init__(self, directory: str = PDF_DIR, max_bytes: int = 500 * 1024 * 1024, max_age: float = 72 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(session_id: str, content: str) -> str:
+        session_hash = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:12]
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+        return f"{session_hash}_{content_hash}"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Ruta del PDF para una clave o nombre de archivo, o None si no existe (o sale del directorio)."""
+        filename = os.path.basename(name)
+        if not filename.endswith(".pdf"):
+            filename = f"{filename}.pdf"
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def status_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(key)}.status.json")
+
+    def write_status(self, key: str, status: Dict[str, Any]):
+        path = self.status_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(status, f, default=str)
+        os.replace(tmp_path, path)
+
+    def read_status(self, key: str) -> Optional[Dict[str, Any]]:
+        """Estado publicado por algún worker, con 'age' (segundos desde la última escritura)."""
+        path = self.status_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                status = json.load(f)
+            status["age"] = time.time() - os.path.getmtime(path)
+            return status
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def clear_status(self, key: str):
+        try:
+            os.remove(self.status_path(key))
+        except FileNotFoundError:
+            pass
+
+    def touch(self, path: str):
+        """Marca el archivo como usado recientemente (orden de desalojo por tamaño)."""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def evict(self) -> Dict[str, int]:
+        now = time.time()
+        files, removed, freed = [], 0, 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith(".pdf"):
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                elif entry.name.endswith(".status.json") and now - stat.st_mtime > self.max_age:
+                    # Estados de trabajos fallidos o abandonados
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            freed += size
+            removed += 1
+
+        if removed:
+            print(f"[reports] desalojados {removed} PDF ({freed // 1024} KiB); en disco: {total // 1024} KiB")
+        return {"removed": removed, "freed_bytes": freed, "total_bytes": total}
+
+
+class ReportJobQueue:
+    """
+    Cola de trabajos de renderizado de PDF fuera del event loop.
+
+    submit() registra el trabajo y lo envía al pool (procesos por defecto:
+    FPDF es CPU puro y en hilos competiría por el GIL con las peticiones).
+    Como mucho 'max_pending' trabajos pueden estar en cola o en curso; pasado
+    ese límite submit() lanza ReportQueueFullError (back-pressure).
+    Los trabajos terminados se recuerdan hasta 'max_retained' (los más viejos
+    se olvidan primero; el archivo queda en el store hasta que se desaloje).
+
+    El id del trabajo es la clave del reporte en el store. Con varios workers,
+    el estado se publica en el store: un trabajo que encoló otro worker se
+    resuelve por su archivo de estado o por el PDF ya escrito, y no se vuelve
+    a renderizar mientras el otro worker lo tenga en curso (salvo que su
+    estado tenga más de 'stale_after' segundos: el worker pudo haber muerto).
+    """
+
+    def __init__(self, store: ReportStore, max_workers: int = 2, max_pending: int = 16, max_retained: int = 1000,
+                 use_processes: bool = True, stale_after: float = 300):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self.use_processes = use_processes
+        self.stale_after = stale_after
+        self._executor: Optional[Executor] = None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._active = 0
+        self._tasks = set()
+
+    def start(self):
+        if self._executor is None:
+            executor_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = executor_cls(max_workers=self.max_workers)
+
+    async def close(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            # Deja terminar los reportes en curso sin bloquear el event loop
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, True)
+
+    def _new_job(self, key: str, status: str) -> str:
+        job_id = key
+        now = datetime.datetime.utcnow()
+        self._jobs.pop(job_id, None)
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "status": status,
+            "key": key,
+            "filename": f"{key}.pdf",
+            "error": None,
+            "created_at": now,
+            "finished_at": now if status == JOB_DONE else None,
+        }
+        return job_id
+
+    def submit(self, content: str, session_id: str) -> str:
+        """
+        Encola el renderizado y devuelve el id del trabajo. Si el mismo reporte
+        ya existe en el store o se está generando, no se renderiza de nuevo.
+        """
+        key = self.store.make_key(session_id, content)
+        job = self._jobs.get(key)
+        if job is not None and job["status"] in (JOB_PENDING, JOB_RUNNING):
+            return key
+        existing = self.store.resolve(key)
+        if existing:
+            self.store.touch(existing)
+            job_id = self._new_job(key, JOB_DONE)
+            self._forget_old_jobs()
+            return job_id
+        # Lo está generando otro worker
+        shared = self.store.read_status(key)
+        if shared and shared["status"] in (JOB_PENDING, JOB_RUNNING) and shared["age"] < self.stale_after:
+            return key
+
+        if self._active >= self.max_pending:
+            raise ReportQueueFullError(
+                f"Hay {self._active} reportes en proceso (máximo {self.max_pending}). Intente nuevamente en unos segundos."
+            )
+        self.start()
+
+        job_id = self._new_job(key, JOB_PENDING)
+        self._publish(self._jobs[job_id])
+        self._active += 1
+        # La fecha del reporte es la del pedido, no la de arranque del servicio
+        generated_at = datetime.datetime.now()
+        task = asyncio.get_running_loop().create_task(self._run(job_id, content, generated_at, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def _run(self, job_id: str, content: str, generated_at: datetime.datetime, key: str):
+        job = self._jobs[job_id]
+        job["status"] = JOB_RUNNING
+        self._publish(job)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                self._executor, render_report_pdf, content, generated_at, self.store.path_for(key)
+            )
+            job["status"] = JOB_DONE
+        except Exception as e:
+            print(f"Error generando el reporte {job_id}: {e}")
+            job["status"] = JOB_FAILED
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = datetime.datetime.utcnow()
+            self._active -= 1
+            # Terminado: el PDF en el store ya indica 'done'; sólo se publica el fallo
+            if job["status"] == JOB_DONE:
+                self.store.clear_status(key)
+            else:
+                self._publish(job)
+            self._forget_old_jobs()
+
+        # Mantener el disco acotado (el escaneo del directorio va fuera del event loop)
+        try:
+            await loop.run_in_executor(None, self.store.evict)
+        except Exception as e:
+            print(f"Error desalojando reportes: {e}")
+
+    def _forget_old_jobs(self):
+        finished = [jid for jid, job in self._jobs.items() if job["status"] in (JOB_DONE, JOB_FAILED)]
+        for jid in finished[:max(len(finished) - self.max_retained, 0)]:
+            del self._jobs[jid]
+
+    def _publish(self, job: Dict[str, Any]):
+        try:
+            self.store.write_status(job["key"], {k: job[k] for k in ("status", "error", "created_at", "finished_at")})
+        except OSError as e:
+            print(f"Error publicando el estado del reporte {job['job_id']}: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job:
+            return dict(job)
+        # Trabajo de otro worker (o de antes de un reinicio)
+        key = os.path.basename(job_id)
+        path = self.store.resolve(key)
+        if path:
+            finished_at = datetime.datetime.utcfromtimestamp(os.path.getmtime(path))
+            return {"job_id": key, "status": JOB_DONE, "key": key, "filename": f"{key}.pdf",
+                    "error": None, "created_at": finished_at, "finished_at": finished_at}
+        shared = self.store.read_status(key)
+        if shared is None:
+            return None
+        status = shared["status"]
+        if status in (JOB_PENDING, JOB_RUNNING) and shared["age"] >= self.stale_after:
+            status, shared["error"] = JOB_FAILED, "El worker que generaba el reporte no terminó."
+        return {"job_id": key, "status": status, "key": key, "filename": f"{key}.pdf",
+                "error": shared.get("error"), "created_at": shared.get("created_at"), "finished_at": shared.get("finished_at")}
+
+    def stats(self) -> Dict[str, int]:
+        return {"active": self._active, "max_pending": self.max_pending, "workers": self.max_workers}
+
+
+report_store = ReportStore(
+    max_bytes=int(env.get("REPORT_STORE_MAX_MB", 500)) * 1024 * 1024,
+    max_age=float(env.get("REPORT_MAX_AGE_HOURS", 72)) * 3600,
+)
+
+report_queue = ReportJobQueue(
+    report_store,
+    max_workers=int(env.get("REPORT_WORKERS", 2)),
+    max_pending=int(env.get("REPORT_MAX_PENDING", 16)),
+    max_retained=int(env.get("REPORT_JOBS_RETAINED", 1000)),
+    use_processes=env.get("REPORT_EXECUTOR", "process") == "process",
+    stale_after=float(env.get("REPORT_STALE_SECONDS", 300)),
+)
@@ -0,0 +1,205 @@
+from config.env import EnvConfig
+from validations.chatData import ChatMessage
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import sys
+
+env = EnvConfig()
+
+# Modos de consistencia del caché
+MODE_OFF = "off"              # sin caché
+MODE_LOCAL = "local"          # un solo proceso: las lecturas confían en el caché
+MODE_VERSIONED = "versioned"  # varios workers: las lecturas validan la versión contra la cabecera
+MODES = (MODE_OFF, MODE_LOCAL, MODE_VERSIONED)
+
+# Costo aproximado de un ChatMessage fuera del texto (objeto pydantic, dict, 'types')
+MESSAGE_OVERHEAD = 250
+ENTRY_OVERHEAD = 400
+
+
+class CachedSession:
+    """
+    Contexto de una sesión en memoria: los mensajes desde 'offset' (posición
+    absoluta) hasta 'version' (= message_count de la cabecera), ya como
+    ChatMessage, más el resumen acumulado.
+    """
+
+    __slots__ = ("version", "offset", "messages", "summary", "summary_upto", "size")
+
+    def __init__(self, version: int, offset: int, messages: List[ChatMessage], summary: Optional[str], summary_upto: int):
+        self.version = version
+        self.offset = offset
+        self.messages = messages
+        self.summary = summary
+        self.summary_upto = summary_upto
+        self.size = 0
+
+
+class SessionCache:
+    """
+    Caché LRU write-through de las sesiones activas, por id_session y acotado
+    por cantidad de sesiones y por bytes estimados.
+
+    La versión de cada entrada es el message_count de la cabecera: toda
+    escritura pasa por un find_one_and_update que devuelve el contador nuevo,
+    así que al escribir se comprueba gratis que nadie más escribió en el medio
+    (versión guardada + mensajes agregados == contador devuelto). Si no
+    coincide, la entrada se descarta y la próxima lectura va a Mongo.
+
+    En modo 'versioned' (varios workers) las lecturas además comparan la
+    versión con una lectura de la cabecera, que es mucho más chica que las
+    páginas del historial. En modo 'local' (un solo proceso) el caché se usa
+    sin esa comprobación.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024, mode: str = MODE_VERSIONED):
+        if mode not in MODES:
+            raise ValueError(f"SESSION_CACHE_MODE debe ser uno de {MODES}")
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._entries: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != MODE_OFF
+
+    @property
+    def versioned(self) -> bool:
+        return self.mode == MODE_VERSIONED
+
+    @staticmethod
+    def _message_size(message: ChatMessage) -> int:
+        return sys.getsizeof(message.message) + MESSAGE_OVERHEAD
+
+    def _resize(self, entry: CachedSession):
+        size = ENTRY_OVERHEAD + sys.getsizeof(entry.summary or "") \
+            + sum(self._message_size(m) for m in entry.messages)
+        self.bytes += size - entry.size
+        entry.size = size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_sessions or self.bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
+
+    def get(self, id_session: str) -> Optional[CachedSession]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(id_session)
+        if entry is not None:
+            self._entries.move_to_end(id_session)
+        return entry
+
+    def record(self, hit: bool):
+        if self.enabled:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, id_session: str, version: Optional[int] = None, from_offset: Optional[int] = None) -> Optional[CachedSession]:
+        """
+        Entrada vigente para la sesión, o None (y cuenta un miss). 'version' es
+        el message_count leído de Mongo (si se leyó); 'from_offset' exige que la
+        entrada tenga los mensajes desde esa posición.
+        """
+        entry = self.get(id_session)
+        if entry is not None and version is not None and entry.version != version:
+            self.stale += 1
+            self.invalidate(id_session)
+            entry = None
+        if entry is None or (from_offset is not None and entry.offset > from_offset):
+            self.record(False)
+            return None
+        self.record(True)
+        return entry
+
+    def put(self, id_session: str, version: int, offset: int, messages: List[ChatMessage],
+            summary: Optional[str], summary_upto: int) -> Optional[CachedSession]:
+        """Guarda el contexto leído de Mongo (coherente con 'version')."""
+        if not self.enabled:
+            return None
+        self.invalidate(id_session)
+        entry = CachedSession(version, offset, list(messages), summary, summary_upto)
+        self._entries[id_session] = entry
+        self._resize(entry)
+        self._evict()
+        return entry
+
+    def append(self, id_session: str, new_version: int, messages: List[ChatMessage],
+               summary: Optional[str] = None, summary_upto: Optional[int] = None) -> Optional[CachedSession]:
+        """
+        Write-through de un turno: 'new_version' es el message_count que
+        devolvió la cabecera después de agregar 'messages'. Si la entrada no
+        estaba en la versión anterior (otro worker escribió), se descarta.
+        """
+        entry = self.get(id_session)
+        if entry is None:
+            return None
+        if entry.version != new_version - len(messages):
+            self.stale += 1
+            self.invalidate(id_session)
+            return None
+        entry.messages.extend(messages)
+        entry.version = new_version
+        if summary_upto is not None and summary_upto >= entry.summary_upto:
+            self._set_summary(entry, summary, summary_upto)
+        self._resize(entry)
+        self._evict()
+        return entry
+
+    def update_summary(self, id_session: str, summary: str, summary_upto: int):
+        """Resumen nuevo guardado por este proceso: los mensajes que cubre ya no hacen falta."""
+        entry = self.get(id_session)
+        if entry is None or summary_upto < entry.summary_upto:
+            return
+        self._set_summary(entry, summary, summary_upto)
+        self._resize(entry)
+
+    @staticmethod
+    def _set_summary(entry: CachedSession, summary: Optional[str], summary_upto: int):
+        entry.summary = summary
+        entry.summary_upto = summary_upto
+        # Lo resumido nunca vuelve a enviarse al modelo (HistoryManager.build_context)
+        drop = min(max(summary_upto - entry.offset, 0), len(entry.messages))
+        if drop:
+            del entry.messages[:drop]
+            entry.offset += drop
+
+    def invalidate(self, id_session: str):
+        entry = self._entries.pop(id_session, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "sessions": len(self._entries),
+            "bytes": self.bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
+
+
+session_cache = SessionCache(
+    max_sessions=int(env.get("SESSION_CACHE_MAX_SESSIONS", 1000)),
+    max_bytes=int(env.get("SESSION_CACHE_MAX_MB", 64)) * 1024 * 1024,
+    mode=env.get("SESSION_CACHE_MODE", MODE_VERSIONED),
+)
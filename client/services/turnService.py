@@ -0,0 +1,163 @@
+from config.env import EnvConfig
+from helpers.stats import percentile
+from validations.chatData import ChatData, ChatMessage
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import time
+
+env = EnvConfig()
+
+# Fin de los eventos de un turno en streaming (ver TurnPipeline.detach)
+_STREAM_END = object()
+
+
+class TurnStats:
+    """Tiempos de los últimos turnos (DB en el camino crítico y modelo), en milisegundos."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.turns = 0
+        self._db = deque(maxlen=max_samples)
+        self._llm = deque(maxlen=max_samples)
+
+    def record(self, db_ms: float, llm_ms: Optional[float] = None):
+        self.turns += 1
+        self._db.append(db_ms)
+        if llm_ms is not None:
+            self._llm.append(llm_ms)
+
+    @staticmethod
+    def _summary(values) -> Dict[str, float]:
+        if not values:
+            return {"avg": 0.0, "p50": 0.0, "p99": 0.0}
+        values = list(values)
+        return {
+            "avg": round(sum(values) / len(values), 2),
+            "p50": round(percentile(values, 50), 2),
+            "p99": round(percentile(values, 99), 2),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"turns": self.turns, "db_ms": self._summary(self._db), "llm_ms": self._summary(self._llm)}
+
+
+class TurnPipeline:
+    """
+    Acceso a Mongo de un turno de chat:
+
+    1. begin(): un solo find_one_and_update agrega el mensaje del usuario y
+       devuelve el contexto (resumen + cola 'recent'). Las páginas del
+       historial se escriben en segundo plano; sólo si la cola no cubre lo que
+       falta resumir se espera esa escritura y se leen las páginas.
+    2. finish(): guarda la respuesta de la IA sin bloquear la respuesta HTTP.
+       Las escrituras de una sesión se encadenan: el próximo begin() de esa
+       sesión espera a que terminen, así el orden de los mensajes se mantiene.
+
+    Con varios workers el próximo turno de la sesión puede llegar a otro
+    proceso, que no ve las escrituras pendientes de éste: con
+    background=False (CHAT_BACKGROUND_WRITES=false) finish() espera a que la
+    respuesta quede guardada.
+
+    Los turnos en streaming corren en una tarea del pipeline (detach()): si
+    el cliente se desconecta o el servidor se apaga, se cancela sólo la
+    lectura de los eventos y el turno termina igual (respuesta del modelo +
+    finish()), así la respuesta de la IA no se pierde y drain() la espera.
+    """
+
+    def __init__(self, chat_store, history_manager, stats: TurnStats = None, background: bool = None):
+        self.chat_store = chat_store
+        self.history_manager = history_manager
+        self.stats = stats or TurnStats()
+        if background is None:
+            background = env.get("CHAT_BACKGROUND_WRITES", "true").lower() == "true"
+        self.background = background
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._streams: Set[asyncio.Task] = set()
+
+    def _track(self, session_id: str, coro) -> asyncio.Task:
+        previous = self._pending.get(session_id)
+
+        async def run():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await coro
+            except Exception as e:
+                print(f"Error guardando el historial de la sesión {session_id}: {e}")
+                raise
+
+        task = asyncio.create_task(run())
+        self._pending[session_id] = task
+
+        def cleanup(done: asyncio.Task):
+            if self._pending.get(session_id) is done:
+                del self._pending[session_id]
+        task.add_done_callback(cleanup)
+        return task
+
+    async def _wait_pending(self, session_id: str):
+        task = self._pending.get(session_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def begin(self, chat_data: ChatData) -> Tuple[Optional[str], List[ChatMessage], float]:
+        """Guarda el mensaje del usuario y devuelve (resumen, ventana, ms de DB del turno)."""
+        session_id = chat_data.id_session
+        start = time.perf_counter()
+        await self._wait_pending(session_id)
+
+        context, pages_task = await self.chat_store.append_and_read(chat_data)
+        pages = self._track(session_id, pages_task)
+        if not context["complete"]:
+            await pages
+            context = await self.chat_store.get_session_context(session_id)
+        db_ms = (time.perf_counter() - start) * 1000
+
+        summary, window = await self.history_manager.build_context(
+            session_id, context["messages"], context["summary"], context["summary_upto"], context["offset"]
+        )
+        return summary, window, db_ms
+
+    async def finish(self, chat_data: ChatData):
+        """Guarda la respuesta de la IA: en segundo plano, o esperándola si background es False."""
+        task = self._track(chat_data.id_session, self.chat_store.save_chat(chat_data))
+        if not self.background:
+            await task
+
+    async def detach(self, events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Consume 'events' (el turno completo, incluido finish()) en una tarea
+        propia y reenvía sus eventos. Cancelar esta lectura no cancela el turno.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run():
+            try:
+                async for event in events:
+                    queue.put_nowait(event)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(_STREAM_END)
+
+        task = asyncio.create_task(run())
+        self._streams.add(task)
+        task.add_done_callback(self._streams.discard)
+
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def drain(self):
+        """Espera los turnos en streaming, las escrituras y los resúmenes pendientes (al apagar el servidor)."""
+        if self._streams:
+            await asyncio.gather(*self._streams, return_exceptions=True)
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
+        drain_history = getattr(self.history_manager, "drain", None)
+        if drain_history is not None:
+            await drain_history()
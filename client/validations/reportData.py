@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+class ReportRequest(BaseModel):
+    id_session: str
+    content: str
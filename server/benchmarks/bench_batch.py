@@ -0,0 +1,72 @@
+"""
+Benchmark de latencia de un turno "panorama del mercado": N herramientas
+llamadas una a una sobre streamable HTTP vs. una sola llamada a ejecutar_lote.
+
+Requiere el servidor MCP levantado (python main.py).
+
+Uso (desde la carpeta server/):
+    python -m benchmarks.bench_batch --url http://127.0.0.1:8000/mcp --rounds 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+# Las consultas que dispara una pregunta de panorama general
+MARKET_OVERVIEW = [
+    {"tool": "total_productos", "args": {}},
+    {"tool": "contar_productos_por_marca", "args": {}},
+    {"tool": "contar_productos_por_categoria", "args": {}},
+    {"tool": "precio_promedio_por_categoria", "args": {}},
+    {"tool": "top_productos_mas_vendidos", "args": {"limit": 10}},
+    {"tool": "total_pedidos", "args": {}},
+    {"tool": "ingreso_total", "args": {}},
+    {"tool": "contar_pedidos_por_estado", "args": {}},
+    {"tool": "total_companias", "args": {}},
+    {"tool": "companias_por_reputacion", "args": {}},
+    {"tool": "top_companias_por_ventas", "args": {"limit": 10}},
+    {"tool": "total_usuarios", "args": {}},
+]
+
+
+async def sequential_turn(session: ClientSession):
+    for invocation in MARKET_OVERVIEW:
+        await session.call_tool(invocation["tool"], invocation["args"])
+
+
+async def batch_turn(session: ClientSession):
+    await session.call_tool("ejecutar_lote", {"invocaciones": MARKET_OVERVIEW})
+
+
+async def measure(name: str, turn, session: ClientSession, rounds: int):
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await turn(session)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{name:<10} herramientas={len(MARKET_OVERVIEW)}  "
+        f"p50={statistics.median(latencies):8.2f} ms  max={max(latencies):8.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/mcp")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    async with streamablehttp_client(args.url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            # Una vuelta de calentamiento para no medir la caché fría en un solo lado
+            await batch_turn(session)
+            await measure("secuencial", sequential_turn, session, args.rounds)
+            await measure("lote", batch_turn, session, args.rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
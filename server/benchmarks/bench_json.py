@@ -0,0 +1,67 @@
+"""
+Micro-benchmark de serialización de resultados de herramientas con tipos de Mongo
+(ObjectId, datetime, Decimal128) en listas grandes.
+
+Compara lo que hacía FastMCP por defecto (pydantic_core.to_json con indent=2 y
+str como fallback), json.dumps(default=str), bson.json_util y el encoder
+orjson de helpers.jsonenc.
+
+Uso (desde la carpeta server/):
+    python -m benchmarks.bench_json --docs 10000 --rounds 20
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pydantic_core
+from bson import Decimal128, ObjectId, json_util
+
+from helpers.jsonenc import dumps
+
+
+def make_docs(n):
+    now = datetime(2025, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Producto de prueba {i}",
+            "brand": f"Marca {i % 20}",
+            "category": f"Categoría {i % 12}",
+            "price": Decimal128(Decimal(f"{1000 + i}.99")),
+            "stock": i % 50,
+            "company_id": ObjectId(),
+            "published_at": now - timedelta(days=i % 365),
+            "updated_at": now - timedelta(hours=i),
+        }
+        for i in range(n)
+    ]
+
+
+ENCODERS = {
+    "pydantic indent=2": lambda docs: pydantic_core.to_json(docs, fallback=str, indent=2),
+    "json.dumps": lambda docs: json.dumps(docs, default=str, ensure_ascii=False).encode("utf-8"),
+    "bson.json_util": lambda docs: json_util.dumps(docs).encode("utf-8"),
+    "orjson (jsonenc)": dumps,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = make_docs(args.docs)
+    for name, encode in ENCODERS.items():
+        size = len(encode(docs))
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            encode(docs)
+        elapsed = (time.perf_counter() - start) / args.rounds
+        print(f"{name:<20} {elapsed * 1000:9.2f} ms/lista  {args.docs / elapsed / 1e3:7.1f} k docs/s  {size / 1024:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
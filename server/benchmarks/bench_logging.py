@@ -0,0 +1,92 @@
+"""
+Benchmark del costo de los logs de resultados en los servicers.
+
+Compara el print() del resultado completo (lo que hacían top_by_price,
+latest_published, etc.) con log_result() en sus configuraciones habituales:
+DEBUG desactivado, DEBUG muestreado y DEBUG completo. Mide microsegundos por
+llamada y bytes de log emitidos por llamada; no necesita Mongo.
+
+Uso (desde la carpeta server/):
+    python -m benchmarks.bench_logging --docs 100 --calls 2000
+"""
+import argparse
+import contextlib
+import io
+import logging
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from helpers.logs import configure_logging, get_logger, log_result
+
+
+class CountingStream(io.TextIOBase):
+    """Descarta lo escrito y sólo cuenta los bytes."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode("utf-8"))
+        return len(text)
+
+
+def make_products(n):
+    now = datetime(2025, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Producto de prueba {i}",
+            "brand": f"Marca {i % 20}",
+            "category": f"Categoría {i % 12}",
+            "price": 1000 + i * 3.5,
+            "stock": i % 50,
+            "shipping": "gratis" if i % 2 else "pago",
+            "reputation": "verde",
+            "published_at": now - timedelta(days=i),
+            "updated_at": now - timedelta(hours=i),
+        }
+        for i in range(n)
+    ]
+
+
+def measure(name, fn, calls, stream):
+    start_bytes = stream.bytes
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<24} {elapsed / calls * 1e6:10.1f} µs/llamada  "
+        f"{(stream.bytes - start_bytes) / calls:10.1f} bytes/llamada"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    result = make_products(args.docs)
+    stream = CountingStream()
+    logger = get_logger("bench")
+
+    def old_print():
+        with contextlib.redirect_stdout(stream):
+            print("Result in service top_by_price:", result)
+
+    measure("print (antes)", old_print, args.calls, stream)
+    for label, level, rate in (
+        ("log_result INFO", "INFO", 1.0),
+        ("log_result DEBUG 1%", "DEBUG", 0.01),
+        ("log_result DEBUG 100%", "DEBUG", 1.0),
+    ):
+        configure_logging(level=level, result_sample_rate=rate, stream=stream)
+        measure(label, lambda: log_result(logger, "top_by_price", result), args.calls, stream)
+    logging.getLogger().handlers.clear()
+
+
+if __name__ == "__main__":
+    main()
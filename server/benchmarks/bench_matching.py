@@ -0,0 +1,83 @@
+"""
+Benchmark de filtros de texto: $regex sin anclar vs. campos sombra normalizados.
+
+Siembra una colección de prueba (por defecto 1.000.000 de productos) con
+marca/categoría y sus campos sombra, crea el índice compuesto que declara
+ProductsServicer y mide count_documents de products_by_brand_and_category
+en los modos regex, prefix y exact.
+
+Uso (desde la carpeta server/):
+    python -m benchmarks.bench_matching --products 1000000 --repeat 20
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from pymongo import ASCENDING
+
+from config.env import EnvConfig
+from db.connection import MongoConnector
+from helpers.text import normalize, text_filter, MATCH_EXACT, MATCH_PREFIX, MATCH_REGEX
+
+BENCH_COLLECTION = "products_bench_matching"
+BRANDS = ["Samsung", "Motorola", "Xiaomi", "Apple", "Huawei", "Nokia", "Alcatel", "TCL", "Realme", "Oppo"]
+CATEGORIES = ["Celulares y Teléfonos", "Accesorios", "Tablets", "Smartwatches", "Audio"]
+QUERIES = [("samsung", "celulares"), ("Motorola", "Accesorios"), ("xiaomi", "tablets")]
+
+
+async def seed(collection, total: int, batch_size: int = 10000):
+    await collection.drop()
+    for start in range(0, total, batch_size):
+        docs = []
+        for _ in range(min(batch_size, total - start)):
+            brand = random.choice(BRANDS)
+            category = random.choice(CATEGORIES)
+            docs.append({
+                "name": f"{brand} modelo {random.randint(1, 9999)}",
+                "brand": brand,
+                "category": category,
+                "brand_norm": normalize(brand),
+                "category_norm": normalize(category),
+                "price": round(random.uniform(10, 2000), 2),
+            })
+        await collection.insert_many(docs, ordered=False)
+    await collection.create_index([("brand_norm", ASCENDING), ("category_norm", ASCENDING)])
+
+
+async def measure(connector, mode: str, repeat: int):
+    latencies = []
+    for _ in range(repeat):
+        for brand, category in QUERIES:
+            query = {**text_filter("brand", brand, mode), **text_filter("category", category, mode)}
+            start = time.perf_counter()
+            await connector.count_documents(BENCH_COLLECTION, query, cache=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{mode:<7} p50={statistics.median(latencies):9.2f} ms  p99={p99:9.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="no borrar la colección al terminar")
+    args = parser.parse_args()
+
+    connector = MongoConnector(EnvConfig().get("MONGO_URL"), "competition_manager")
+    collection = connector.db[BENCH_COLLECTION]
+
+    print(f"Sembrando {args.products} productos en {BENCH_COLLECTION}...")
+    await seed(collection, args.products)
+    try:
+        for mode in (MATCH_REGEX, MATCH_PREFIX, MATCH_EXACT):
+            await measure(connector, mode, args.repeat)
+    finally:
+        if not args.keep:
+            await collection.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Tamaño de las respuestas de las herramientas de listado: documentos completos
+(find() sin proyección, como antes) vs. columnas declaradas en filas.
+
+Serializa con el encoder de las herramientas (helpers.jsonenc) y estima
+tokens con ~4 caracteres por token.
+
+Uso (desde la carpeta server/):
+    python -m benchmarks.bench_payload --limit 10            # contra MONGO_URL
+    python -m benchmarks.bench_payload --limit 10 --synthetic
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from config.env import EnvConfig
+from db.connection import MongoConnector
+from helpers.jsonenc import dumps_str
+from helpers.rows import to_rows
+from services.companies import CompaniesServicer
+from services.products import ProductsServicer
+from services.users import UsersServicer
+
+# (servicer, método, orden del find() anterior)
+LISTINGS = [
+    ("products", "top_by_price", [("price", -1)]),
+    ("products", "top_by_price_ascending", [("price", 1)]),
+    ("products", "latest_published", [("published_at", -1)]),
+    ("companies", "top_by_sales_volume", [("sales_volume", -1)]),
+    ("companies", "latest_active", [("last_activity", -1)]),
+    ("users", "latest_registered", [("fecha_registro", -1)]),
+    ("users", "latest_purchases", [("ultima_compra", -1)]),
+]
+
+
+def payload_size(result):
+    text = dumps_str(result)
+    return len(text.encode("utf-8")), len(text) // 4
+
+
+def synthetic_product(i):
+    now = datetime(2025, 1, 1)
+    return {
+        "_id": ObjectId(), "name": f"Producto de prueba {i}", "brand": f"Marca {i % 20}",
+        "category": f"Categoría {i % 12}", "price": 1000 + i * 3.5, "stock": i % 50,
+        "company_id": ObjectId(), "shipping": "gratis", "reputation": "verde",
+        "published_at": now - timedelta(days=i), "updated_at": now - timedelta(hours=i),
+        "name_norm": f"producto de prueba {i}", "brand_norm": f"marca {i % 20}", "category_norm": f"categoria {i % 12}",
+    }
+
+
+def report(name, before, after):
+    (bytes_before, tokens_before), (bytes_after, tokens_after) = before, after
+    saving = 100 * (1 - bytes_after / bytes_before) if bytes_before else 0
+    print(
+        f"{name:<24} antes={bytes_before:>7} B (~{tokens_before:>5} tok)  "
+        f"después={bytes_after:>7} B (~{tokens_after:>5} tok)  -{saving:4.1f}%"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--synthetic", action="store_true", help="productos generados en memoria, sin Mongo")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        docs = [synthetic_product(i) for i in range(args.limit)]
+        for method in ("top_by_price", "latest_published"):
+            columns = ProductsServicer.LISTING_COLUMNS[method]
+            report(method, payload_size(docs), payload_size(to_rows(docs, columns)))
+        return
+
+    connector = MongoConnector(EnvConfig().get("MONGO_URL"), "competition_manager")
+    servicers = {
+        "products": ProductsServicer(connector),
+        "companies": CompaniesServicer(connector),
+        "users": UsersServicer(connector),
+    }
+    for servicer_name, method, sort in LISTINGS:
+        servicer = servicers[servicer_name]
+        full_docs = await connector.find(servicer.collection_name, sort=sort, limit=args.limit, cache=False)
+        rows = await getattr(servicer, method)(args.limit)
+        report(method, payload_size(full_docs), payload_size(rows))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Prueba de carga local del endpoint MCP (streamable HTTP).
+
+Abre --sessions sesiones MCP y reparte --calls llamadas a herramientas entre
+ellas con --concurrency llamadas en vuelo a la vez. Informa latencia
+(p50/p99), throughput y cuántas llamadas se rechazaron por el límite de
+concurrencia ("Servidor ocupado") o fallaron. Al final muestra el estado del
+servidor (herramienta estado_servidor).
+
+Requiere el servidor levantado (desde server/: python main.py).
+
+Uso (desde la carpeta server/):
+    python -m benchmarks.load_mcp --calls 2000 --concurrency 200 --sessions 20
+    python -m benchmarks.load_mcp --tool top_productos_por_precio --args '{"limit": 10}'
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from contextlib import AsyncExitStack
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+from config.env import EnvConfig
+from helpers.limits import ConcurrencyLimiter
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def result_payload(result):
+    text = "".join(block.text for block in result.content if getattr(block, "type", None) == "text")
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+async def open_sessions(stack: AsyncExitStack, url: str, count: int):
+    sessions = []
+    for _ in range(count):
+        read, write, _ = await stack.enter_async_context(streamablehttp_client(url))
+        session = await stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+        sessions.append(session)
+    return sessions
+
+
+async def main():
+    env = EnvConfig()
+    default_url = f"http://{env.get('MCP_HOST', '127.0.0.1')}:{env.get('MCP_PORT', 8000)}/mcp"
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=default_url)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--tool", default="total_usuarios")
+    parser.add_argument("--args", default="{}", help="argumentos de la herramienta en JSON")
+    args = parser.parse_args()
+    tool_args = json.loads(args.args)
+
+    async with AsyncExitStack() as stack:
+        sessions = await open_sessions(stack, args.url, args.sessions)
+        latencies, counts = [], {"ok": 0, "ocupado": 0, "error": 0}
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one_call(index: int):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    result = await sessions[index % len(sessions)].call_tool(args.tool, tool_args)
+                    payload = result_payload(result)
+                    if ConcurrencyLimiter.is_busy(payload):
+                        counts["ocupado"] += 1
+                    elif result.isError or (isinstance(payload, dict) and ("error" in payload or "msg" in payload)):
+                        counts["error"] += 1
+                    else:
+                        counts["ok"] += 1
+                except Exception:
+                    counts["error"] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_call(i) for i in range(args.calls)))
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{args.tool}: llamadas={args.calls}  concurrencia={args.concurrency}  sesiones={args.sessions}\n"
+            f"  p50={statistics.median(latencies):8.2f} ms  p99={percentile(latencies, 99):8.2f} ms  "
+            f"max={max(latencies):8.2f} ms  throughput={args.calls / elapsed:8.1f} llamadas/s\n"
+            f"  ok={counts['ok']}  ocupado={counts['ocupado']}  error={counts['error']}"
+        )
+        health = await sessions[0].call_tool("estado_servidor", {})
+        print(f"  estado: {json.dumps(result_payload(health), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+import asyncio
+from collections import defaultdict
+
+from bson import json_util
+from cachetools import TTLCache
+
+from helpers.deadlines import QueryTimeout
+
+
+class ResultCache:
+    """
+    Caché acotada (LRU + TTL) de resultados de consultas a Mongo.
+
+    Las claves son (colección, operación, argumentos serializados), de modo que
+    la misma consulta sobre la misma colección comparte resultado entre todos
+    los servicers. Las llamadas concurrentes con la misma clave esperan a la
+    primera en lugar de repetir la consulta.
+
+    Los resultados se comparten entre llamadas: quien los reciba no debe mutarlos.
+
+    La consulta compartida lleva el maxTimeMS de quien la lanzó. Si se corta
+    por ese presupuesto (QueryTimeout), cada llamada que esperaba la repite
+    con su propio tiempo restante en lugar de heredar el corte.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    @staticmethod
+    def make_key(collection_name: str, operation: str, *args):
+        # json_util respeta el orden de las claves (importante en $sort) y
+        # sabe serializar datetime/ObjectId.
+        return (collection_name, operation, json_util.dumps(args))
+
+    async def get_or_compute(self, key, compute):
+        collection_name = key[0]
+        try:
+            value = self._cache[key]
+            self.hits[collection_name] += 1
+            return value
+        except KeyError:
+            pass
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                value = await asyncio.shield(pending)
+                self.hits[collection_name] += 1
+                return value
+            except asyncio.CancelledError:
+                # Si se canceló la consulta original (y no esta espera), se recalcula.
+                if not pending.cancelled():
+                    raise
+            except QueryTimeout:
+                # Se agotó el deadline de la primera llamada, no necesariamente el de esta
+                pass
+
+        self.misses[collection_name] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Evita el aviso "exception was never retrieved" si nadie esperaba.
+            future.exception()
+            raise
+        else:
+            self._cache[key] = value
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, collection_name: str = None):
+        """Elimina las entradas de una colección (o todas si no se indica)."""
+        if collection_name is None:
+            removed = len(self._cache)
+            self._cache.clear()
+            return removed
+        keys = [key for key in list(self._cache.keys()) if key[0] == collection_name]
+        for key in keys:
+            self._cache.pop(key, None)
+        return len(keys)
+
+    def stats(self):
+        collections = set(self.hits) | set(self.misses)
+        total_hits = sum(self.hits.values())
+        total_misses = sum(self.misses.values())
+        return {
+            "entries": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl": self._cache.ttl,
+            "hits": total_hits,
+            "misses": total_misses,
+            "hit_ratio": round(total_hits / (total_hits + total_misses), 4) if total_hits + total_misses else 0.0,
+            "by_collection": {
+                name: {"hits": self.hits[name], "misses": self.misses[name]}
+                for name in sorted(collections)
+            },
+        }
@@ -1,17 +1,194 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ExecutionTimeout
+from db.cache import ResultCache
+from helpers.deadlines import QueryTimeout, mark_expired, remaining_ms
+from helpers.logs import get_logger
+from helpers.metrics import tool_metrics
+import time
+
+logger = get_logger("db.connection")
+
+
+def _max_time(option: str = "maxTimeMS"):
+    """
+    Tiempo restante de la herramienta en curso como kwargs del driver ({} fuera
+    de una herramienta). find() lo recibe como 'max_time_ms'; aggregate y
+    count_documents como 'maxTimeMS'.
+    """
+    ms = remaining_ms()
+    return {option: ms} if ms is not None else {}
 
 class MongoConnector:
-    def __init__(self, uri:str, db_name:str):
-        self.client = AsyncIOMotorClient(uri)
+    def __init__(self, uri:str, db_name:str, cache: ResultCache = None, **client_options):
+        # client_options: tamaño del pool y timeouts del driver (maxPoolSize, socketTimeoutMS, ...)
+        self.client = AsyncIOMotorClient(uri, **client_options)
         self.db = self.client[db_name]
+        # Caché de resultados compartida por todos los servicers
+        self.cache = cache if cache is not None else ResultCache()
+
+    async def ping(self) -> float:
+        """Ida y vuelta al servidor de Mongo; devuelve la latencia en segundos."""
+        start = time.perf_counter()
+        await self.client.admin.command("ping")
+        return time.perf_counter() - start
+
+    async def _cached(self, collection_name, operation, args, compute, cache):
+        async def timed():
+            # Sólo cuenta el tiempo de las consultas que llegan a Mongo (no los aciertos de caché)
+            start = time.perf_counter()
+            try:
+                return await compute()
+            except ExecutionTimeout as error:
+                # Mongo cortó la consulta por maxTimeMS
+                mark_expired()
+                raise QueryTimeout(str(error)) from error
+            finally:
+                tool_metrics.add_mongo_time(time.perf_counter() - start)
+
+        if not cache:
+            return await timed()
+        key = ResultCache.make_key(collection_name, operation, *args)
+        return await self.cache.get_or_compute(key, timed)
+
+    async def find_all(self, collection_name, cache=True):
+        async def compute():
+            cursor = self.db[collection_name].find(**_max_time("max_time_ms"))
+            return await cursor.to_list(length=None)
+        return await self._cached(collection_name, "find_all", (), compute, cache)
+
+    async def find(self, collection_name, query=None, projection=None, sort=None, limit=0, skip=0, cache=True):
+        """find() con orden, salto y límite opcionales. 'sort' es una lista de (campo, dirección)."""
+        async def compute():
+            cursor = self.db[collection_name].find(query or {}, projection, **_max_time("max_time_ms"))
+            if sort:
+                cursor = cursor.sort(sort)
+            if skip:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=None)
+        args = (query, projection, sort, limit, skip)
+        return await self._cached(collection_name, "find", args, compute, cache)
+
+    async def aggregate(self, collection_name, pipeline, cache=True):
+        async def compute():
+            cursor = self.db[collection_name].aggregate(pipeline, **_max_time())
+            return await cursor.to_list(length=None)
+        return await self._cached(collection_name, "aggregate", (pipeline,), compute, cache)
+
+    async def count(self, collection_name, cache=True):
+        async def compute():
+            return await self.db[collection_name].count_documents({}, **_max_time())
+        return await self._cached(collection_name, "count", (), compute, cache)
+
+    async def count_documents(self, collection_name, query, cache=True):
+        async def compute():
+            return await self.db[collection_name].count_documents(query, **_max_time())
+        return await self._cached(collection_name, "count_documents", (query,), compute, cache)
+
+    def invalidate(self, collection_name=None):
+        """Invalida los resultados en caché de una colección (o de todas)."""
+        return self.cache.invalidate(collection_name)
+
+
+class IndexManager:
+    """
+    Declara los índices que necesita cada servicer, crea los que falten al
+    arrancar y verifica con explain() que sus consultas usan un índice.
+
+    Cada servicer registrado expone 'collection_name', 'INDEXES' (lista de
+    pymongo.IndexModel) y 'query_plans()' (consultas representativas con
+    'name', 'filter', 'sort' y 'limit' opcionales, armadas con los mismos
+    constructores de filtros que usan sus métodos).
+    """
+
+    INDEX_STAGES = {"IXSCAN", "COUNT_SCAN", "DISTINCT_SCAN", "IDHACK", "EXPRESS_IXSCAN", "TEXT_MATCH", "TEXT"}
+
+    def __init__(self, connector: MongoConnector):
+        self.connector = connector
+        self.servicers = []
+
+    def register(self, *servicers):
+        self.servicers.extend(servicers)
+
+    async def ensure_indexes(self):
+        """Crea los índices declarados que todavía no existen. Devuelve un reporte por colección."""
+        report = {}
+        for servicer in self.servicers:
+            collection = self.connector.db[servicer.collection_name]
+            existing = await collection.index_information()
+            existing_keys = {self._key_spec(info["key"]) for info in existing.values()}
+
+            # Los índices de texto se guardan con otra clave (_fts/_ftsx): se comparan por nombre
+            missing = [
+                index for index in getattr(servicer, "INDEXES", [])
+                if self._key_spec(index.document["key"].items()) not in existing_keys
+                and index.document["name"] not in existing
+            ]
+            created = await collection.create_indexes(missing) if missing else []
+
+            entry = report.setdefault(servicer.collection_name, {"created": [], "existing": 0})
+            entry["created"].extend(created)
+            entry["existing"] += len(getattr(servicer, "INDEXES", [])) - len(missing)
+        return report
+
+    @staticmethod
+    def _key_spec(key):
+        # Mongo puede devolver la dirección como 1.0; se normaliza para comparar.
+        return tuple(
+            (field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in key
+        )
+
+    @classmethod
+    def _plan_stages(cls, plan):
+        """Recorre el árbol del plan ganador y devuelve los nombres de las etapas."""
+        if "queryPlan" in plan:  # Motor de ejecución SBE
+            plan = plan["queryPlan"]
+        stages = [plan.get("stage")]
+        if "inputStage" in plan:
+            stages += cls._plan_stages(plan["inputStage"])
+        for child in plan.get("inputStages", []):
+            stages += cls._plan_stages(child)
+        return [stage for stage in stages if stage]
 
-    async def find_all(self, collection_name):
-        cursor = self.db[collection_name].find()
-        return await cursor.to_list(length=None)
+    async def verify_plans(self):
+        """Ejecuta explain() sobre cada consulta declarada e indica si es IXSCAN o COLLSCAN."""
+        results = []
+        for servicer in self.servicers:
+            collection = self.connector.db[servicer.collection_name]
+            query_plans = getattr(servicer, "query_plans", None)
+            for plan in (query_plans() if query_plans else []):
+                cursor = collection.find(plan.get("filter", {}))
+                if plan.get("sort"):
+                    cursor = cursor.sort(plan["sort"])
+                if plan.get("limit"):
+                    cursor = cursor.limit(plan["limit"])
+                explain = await cursor.explain()
+                stages = self._plan_stages(explain["queryPlanner"]["winningPlan"])
 
-    async def aggregate(self, collection_name, pipeline):
-        cursor = self.db[collection_name].aggregate(pipeline)
-        return await cursor.to_list(length=None)
+                if "COLLSCAN" in stages:
+                    scan = "COLLSCAN"
+                elif self.INDEX_STAGES.intersection(stages):
+                    scan = "IXSCAN"
+                else:
+                    scan = "OTHER"
+                results.append({
+                    "collection": servicer.collection_name,
+                    "query": plan["name"],
+                    "scan": scan,
+                    "stages": stages,
+                })
+        return results
 
-    async def count(self, collection_name):
-        return await self.db[collection_name].count_documents({})
\ No newline at end of file
+    async def bootstrap(self, create: bool = True, explain: bool = True):
+        """Punto de entrada del arranque: crea índices faltantes y reporta los planes."""
+        if create:
+            for collection_name, entry in (await self.ensure_indexes()).items():
+                logger.info("índices de %s: %s existentes, creados %s", collection_name, entry["existing"], entry["created"] or "ninguno")
+        if explain:
+            for result in await self.verify_plans():
+                if result["scan"] == "COLLSCAN":
+                    logger.warning("plan de %s.%s: %s %s (falta un índice)", result["collection"], result["query"], result["scan"], result["stages"])
+                else:
+                    logger.info("plan de %s.%s: %s %s", result["collection"], result["query"], result["scan"], result["stages"])
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Marcas de lote que se conservan por documento (ver marked_update)
+KEPT_BATCH_MARKS = 16
+
+
+class LeaseHeld(Exception):
+    """Otro proceso tiene el lease y no se liberó dentro de la espera."""
+
+
+class LeaseLost(Exception):
+    """El lease venció y lo tomó otro proceso mientras se trabajaba."""
+
+
+class MongoLease:
+    """
+    Lock con vencimiento guardado como documento en Mongo.
+
+    Lo comparten todos los procesos que apuntan a la misma base (workers del
+    servidor, el CLI de reconstrucción), a diferencia de un asyncio.Lock que
+    sólo protege al proceso actual. Se toma con un upsert atómico que sólo
+    coincide si el lease está vencido o ya es nuestro: si lo tiene otro, el
+    upsert choca con el _id existente (DuplicateKeyError).
+
+    Quien lo tiene debe llamar a renew() antes de cada paso que escriba, así
+    un proceso que quedó colgado más de 'ttl' segundos no sigue escribiendo
+    sobre el trabajo del que lo tomó después.
+    """
+
+    def __init__(self, connector, name: str, collection_name: str = "rollup_state", ttl: float = 300):
+        self.connector = connector
+        self.lease_id = f"{name}:lease"
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _expires_at(self, now: datetime) -> datetime:
+        return now + timedelta(seconds=self.ttl)
+
+    async def acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.connector.db[self.collection_name].find_one_and_update(
+                {"_id": self.lease_id, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "acquired_at": now, "expires_at": self._expires_at(now)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def renew(self):
+        now = datetime.utcnow()
+        result = await self.connector.db[self.collection_name].update_one(
+            {"_id": self.lease_id, "owner": self.owner},
+            {"$set": {"expires_at": self._expires_at(now)}},
+        )
+        if result.matched_count == 0:
+            raise LeaseLost(f"Se perdió el lease '{self.lease_id}'")
+
+    async def release(self):
+        await self.connector.db[self.collection_name].delete_one({"_id": self.lease_id, "owner": self.owner})
+
+    @asynccontextmanager
+    async def hold(self, wait: float = 0, poll: float = 1.0):
+        """Toma el lease esperando como mucho 'wait' segundos; si no, LeaseHeld."""
+        deadline = time.monotonic() + wait
+        while not await self.acquire():
+            if time.monotonic() >= deadline:
+                raise LeaseHeld(f"El lease '{self.lease_id}' lo tiene otro proceso")
+            await asyncio.sleep(poll)
+        try:
+            yield self
+        finally:
+            await self.release()
+
+
+def marked_update(_id, update: dict, batch_id: str) -> UpdateOne:
+    """
+    UpdateOne con upsert que aplica 'update' (típicamente un $inc) una sola
+    vez por lote: deja 'batch_id' en el array 'batches' del documento y no
+    coincide con los que ya lo tienen. Usar con bulk_write_once().
+    """
+    update = dict(update)
+    update["$push"] = {"batches": {"$each": [batch_id], "$slice": -KEPT_BATCH_MARKS}}
+    return UpdateOne({"_id": _id, "batches": {"$ne": batch_id}}, update, upsert=True)
+
+
+async def bulk_write_once(collection, updates):
+    """
+    bulk_write desordenado de marked_update(). Un documento que ya tenía la
+    marca del lote no coincide con el filtro y el upsert choca con su _id
+    (E11000): ese error significa "ya aplicado" y se ignora.
+    """
+    try:
+        await collection.bulk_write(updates, ordered=False)
+    except BulkWriteError as error:
+        details = error.details or {}
+        if details.get("writeConcernErrors") or any(e.get("code") != 11000 for e in details.get("writeErrors", [])):
+            raise
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from helpers.logs import get_logger
+from helpers.text import normalize, norm_field
+
+logger = get_logger("db.shadow")
+
+
+class ShadowFieldManager:
+    """
+    Mantiene los campos sombra normalizados (p. ej. 'brand_norm') que usan los
+    filtros exact/prefix de helpers.text.
+
+    Cada servicer registrado declara en 'SHADOW_FIELDS' los campos de texto que
+    se filtran por nombre. La normalización (minúsculas + sin acentos) no se
+    puede expresar en una actualización de Mongo, por eso se calcula aquí y se
+    escribe en lotes.
+
+    Quien inserte o modifique documentos de estas colecciones debe escribir
+    también los campos '*_norm' (helpers.text.normalize sobre el valor) y
+    'updated_at': los filtros exact/prefix sólo miran el campo sombra, así
+    que un documento sin él no aparece en los resultados. Como red de
+    seguridad, run_periodically() completa cada cierto tiempo los documentos
+    sin campo sombra y recalcula los modificados desde la pasada anterior
+    (por 'updated_at').
+    """
+
+    def __init__(self, connector, batch_size: int = 1000, updated_field: str = "updated_at"):
+        self.connector = connector
+        self.batch_size = batch_size
+        self.updated_field = updated_field
+        self.servicers = []
+        # Inicio de la última pasada completa por colección
+        self._last_run = {}
+
+    def register(self, *servicers):
+        self.servicers.extend(servicers)
+
+    async def backfill(self, collection_name: str, fields, rebuild: bool = False, since: datetime = None):
+        """
+        Completa los campos sombra de 'fields'. Por defecto sólo procesa los
+        documentos a los que les falta alguno; con 'since' también los
+        modificados después de esa fecha y con rebuild=True los recalcula todos.
+        Devuelve la cantidad de documentos actualizados.
+        """
+        collection = self.connector.db[collection_name]
+        clauses = [{norm_field(f): {"$exists": False}} for f in fields]
+        if since is not None:
+            clauses.append({self.updated_field: {"$gt": since}})
+        query = {} if rebuild else {"$or": clauses}
+        projection = {f: 1 for f in fields}
+
+        updated = 0
+        batch = []
+        async for doc in collection.find(query, projection):
+            values = {norm_field(f): normalize(doc.get(f)) for f in fields}
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": values}))
+            if len(batch) >= self.batch_size:
+                updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+                batch = []
+        if batch:
+            updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+
+        if updated:
+            self.connector.invalidate(collection_name)
+        return updated
+
+    async def backfill_all(self, rebuild: bool = False):
+        report = {}
+        for servicer in self.servicers:
+            fields = getattr(servicer, "SHADOW_FIELDS", [])
+            if fields:
+                started = datetime.utcnow()
+                report[servicer.collection_name] = await self.backfill(
+                    servicer.collection_name, fields, rebuild, since=self._last_run.get(servicer.collection_name)
+                )
+                self._last_run[servicer.collection_name] = started
+        return report
+
+    async def run_periodically(self, interval: float):
+        """Job de fondo: mantiene los campos sombra cada 'interval' segundos."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                report = {name: n for name, n in (await self.backfill_all()).items() if n}
+                if report:
+                    logger.info("campos sombra actualizados", extra={"fields": report})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error actualizando campos sombra: %s", e)
@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+
+class QueryTimeout(Exception):
+    """La consulta superó el presupuesto de tiempo de la herramienta (no es un error de datos)."""
+
+
+class _Budget:
+    __slots__ = ("expires_at", "expired")
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+        self.expired = False
+
+
+_current_budget: ContextVar[Optional[_Budget]] = ContextVar("tool_deadline", default=None)
+
+
+def remaining_ms() -> Optional[int]:
+    """
+    Milisegundos que le quedan a la herramienta en curso (para maxTimeMS), o
+    None fuera de una herramienta. Si ya no queda tiempo lanza QueryTimeout
+    sin ir a Mongo.
+    """
+    budget = _current_budget.get()
+    if budget is None:
+        return None
+    remaining = budget.expires_at - time.monotonic()
+    if remaining <= 0:
+        budget.expired = True
+        raise QueryTimeout("Se agotó el tiempo de la herramienta antes de la consulta")
+    return max(1, int(remaining * 1000))
+
+
+def mark_expired():
+    """Registra que una consulta de la herramienta en curso se cortó por tiempo."""
+    budget = _current_budget.get()
+    if budget is not None:
+        budget.expired = True
+
+
+class DeadlineManager:
+    """
+    Presupuesto de tiempo por herramienta.
+
+    wrap() fija un deadline en un ContextVar que MongoConnector convierte en
+    maxTimeMS de cada find/aggregate/count_documents (Mongo corta la consulta
+    del lado del servidor) y además cancela el handler con asyncio si pasa el
+    deadline más 'grace' (p. ej. esperando el pool o la red).
+
+    Los servicers y handlers atrapan Exception y devuelven valores por
+    defecto; por eso el deadline se marca como vencido en el contexto y,
+    aunque el handler se trague el QueryTimeout, la herramienta devuelve el
+    resultado de tiempo agotado en lugar de un 0 o una lista vacía engañosos.
+
+    Las herramientas de un lote heredan el deadline del lote si es más corto.
+    """
+
+    def __init__(self, default_ms: int = 10000, limits: Dict[str, int] = None, grace_ms: int = 250):
+        self.default_ms = default_ms
+        self.limits = limits or {}
+        self.grace = grace_ms / 1000
+
+    @staticmethod
+    def timeout_result(name: str, budget_ms: int) -> Dict[str, Any]:
+        return {
+            "tiempo_agotado": True,
+            "herramienta": name,
+            "limite_ms": budget_ms,
+            "msg": (
+                f"La consulta superó el tiempo máximo de {budget_ms} ms. "
+                "Acotá los filtros (rango, categoría, fechas) o pedí menos resultados y volvé a intentar."
+            ),
+        }
+
+    def budget_for(self, name: str, budget_ms: Optional[int] = None) -> int:
+        return self.limits.get(name, self.default_ms if budget_ms is None else budget_ms)
+
+    def wrap(self, name: str, fn, budget_ms: Optional[int] = None):
+        budget_ms = self.budget_for(name, budget_ms)
+        if budget_ms <= 0:
+            return fn
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            now = time.monotonic()
+            expires_at = now + budget_ms / 1000
+            parent = _current_budget.get()
+            if parent is not None:
+                expires_at = min(expires_at, parent.expires_at)
+            budget = _Budget(expires_at)
+            token = _current_budget.set(budget)
+            try:
+                result = await asyncio.wait_for(fn(*args, **kwargs), max(expires_at - now, 0) + self.grace)
+            except (QueryTimeout, asyncio.TimeoutError):
+                budget.expired = True
+                result = None
+            finally:
+                _current_budget.reset(token)
+            if budget.expired:
+                return self.timeout_result(name, budget_ms)
+            return result
+        return wrapper
@@ -0,0 +1,118 @@
+import asyncio
+import functools
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Verdadero dentro de una llamada ya admitida (p. ej. las herramientas de un lote)
+_admitted: ContextVar[bool] = ContextVar("tool_call_admitted", default=False)
+
+
+def parse_limits(spec: Optional[str]) -> Dict[str, int]:
+    """'herramienta=4,otra=8' -> {"herramienta": 4, "otra": 8}."""
+    limits = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+class _ToolSlots:
+    __slots__ = ("semaphore", "limit", "in_flight", "rejected")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+
+
+class ConcurrencyLimiter:
+    """
+    Límite de llamadas simultáneas por herramienta y en total.
+
+    Cuando no hay lugar la llamada no se encola: espera como mucho
+    'queue_timeout' segundos (0 = nada) y devuelve {"error": ...} en el formato
+    de error de las herramientas, así el cliente puede reintentar o degradar
+    en lugar de sumar latencia a una cola sin fin.
+
+    Un límite 0 deja la herramienta sin límite y fuera del límite global
+    (p. ej. la de salud). Las llamadas anidadas (las de un lote) sólo cuentan
+    para el límite de su herramienta, no para el global.
+    """
+
+    BUSY_MESSAGE = "Servidor ocupado"
+
+    def __init__(self, default_limit: int = 16, limits: Dict[str, int] = None, global_limit: int = 0, queue_timeout: float = 0.0):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self.queue_timeout = queue_timeout
+        self.global_limit = global_limit
+        self._global = asyncio.Semaphore(global_limit) if global_limit > 0 else None
+        self._global_in_flight = 0
+        self._global_rejected = 0
+        self._tools: Dict[str, _ToolSlots] = {}
+
+    async def _acquire(self, semaphore: Optional[asyncio.Semaphore]) -> bool:
+        if semaphore is None:
+            return True
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return True
+        if self.queue_timeout <= 0:
+            return False
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _busy(self, name: str, scope: str) -> Dict[str, Any]:
+        return {"error": f"{self.BUSY_MESSAGE}: '{name}' alcanzó el límite de llamadas simultáneas ({scope}). Reintente en unos segundos."}
+
+    @classmethod
+    def is_busy(cls, result: Any) -> bool:
+        return isinstance(result, dict) and str(result.get("error", "")).startswith(cls.BUSY_MESSAGE)
+
+    def wrap(self, name: str, fn, limit: Optional[int] = None):
+        slots = self._tools[name] = _ToolSlots(self.limits.get(name, self.default_limit if limit is None else limit))
+        exempt = slots.limit <= 0
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            use_global = not exempt and not _admitted.get()
+            if use_global and not await self._acquire(self._global):
+                self._global_rejected += 1
+                return self._busy(name, "global")
+            try:
+                if not await self._acquire(slots.semaphore):
+                    slots.rejected += 1
+                    return self._busy(name, "por herramienta")
+                token = _admitted.set(True)
+                slots.in_flight += 1
+                self._global_in_flight += use_global
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    slots.in_flight -= 1
+                    self._global_in_flight -= use_global
+                    _admitted.reset(token)
+                    if slots.semaphore is not None:
+                        slots.semaphore.release()
+            finally:
+                if use_global and self._global is not None:
+                    self._global.release()
+        return wrapper
+
+    def in_flight(self) -> int:
+        return self._global_in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "global": {"limit": self.global_limit, "in_flight": self._global_in_flight, "rejected": self._global_rejected},
+            "tools": {
+                name: {"limit": slots.limit, "in_flight": slots.in_flight, "rejected": slots.rejected}
+                for name, slots in sorted(self._tools.items())
+            },
+        }
@@ -0,0 +1,82 @@
+import json
+import logging
+import random
+import sys
+from datetime import datetime, timezone
+
+import bson
+
+ROOT_LOGGER = "mercalytica"
+
+# Fracción de los resúmenes de resultados (DEBUG) que se emiten
+_result_sample_rate = 1.0
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Una línea por evento: en texto ('ts nivel logger mensaje clave=valor ...')
+    o en JSON. Los campos estructurados llegan en extra={"fields": {...}}.
+    """
+
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+        if self.json_output:
+            entry = {"ts": timestamp, "level": record.levelname, "logger": record.name, "msg": record.getMessage(), **fields}
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        line = f"{timestamp} {record.levelname:<5} {record.name} {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level: str = "INFO", fmt: str = "text", result_sample_rate: float = 1.0, stream=None):
+    """Configura el logger raíz del servidor (nivel, formato y muestreo de resúmenes)."""
+    global _result_sample_rate
+    _result_sample_rate = max(0.0, min(float(result_sample_rate), 1.0))
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter(json_output=fmt == "json"))
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers[:] = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    return logger
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def summarize_result(result) -> dict:
+    """Cantidad de elementos y tamaño en BSON (codificador en C) de un resultado, en lugar del volcado completo."""
+    if isinstance(result, (list, tuple, dict)):
+        count = len(result)
+    else:
+        count = 0 if result is None else 1
+    try:
+        size = len(bson.encode({"r": result}))
+    except Exception:
+        size = -1
+    return {"count": count, "bytes": size}
+
+
+def log_result(logger: logging.Logger, operation: str, result):
+    """
+    Resumen del resultado de una consulta, a nivel DEBUG y muestreado.
+    Con DEBUG desactivado cuesta una comparación: no se formatea ni se mide nada.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if _result_sample_rate < 1.0 and random.random() >= _result_sample_rate:
+        return
+    logger.debug("resultado", extra={"fields": {"op": operation, **summarize_result(result)}})
@@ -0,0 +1,228 @@
+import functools
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Límites superiores (segundos) del histograma de latencia por herramienta
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ERROR_MESSAGE_PREFIX = "Error"
+
+
+class _Call:
+    """Acumulador de una llamada en curso (vive en un ContextVar)."""
+
+    __slots__ = ("mongo", "parent")
+
+    def __init__(self, parent: Optional["_Call"]):
+        self.mongo = 0.0
+        self.parent = parent
+
+
+class _Response:
+    """Tiempos de una respuesta MCP en curso (la llamada de más afuera)."""
+
+    __slots__ = ("handler", "result_bytes")
+
+    def __init__(self):
+        self.handler = 0.0
+        self.result_bytes = 0
+
+
+_current_call: ContextVar[Optional[_Call]] = ContextVar("current_tool_call", default=None)
+_current_response: ContextVar[Optional[_Response]] = ContextVar("current_tool_response", default=None)
+
+
+class _ToolStats:
+    __slots__ = ("calls", "errors", "timeouts", "buckets", "latency_sum", "latency_max", "mongo_sum",
+                 "serialization_sum", "result_bytes_sum", "result_bytes_max", "responses")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.mongo_sum = 0.0
+        self.serialization_sum = 0.0
+        self.result_bytes_sum = 0
+        self.result_bytes_max = 0
+        # Respuestas MCP serializadas (las llamadas dentro de un lote no cuentan)
+        self.responses = 0
+
+
+def is_timeout_result(result: Any) -> bool:
+    """Resultado de una herramienta cortada por su deadline (ver helpers.deadlines)."""
+    return isinstance(result, dict) and result.get("tiempo_agotado") is True
+
+
+def is_error_result(result: Any) -> bool:
+    """Las herramientas informan errores devolviendo {"error": ...} o {"msg": "Error ..."}."""
+    if not isinstance(result, dict):
+        return False
+    if is_timeout_result(result):
+        return True
+    if "error" in result and len(result) == 1:
+        return True
+    msg = result.get("msg")
+    return isinstance(msg, str) and msg.startswith(ERROR_MESSAGE_PREFIX)
+
+
+class ToolMetrics:
+    """
+    Métricas por herramienta MCP, en memoria y por proceso: llamadas, errores,
+    histograma de latencia, tiempo en Mongo, tiempo de serialización y tamaño
+    de la respuesta.
+
+    - track(name) envuelve el handler de la herramienta: mide su latencia y
+      abre un contexto donde MongoConnector suma el tiempo de las consultas
+      reales (los aciertos de la caché no cuentan).
+    - response(name) lo abre el servidor MCP alrededor de toda la llamada
+      (validación + handler + serialización) junto con los bytes de la
+      respuesta; la serialización es la diferencia con la latencia del handler.
+
+    Todo es aritmética sobre contadores (sin locks: corre en un solo event
+    loop), así que se puede dejar activo en producción.
+    """
+
+    def __init__(self):
+        self._tools: Dict[str, _ToolStats] = {}
+        self.started_at = time.time()
+
+    def _stats(self, name: str) -> _ToolStats:
+        stats = self._tools.get(name)
+        if stats is None:
+            stats = self._tools[name] = _ToolStats()
+        return stats
+
+    @staticmethod
+    def add_mongo_time(seconds: float):
+        call = _current_call.get()
+        if call is not None:
+            call.mongo += seconds
+
+    def track(self, name: str, fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            parent = _current_call.get()
+            call = _Call(parent)
+            token = _current_call.set(call)
+            start = time.perf_counter()
+            failed, timed_out = True, False
+            try:
+                result = await fn(*args, **kwargs)
+                failed = is_error_result(result)
+                timed_out = is_timeout_result(result)
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                _current_call.reset(token)
+                # Las herramientas de un lote también cuentan para el lote
+                if parent is not None:
+                    parent.mongo += call.mongo
+                else:
+                    response = _current_response.get()
+                    if response is not None:
+                        response.handler = elapsed
+                self._record_call(name, elapsed, call.mongo, failed, timed_out)
+        return wrapper
+
+    def _record_call(self, name: str, elapsed: float, mongo: float, failed: bool, timed_out: bool = False):
+        stats = self._stats(name)
+        stats.calls += 1
+        stats.errors += failed
+        stats.timeouts += timed_out
+        stats.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        stats.latency_sum += elapsed
+        if elapsed > stats.latency_max:
+            stats.latency_max = elapsed
+        stats.mongo_sum += mongo
+
+    @contextmanager
+    def response(self, name: str):
+        """Mide una llamada MCP completa; quien la abre anota 'result_bytes'."""
+        response = _Response()
+        token = _current_response.set(response)
+        start = time.perf_counter()
+        try:
+            yield response
+        finally:
+            total = time.perf_counter() - start
+            _current_response.reset(token)
+            if name in self._tools:
+                stats = self._tools[name]
+                stats.responses += 1
+                stats.serialization_sum += max(total - response.handler, 0.0)
+                stats.result_bytes_sum += response.result_bytes
+                if response.result_bytes > stats.result_bytes_max:
+                    stats.result_bytes_max = response.result_bytes
+
+    def snapshot(self) -> Dict[str, Any]:
+        tools = {}
+        for name, stats in sorted(self._tools.items()):
+            tools[name] = {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "error_rate": round(stats.errors / stats.calls, 4) if stats.calls else 0.0,
+                "timeouts": stats.timeouts,
+                "latency_avg_ms": round(stats.latency_sum / stats.calls * 1000, 3) if stats.calls else 0.0,
+                "latency_max_ms": round(stats.latency_max * 1000, 3),
+                "latency_buckets": {
+                    **{str(bound): count for bound, count in zip(LATENCY_BUCKETS, stats.buckets)},
+                    "+Inf": stats.buckets[-1],
+                },
+                "mongo_avg_ms": round(stats.mongo_sum / stats.calls * 1000, 3) if stats.calls else 0.0,
+                "serialization_avg_ms": round(stats.serialization_sum / stats.responses * 1000, 3) if stats.responses else 0.0,
+                "result_bytes_avg": stats.result_bytes_sum // stats.responses if stats.responses else 0,
+                "result_bytes_max": stats.result_bytes_max,
+            }
+        return {"uptime_seconds": round(time.time() - self.started_at, 1), "tools": tools}
+
+    def prometheus(self, extra: Dict[str, Dict[str, Any]] = None) -> str:
+        """Formato de exposición de texto de Prometheus."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        items = sorted(self._tools.items())
+        metric("mcp_tool_calls_total", "counter", "Llamadas por herramienta.",
+               [f'mcp_tool_calls_total{{tool="{n}"}} {s.calls}' for n, s in items])
+        metric("mcp_tool_errors_total", "counter", "Llamadas que fallaron o devolvieron un error.",
+               [f'mcp_tool_errors_total{{tool="{n}"}} {s.errors}' for n, s in items])
+        metric("mcp_tool_timeouts_total", "counter", "Llamadas cortadas por el deadline de la herramienta.",
+               [f'mcp_tool_timeouts_total{{tool="{n}"}} {s.timeouts}' for n, s in items])
+
+        histogram = []
+        for n, s in items:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                cumulative += count
+                histogram.append(f'mcp_tool_duration_seconds_bucket{{tool="{n}",le="{bound}"}} {cumulative}')
+            histogram.append(f'mcp_tool_duration_seconds_bucket{{tool="{n}",le="+Inf"}} {s.calls}')
+            histogram.append(f'mcp_tool_duration_seconds_sum{{tool="{n}"}} {s.latency_sum:.6f}')
+            histogram.append(f'mcp_tool_duration_seconds_count{{tool="{n}"}} {s.calls}')
+        metric("mcp_tool_duration_seconds", "histogram", "Latencia del handler de la herramienta.", histogram)
+
+        metric("mcp_tool_mongo_seconds_total", "counter", "Tiempo en consultas a Mongo (sin aciertos de caché).",
+               [f'mcp_tool_mongo_seconds_total{{tool="{n}"}} {s.mongo_sum:.6f}' for n, s in items])
+        metric("mcp_tool_serialization_seconds_total", "counter", "Tiempo de validación y serialización de la respuesta MCP.",
+               [f'mcp_tool_serialization_seconds_total{{tool="{n}"}} {s.serialization_sum:.6f}' for n, s in items])
+        metric("mcp_tool_result_bytes_total", "counter", "Bytes de las respuestas serializadas.",
+               [f'mcp_tool_result_bytes_total{{tool="{n}"}} {s.result_bytes_sum}' for n, s in items])
+        metric("mcp_tool_responses_total", "counter", "Respuestas MCP serializadas.",
+               [f'mcp_tool_responses_total{{tool="{n}"}} {s.responses}' for n, s in items])
+
+        # Métricas adicionales con una etiqueta (p. ej. la caché por colección)
+        for name, spec in (extra or {}).items():
+            metric(name, spec["type"], spec["help"],
+                   [f'{name}{{{spec["label"]}="{key}"}} {value}' for key, value in sorted(spec["values"].items())])
+        return "\n".join(lines) + "\n"
+
+
+tool_metrics = ToolMetrics()
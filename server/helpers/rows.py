@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import Decimal128, ObjectId
+
+
+def compact_value(value: Any) -> Any:
+    """Valor listo para JSON y corto: ObjectId como texto, fechas ISO sin microsegundos."""
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    return value
+
+
+def projection_for(columns: List[str]) -> Dict[str, int]:
+    """Proyección de Mongo que trae sólo las columnas declaradas (sin _id salvo que se pida)."""
+    projection = {column: 1 for column in columns}
+    if "_id" not in projection:
+        projection["_id"] = 0
+    return projection
+
+
+def to_rows(docs: List[Dict[str, Any]], columns: List[str]) -> Dict[str, Any]:
+    """
+    Salida compacta orientada a filas: los nombres de campo van una sola vez
+    en 'columnas' y cada documento es una lista de valores en ese orden.
+    """
+    return {
+        "columnas": columns,
+        "filas": [[compact_value(doc.get(column)) for column in columns] for doc in docs],
+    }
+
+
+async def find_rows(connector, collection_name: str, columns: List[str], query: Optional[Dict[str, Any]] = None,
+                    sort=None, limit: int = 0, cache: bool = True) -> Dict[str, Any]:
+    """find() con la proyección de las columnas y el resultado en filas."""
+    docs = await connector.find(collection_name, query, projection_for(columns), sort=sort, limit=limit, cache=cache)
+    return to_rows(docs, columns)
@@ -0,0 +1,41 @@
+import re
+import unicodedata
+
+# Modos de coincidencia para filtros de texto
+MATCH_EXACT = "exact"
+MATCH_PREFIX = "prefix"
+MATCH_REGEX = "regex"
+MATCH_MODES = (MATCH_EXACT, MATCH_PREFIX, MATCH_REGEX)
+
+NORM_SUFFIX = "_norm"
+
+
+def normalize(value) -> str:
+    """Pasa a minúsculas, elimina acentos y colapsa espacios ('  Teléfonos ' -> 'telefonos')."""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def norm_field(field: str) -> str:
+    """Nombre del campo sombra normalizado ('brand' -> 'brand_norm')."""
+    return f"{field}{NORM_SUFFIX}"
+
+
+def text_filter(field: str, value: str, mode: str = MATCH_PREFIX) -> dict:
+    """
+    Construye el filtro para 'field' según el modo:
+      - exact:  igualdad sobre el campo sombra normalizado (usa índice).
+      - prefix: regex anclada y sensible a mayúsculas sobre el campo sombra,
+                que Mongo resuelve como rango de índice.
+      - regex:  el comportamiento anterior, $regex sin anclar e insensible a
+                mayúsculas sobre el campo original (recorre toda la colección).
+    """
+    if mode == MATCH_REGEX:
+        return {field: {"$regex": value, "$options": "i"}}
+    normalized = normalize(value)
+    if mode == MATCH_EXACT:
+        return {norm_field(field): normalized}
+    return {norm_field(field): {"$regex": "^" + re.escape(normalized)}}
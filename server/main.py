@@ -1,31 +1,243 @@
 from mcp.server import FastMCP
 from services.users import UsersServicer
-from db.connection import MongoConnector
+from db.connection import MongoConnector, IndexManager
+from db.cache import ResultCache
+from db.shadow import ShadowFieldManager
+from helpers.text import MATCH_MODES, MATCH_PREFIX
+from helpers.metrics import tool_metrics, is_error_result, is_timeout_result
+from helpers.limits import ConcurrencyLimiter, parse_limits
+from helpers.deadlines import DeadlineManager
+from helpers.logs import configure_logging, get_logger
+from helpers.jsonenc import dumps_str
 from config.env import EnvConfig
 from services.companies import CompaniesServicer
 from services.products import ProductsServicer
 from services.orders import OrdersServicer 
+from services.rollups import OrdersRollupServicer
+from services.product_sales import ProductSalesServicer
+from contextlib import asynccontextmanager
+from mcp.server.fastmcp.utilities.func_metadata import func_metadata
+from mcp.types import TextContent
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from pydantic import ValidationError
+from typing import Any, Dict, List
+import asyncio
+import functools
 import logging
+import os
+import time
+import uvicorn
 
 logging.getLogger("asyncio").setLevel(logging.WARNING)
 
 
-# Inicialización del Framework y la Conexión a la Base de Datos
-mcp = FastMCP("chatbot-server")
+class InstrumentedFastMCP(FastMCP):
+    """FastMCP que mide cada llamada completa: handler + serialización + bytes de la respuesta."""
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]):
+        with tool_metrics.response(name) as response:
+            result = await super().call_tool(name, arguments)
+            content = result[0] if isinstance(result, tuple) else result
+            response.result_bytes = sum(
+                len(block.text.encode("utf-8")) for block in content if isinstance(block, TextContent)
+            )
+            return result
 
 # Configuración de la conexión a Mongo (Asumiendo que EnvConfig maneja la URL)
-urlMongo = EnvConfig().get("MONGO_URL")
-connector = MongoConnector(urlMongo, "competition_manager")
+env = EnvConfig()
+
+# Inicialización del Framework y la Conexión a la Base de Datos
+mcp = InstrumentedFastMCP(
+    "chatbot-server",
+    host=env.get("MCP_HOST", "127.0.0.1"),
+    port=int(env.get("MCP_PORT", 8000)),
+)
+
+# Logs estructurados del servidor: los resúmenes de resultados van a DEBUG y se muestrean
+configure_logging(
+    level=env.get("LOG_LEVEL", "INFO"),
+    fmt=env.get("LOG_FORMAT", "text"),
+    result_sample_rate=float(env.get("LOG_RESULT_SAMPLE_RATE", 0.01)),
+)
+logger = get_logger("main")
+
+urlMongo = env.get("MONGO_URL")
+result_cache = ResultCache(
+    maxsize=int(env.get("CACHE_MAX_ENTRIES", 1024)),
+    ttl=float(env.get("CACHE_TTL_SECONDS", 300)),
+)
+# Pool del driver acotado y timeouts explícitos: una consulta colgada o un
+# Mongo caído fallan en segundos en lugar de retener la llamada sin límite
+mongo_options = {
+    "maxPoolSize": int(env.get("MONGO_MAX_POOL_SIZE", 100)),
+    "minPoolSize": int(env.get("MONGO_MIN_POOL_SIZE", 0)),
+    "maxIdleTimeMS": int(env.get("MONGO_MAX_IDLE_TIME_MS", 60000)),
+    "waitQueueTimeoutMS": int(env.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+    "serverSelectionTimeoutMS": int(env.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+    "connectTimeoutMS": int(env.get("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    "socketTimeoutMS": int(env.get("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+}
+connector = MongoConnector(urlMongo, "competition_manager", cache=result_cache, **mongo_options)
+
+# Llamadas simultáneas por herramienta y en total: pasado el límite se responde
+# "ocupado" enseguida (TOOL_QUEUE_TIMEOUT_MS permite una espera corta)
+tool_limiter = ConcurrencyLimiter(
+    default_limit=int(env.get("TOOL_MAX_CONCURRENCY", 16)),
+    limits=parse_limits(env.get("TOOL_CONCURRENCY_LIMITS")),
+    global_limit=int(env.get("MCP_MAX_CONCURRENT_CALLS", 64)),
+    queue_timeout=float(env.get("TOOL_QUEUE_TIMEOUT_MS", 0)) / 1000,
+)
+
+# Tiempo máximo por herramienta: se propaga a Mongo como maxTimeMS y corta el
+# handler con asyncio; TOOL_TIMEOUTS="herramienta=ms,..." ajusta casos puntuales
+tool_deadlines = DeadlineManager(
+    default_ms=int(env.get("TOOL_TIMEOUT_MS", 8000)),
+    limits=parse_limits(env.get("TOOL_TIMEOUTS")),
+    grace_ms=int(env.get("TOOL_TIMEOUT_GRACE_MS", 250)),
+)
+
+# Estado del arranque (índices y campos sombra) para la herramienta de salud
+server_state = {"ready": False, "started_at": time.time()}
+
+# Modo de los filtros de texto: prefix (por defecto), exact o regex (fallback sin índice)
+match_mode = env.get("MATCH_MODE", MATCH_PREFIX).lower()
+if match_mode not in MATCH_MODES:
+    raise ValueError(f"MATCH_MODE inválido: {match_mode}. Opciones: {', '.join(MATCH_MODES)}")
 
 # Inicialización de los Servidores de Datos
-users_service = UsersServicer(connector)
-companies_service = CompaniesServicer(connector)
-products_service = ProductsServicer(connector)
-orders_service = OrdersServicer(connector)
+users_service = UsersServicer(connector, match_mode)
+companies_service = CompaniesServicer(connector, match_mode)
+products_service = ProductsServicer(connector, match_mode)
+orders_rollups = OrdersRollupServicer(connector)
+product_sales = ProductSalesServicer(connector)
+orders_rollups.add_observer(product_sales)
+orders_service = OrdersServicer(connector, match_mode, rollups=orders_rollups, product_sales=product_sales)
+
+# Índices requeridos por cada servicer (se verifican al arrancar)
+index_manager = IndexManager(connector)
+index_manager.register(users_service, companies_service, products_service, orders_service, orders_rollups, product_sales)
+
+# Campos sombra normalizados para los filtros exact/prefix
+shadow_manager = ShadowFieldManager(connector)
+shadow_manager.register(users_service, companies_service, products_service, orders_service)
+
+# Registro de herramientas: además de publicarlas en MCP, las guarda por nombre
+# para poder invocarlas en proceso (ver ejecutar_lote). Cada handler se
+# instrumenta (llamadas, latencia, tiempo en Mongo, errores), tiene un deadline
+# y pasa por el límite de concurrencia.
+TOOLS = {}
+# Modelo pydantic de los argumentos de cada herramienta (el mismo con el que FastMCP valida)
+TOOL_ARG_MODELS = {}
+
+def json_content(fn):
+    """
+    Serializa el resultado con el encoder orjson (ObjectId, datetime y
+    Decimal128 nativos, sin indentación) y lo entrega ya como TextContent,
+    así FastMCP no vuelve a pasarlo por pydantic.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return TextContent(type="text", text=dumps_str(await fn(*args, **kwargs)))
+    return wrapper
+
+def tool(name: str, max_concurrency: int = None, timeout_ms: int = None):
+    """
+    Registra la herramienta. max_concurrency=0 la deja fuera de los límites de
+    concurrencia y timeout_ms=0 sin deadline.
+    """
+    def decorator(fn):
+        tracked = tool_metrics.track(name, tool_deadlines.wrap(name, fn, timeout_ms))
+        limited = tool_limiter.wrap(name, tracked, max_concurrency)
+        # En proceso (lotes) se usa el resultado Python; por MCP, el JSON ya serializado
+        TOOLS[name] = limited
+        mcp.tool(name)(json_content(limited))
+        TOOL_ARG_MODELS[name] = func_metadata(fn).arg_model
+        return limited
+    return decorator
+
+# ? ----------------- Métricas
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_prometheus(request: Request):
+    """Métricas por herramienta y de la caché en formato de texto de Prometheus."""
+    cache_stats = result_cache.stats()["by_collection"]
+    extra = {
+        "mcp_cache_hits_total": {
+            "type": "counter", "help": "Aciertos de la caché de resultados.", "label": "collection",
+            "values": {name: entry["hits"] for name, entry in cache_stats.items()},
+        },
+        "mcp_cache_misses_total": {
+            "type": "counter", "help": "Fallos de la caché de resultados.", "label": "collection",
+            "values": {name: entry["misses"] for name, entry in cache_stats.items()},
+        },
+        "mcp_tool_rejected_total": {
+            "type": "counter", "help": "Llamadas rechazadas por el límite de concurrencia.", "label": "tool",
+            "values": {name: entry["rejected"] for name, entry in tool_limiter.stats()["tools"].items()},
+        },
+        "mcp_tool_in_flight": {
+            "type": "gauge", "help": "Llamadas en curso por herramienta.", "label": "tool",
+            "values": {name: entry["in_flight"] for name, entry in tool_limiter.stats()["tools"].items()},
+        },
+    }
+    return PlainTextResponse(tool_metrics.prometheus(extra), media_type="text/plain; version=0.0.4")
+
+@mcp.custom_route("/metrics.json", methods=["GET"])
+async def metrics_json(request: Request):
+    """Foto en JSON de las métricas por herramienta y de la caché."""
+    return JSONResponse({**tool_metrics.snapshot(), "cache": result_cache.stats(), "concurrency": tool_limiter.stats()})
+
+# ? ----------------- Salud
+
+HEALTH_MONGO_TIMEOUT = float(env.get("HEALTH_MONGO_TIMEOUT_MS", 2000)) / 1000
+
+async def _health() -> Dict[str, Any]:
+    mongo = {"ok": False, "latencia_ms": None, "error": None}
+    try:
+        latency = await asyncio.wait_for(connector.ping(), HEALTH_MONGO_TIMEOUT)
+        mongo.update(ok=True, latencia_ms=round(latency * 1000, 2))
+    except asyncio.TimeoutError:
+        mongo["error"] = f"sin respuesta en {HEALTH_MONGO_TIMEOUT:.1f}s"
+    except Exception as error:
+        mongo["error"] = str(error)[:200]
+
+    concurrency = tool_limiter.stats()["global"]
+    if not mongo["ok"]:
+        status = "caido"
+    elif not server_state["ready"]:
+        status = "iniciando"
+    elif concurrency["limit"] and concurrency["in_flight"] >= concurrency["limit"]:
+        status = "saturado"
+    else:
+        status = "ok"
+    return {
+        "estado": status,
+        "listo": status == "ok",
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - server_state["started_at"], 1),
+        "mongo": mongo,
+        "llamadas_en_curso": concurrency["in_flight"],
+        "limite_llamadas": concurrency["limit"],
+        "rechazadas": concurrency["rejected"],
+    }
+
+@tool("estado_servidor", max_concurrency=0, timeout_ms=0)
+async def estado_servidor():
+    """
+    Estado del servidor: conexión a Mongo (latencia), arranque completo y carga
+    actual (llamadas en curso y rechazadas). 'listo' indica si puede atender consultas.
+    """
+    return await _health()
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request: Request):
+    """Sonda HTTP de readiness: 200 si está listo, 503 si no."""
+    result = await _health()
+    return JSONResponse(result, status_code=200 if result["listo"] else 503)
 
 # ? ----------------- Herramientas relacionadas con usuarios 
 
-@mcp.tool("contar_usuarios_por_tipo")
+@tool("contar_usuarios_por_tipo")
 async def contar_usuarios_por_tipo():
     """Cuenta y agrupa usuarios por su tipo (comprador, vendedor, etc.)."""
     try:
@@ -34,62 +246,57 @@ async def contar_usuarios_por_tipo():
     except Exception as e:
         return {"error": str(e)}
 
-@mcp.tool("total_usuarios") 
+@tool("total_usuarios") 
 async def total_usuarios():
     """Devuelve el número total de usuarios registrados en el sistema."""
     try:
         result = await users_service.total_users()
         return {"total": result}
     except Exception as error:
-        print("Error en la herramienta: total_usuarios")
-        print(error)
+        logger.error("Error en la herramienta total_usuarios: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("usuarios_por_ubicacion") 
+@tool("usuarios_por_ubicacion") 
 async def usuarios_por_ubicacion():
     """Agrupa y cuenta usuarios por su ubicación geográfica."""
     try:
         result = await users_service.users_by_location()
         return result if result else {"mensaje": "No se encontraron ubicaciones de usuario."}
     except Exception as error:
-        print("Error en la herramienta: usuarios_por_ubicacion")
-        print(error)
+        logger.error("Error en la herramienta usuarios_por_ubicacion: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("usuarios_registrados_despues_de") 
+@tool("usuarios_registrados_despues_de") 
 async def usuarios_registrados_despues_de(year: int):
     """Cuenta el total de usuarios que se registraron después de un año dado."""
     try:
         result = await users_service.registered_after(year)
         return {"anio": year, "total": result}
     except Exception as error:
-        print("Error en la herramienta: usuarios_registrados_despues_de")
-        print(error)
+        logger.error("Error en la herramienta usuarios_registrados_despues_de: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("ultima_compra_en_anio")
+@tool("ultima_compra_en_anio")
 async def ultima_compra_en_anio(year: int):
     """Cuenta los usuarios que realizaron su última compra dentro de un año específico."""
     try:
         result = await users_service.last_purchase_in_year(year)
         return {"anio": year, "total": result}
     except Exception as error:
-        print("Error en la herramienta: ultima_compra_en_anio")
-        print(error)
+        logger.error("Error en la herramienta ultima_compra_en_anio: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("compradores_por_ubicacion") 
+@tool("compradores_por_ubicacion") 
 async def compradores_por_ubicacion(location: str):
     """Cuenta los usuarios clasificados como 'compradores' en una ubicación dada."""
     try:
         result = await users_service.buyers_in_location(location)
         return {"ubicacion": location, "total": result}
     except Exception as error:
-        print("Error en la herramienta: compradores_por_ubicacion")
-        print(error)
+        logger.error("Error en la herramienta compradores_por_ubicacion: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("usuarios_registrados_en_empresa_anio")
+@tool("usuarios_registrados_en_empresa_anio")
 async def usuarios_registrados_en_empresa_anio(empresa: str, year: int):
     """Cuenta los usuarios registrados en una empresa específica y después de un año dado."""
     try:
@@ -97,325 +304,417 @@ async def usuarios_registrados_en_empresa_anio(empresa: str, year: int):
         # Se renombra 'año' por 'anio' en el diccionario de retorno para consistencia.
         return {"empresa": empresa, "anio": year, "total": result}
     except Exception as error:
-        print("Error en la herramienta: usuarios_registrados_en_empresa_anio")
-        print(error)
+        logger.error("Error en la herramienta usuarios_registrados_en_empresa_anio: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
 
 # ? ----------------- Herramientas relacionadas con las compañías 
 
-@mcp.tool("total_companias")
+@tool("total_companias")
 async def total_companias():
     """Devuelve el número total de compañías registradas."""
     try:
         result = await companies_service.total_companies()
         return {"total": result}
     except Exception as error:
-        print("Error en la herramienta: total_companias")
-        print(error)
+        logger.error("Error en la herramienta total_companias: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("contar_companias_por_tipo")
+@tool("contar_companias_por_tipo")
 async def contar_companias_por_tipo():
     """Agrupa y cuenta compañías por su tipo."""
     try:
         result = await companies_service.count_by_type()
         return result if result else {"mensaje": "No se encontraron tipos de compañía."}
     except Exception as error:
-        print("Error en la herramienta: contar_companias_por_tipo")
-        print(error)
+        logger.error("Error en la herramienta contar_companias_por_tipo: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("companias_por_ubicacion")
+@tool("companias_por_ubicacion")
 async def companias_por_ubicacion():
     """Agrupa y cuenta compañías por su ubicación."""
     try:
         result = await companies_service.companies_by_location()
         return result if result else {"mensaje": "No se encontraron ubicaciones de compañía."}
     except Exception as error:
-        print("Error en la herramienta: companias_por_ubicacion")
-        print(error)
+        logger.error("Error en la herramienta companias_por_ubicacion: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("companias_por_reputacion") 
+@tool("companias_por_reputacion") 
 async def companias_por_reputacion():
     """Agrupa y cuenta compañías por su reputación."""
     try:
         result = await companies_service.companies_by_reputation()
         return result if result else {"mensaje": "No se encontraron reputaciones de compañía."}
     except Exception as error:
-        print("Error en la herramienta: companias_por_reputacion")
-        print(error)
+        logger.error("Error en la herramienta companias_por_reputacion: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("companias_registradas_despues_de")
+@tool("companias_registradas_despues_de")
 async def companias_registradas_despues_de(year: int):
     """Cuenta compañías registradas después de un año dado."""
     try:
         result = await companies_service.registered_after(year)
         return {"anio": year, "total": result}
     except Exception as error:
-        print("Error en la herramienta: companias_registradas_despues_de")
-        print(error)
+        logger.error("Error en la herramienta companias_registradas_despues_de: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("companias_activas_en_anio")
+@tool("companias_activas_en_anio")
 async def companias_activas_en_anio(year: int):
     """Cuenta compañías con actividad (actualizadas) en un año dado."""
     try:
         result = await companies_service.active_in_year(year)
         return {"anio": year, "total": result}
     except Exception as error:
-        print("Error en la herramienta: companias_activas_en_anio")
-        print(error)
+        logger.error("Error en la herramienta companias_activas_en_anio: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("contar_companias_por_tipo_y_ubicacion")
+@tool("contar_companias_por_tipo_y_ubicacion")
 async def contar_companias_por_tipo_y_ubicacion(company_type: str, location: str):
     """Cuenta compañías de un tipo y ubicación específicos."""
     try:
         result = await companies_service.count_by_type_and_location(company_type, location)
         return {"tipo": company_type, "ubicacion": location, "total": result}
     except Exception as error:
-        print("Error en la herramienta: contar_companias_por_tipo_y_ubicacion")
-        print(error)
+        logger.error("Error en la herramienta contar_companias_por_tipo_y_ubicacion: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("companias_alto_volumen_ventas")  
+@tool("companias_alto_volumen_ventas")  
 async def companias_alto_volumen_ventas(min_volume: int):
     """Cuenta las compañías con un volumen de ventas superior o igual al mínimo dado."""
     try:
         result = await companies_service.high_sales_volume(min_volume)
         return {"volumen_minimo": min_volume, "total": result}
     except Exception as error:
-        print("Error en la herramienta: companias_alto_volumen_ventas")
-        print(error)
+        logger.error("Error en la herramienta companias_alto_volumen_ventas: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("top_companias_por_ventas") 
+@tool("top_companias_por_ventas") 
 async def top_companias_por_ventas(limit: int = 10):
     """Devuelve las N compañías con mayor volumen de ventas."""
     try:
         result = await companies_service.top_by_sales_volume(limit)
         return result
     except Exception as error:
-        print("Error en la herramienta: top_companias_por_ventas")
-        print(error)
+        logger.error("Error en la herramienta top_companias_por_ventas: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
 # ? ----------------- herramientas relacionadas con los productos del mercado  
 
-@mcp.tool("total_productos") 
+@tool("total_productos") 
 async def total_productos():
     """Devuelve el número total de productos disponibles."""
     try:
         result = await products_service.total_products()
         return {"total": result}
     except Exception as error:
-        print(f"Error en la herramienta: total_productos: {error}")
+        logger.error("Error en la herramienta total_productos: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("contar_productos_por_marca") 
+@tool("contar_productos_por_marca") 
 async def contar_productos_por_marca():
     """Agrupa y cuenta productos por marca."""
     try:
         result = await products_service.count_by_brand()
         return result if result else {"mensaje": "No se encontraron marcas."}
     except Exception as error:
-        print(f"Error en la herramienta: contar_productos_por_marca: {error}")
+        logger.error("Error en la herramienta contar_productos_por_marca: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("contar_productos_por_categoria") 
+@tool("contar_productos_por_categoria") 
 async def contar_productos_por_categoria():
     """Agrupa y cuenta productos por categoría."""
     try:
         result = await products_service.count_by_category()
         return result if result else {"mensaje": "No se encontraron categorías."}
     except Exception as error:
-        print(f"Error en la herramienta: contar_productos_por_categoria: {error}")
+        logger.error("Error en la herramienta contar_productos_por_categoria: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("productos_en_stock") 
+@tool("productos_en_stock") 
 async def productos_en_stock(min_stock: int = 1):
     """Cuenta los productos con stock mayor o igual al mínimo dado."""
     try:
         result = await products_service.products_in_stock(min_stock)
         return {"stock_minimo": min_stock, "total": result}
     except Exception as error:
-        print(f"Error en la herramienta: productos_en_stock: {error}")
+        logger.error("Error en la herramienta productos_en_stock: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("productos_por_marca_y_categoria") 
+@tool("productos_por_marca_y_categoria") 
 async def productos_por_marca_y_categoria(brand: str, category: str):
     """Cuenta productos de una marca y categoría específicas."""
     try:
         result = await products_service.products_by_brand_and_category(brand, category)
         return {"marca": brand, "categoria": category, "total": result}
     except Exception as error:
-        print(f"Error en la herramienta: productos_por_marca_y_categoria: {error}")
+        logger.error("Error en la herramienta productos_por_marca_y_categoria: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("productos_por_rango_precio") 
+@tool("productos_por_rango_precio") 
 async def productos_por_rango_precio(min_price: float, max_price: float):
     """Cuenta productos dentro de un rango de precios dado."""
     try:
         result = await products_service.products_by_price_range(min_price, max_price)
         return {"precio_min": min_price, "precio_max": max_price, "total": result}
     except Exception as error:
-        print(f"Error en la herramienta: productos_por_rango_precio: {error}")
+        logger.error("Error en la herramienta productos_por_rango_precio: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("top_productos_mas_caros") 
+@tool("top_productos_mas_caros") 
 async def top_productos_mas_caros(limit: int = 10):
     """Devuelve los N productos con el precio más alto (más caros)."""
     try:
         result = await products_service.top_by_price(limit)
         return result
     except Exception as error:
-        print(f"Error en la herramienta: top_productos_mas_caros: {error}")
+        logger.error("Error en la herramienta top_productos_mas_caros: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("productos_publicados_recientemente") 
+@tool("productos_publicados_recientemente") 
 async def productos_publicados_recientemente(limit: int = 10):
     """Devuelve los N productos publicados más recientemente."""
     try:
         result = await products_service.latest_published(limit)
         return result
     except Exception as error:
-        print(f"Error en la herramienta: productos_publicados_recientemente: {error}")
+        logger.error("Error en la herramienta productos_publicados_recientemente: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("precio_promedio_por_categoria") 
+@tool("precio_promedio_por_categoria") 
 async def precio_promedio_por_categoria():
     """Calcula el precio promedio de los productos agrupados por categoría."""
     try:
         result = await products_service.average_price_by_category()
         return result if result else {"mensaje": "No hay datos para calcular el promedio."}
     except Exception as error:
-        print(f"Error en la herramienta: precio_promedio_por_categoria: {error}")
+        logger.error("Error en la herramienta precio_promedio_por_categoria: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("contar_productos_por_reputacion") 
+@tool("contar_productos_por_reputacion") 
 async def contar_productos_por_reputacion():
     """Agrupa y cuenta productos por reputación de la compañía."""
     try:
         result = await products_service.count_by_reputation()
         return result if result else {"mensaje": "No se encontraron reputaciones."}
     except Exception as error:
-        print(f"Error en la herramienta: contar_productos_por_reputacion: {error}")
+        logger.error("Error en la herramienta contar_productos_por_reputacion: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("productos_sin_stock") 
+@tool("productos_sin_stock") 
 async def productos_sin_stock():
     """Cuenta el número total de productos con stock cero."""
     try:
         result = await products_service.out_of_stock_products()
         return {"total": result}
     except Exception as error:
-        print(f"Error en la herramienta: productos_sin_stock: {error}")
+        logger.error("Error en la herramienta productos_sin_stock: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("productos_actualizados_recientemente") 
+@tool("productos_actualizados_recientemente") 
 async def productos_actualizados_recientemente(days: int):
     """Devuelve los productos actualizados en los últimos N días (máx. 100)."""
     try:
         result = await products_service.recently_updated_products(days)
         return result
     except Exception as error:
-        print(f"Error en la herramienta: productos_actualizados_recientemente: {error}")
+        logger.error("Error en la herramienta productos_actualizados_recientemente: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("top_productos_mas_baratos") 
+@tool("top_productos_mas_baratos") 
 async def top_productos_mas_baratos(limit: int = 10):
     """Devuelve los N productos con el precio más bajo (más baratos)."""
     try:
         result = await products_service.top_by_price_ascending(limit)
         return result
     except Exception as error:
-        print(f"Error en la herramienta: top_productos_mas_baratos: {error}")
+        logger.error("Error en la herramienta top_productos_mas_baratos: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("buscar_productos") 
-async def buscar_productos(query: str, limit: int = 10):
-    """Busca productos por nombre, marca o categoría usando un término de búsqueda case-insensitive."""
+@tool("buscar_productos") 
+async def buscar_productos(query: str, limit: int = 10, page: int = 1):
+    """Busca productos por nombre, marca o categoría ordenados por relevancia. Pagina con 'page' (máx. 50 por página)."""
     try:
-        result = await products_service.search_products(query, limit)
+        result = await products_service.search_products(query, limit, page)
         return result
     except Exception as error:
-        print(f"Error en la herramienta: buscar_productos: {error}")
+        logger.error("Error en la herramienta buscar_productos: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
 # ? ----------------- herramientas relacionadas con los pedidos (ÓRDENES) 
 
-@mcp.tool("total_pedidos")
+@tool("total_pedidos")
 async def total_pedidos():
     """Devuelve el número total de pedidos (órdenes) realizados en el sistema."""
     try:
         result = await orders_service.total_orders()
         return {"total_pedidos": result}
     except Exception as error:
-        print(f"Error en la herramienta: total_pedidos: {error}")
+        logger.error("Error en la herramienta total_pedidos: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("ingreso_total")
+@tool("ingreso_total")
 async def ingreso_total():
     """Calcula el ingreso total (revenue) sumado de todos los pedidos."""
     try:
         result = await orders_service.total_revenue()
         return {"ingreso_total": result}
     except Exception as error:
-        print(f"Error en la herramienta: ingreso_total: {error}")
+        logger.error("Error en la herramienta ingreso_total: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("contar_pedidos_por_estado")
+@tool("contar_pedidos_por_estado")
 async def contar_pedidos_por_estado():
     """Agrupa y cuenta la cantidad de pedidos por su estado (ej: 'delivered', 'pending')."""
     try:
         result = await orders_service.count_orders_by_status()
         return result if result else {"mensaje": "No se encontraron estados de pedido."}
     except Exception as error:
-        print(f"Error en la herramienta: contar_pedidos_por_estado: {error}")
+        logger.error("Error en la herramienta contar_pedidos_por_estado: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("promedio_total_pedido")
+@tool("promedio_total_pedido")
 async def promedio_total_pedido():
     """Calcula el valor promedio de las órdenes (total de la orden)."""
     try:
         result = await orders_service.average_order_total()
         return {"promedio_total_pedido": result}
     except Exception as error:
-        print(f"Error en la herramienta: promedio_total_pedido: {error}")
+        logger.error("Error en la herramienta promedio_total_pedido: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("pedidos_por_estado_y_tiempo")
+@tool("pedidos_por_estado_y_tiempo")
 async def pedidos_por_estado_y_tiempo(status: str, days: int):
     """Cuenta pedidos con un estado específico realizados en los últimos N días."""
     try:
         result = await orders_service.orders_by_status_and_time(status, days)
         return {"estado": status, "dias": days, "total": result}
     except Exception as error:
-        print(f"Error en la herramienta: pedidos_por_estado_y_tiempo: {error}")
+        logger.error("Error en la herramienta pedidos_por_estado_y_tiempo: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("ingreso_total_por_anio") 
+@tool("ingreso_total_por_anio") 
 async def ingreso_total_por_anio(year: int):
     """Calcula el ingreso total generado por pedidos en un año específico."""
     try:
         result = await orders_service.revenue_by_year(year)
         return {"anio": year, "ingreso_total": result}
     except Exception as error:
-        print(f"Error en la herramienta: ingreso_total_por_anio: {error}")
+        logger.error("Error en la herramienta ingreso_total_por_anio: %s", error)
         return {"msg": "Error inesperado, por favor intente de nuevo"}
 
-@mcp.tool("top_productos_mas_vendidos")
-async def top_productos_mas_vendidos(limit: int = 10):
-    """Identifica y devuelve los IDs de los N productos más vendidos por cantidad total."""
+@tool("top_productos_mas_vendidos")
+async def top_productos_mas_vendidos(limit: int = 10, by: str = "quantity", days: int = 0):
+    """Devuelve los N productos más vendidos, por cantidad ('quantity') o ingreso ('revenue'); con 'days' > 0 sólo cuenta los últimos N días."""
     try:
-        result = await orders_service.top_selling_products_by_quantity(limit)
+        result = await orders_service.top_selling_products_by_quantity(limit, by, days or None)
         return result
     except Exception as error:
-        print(f"Error en la herramienta: top_productos_mas_vendidos: {error}")
-        return {"msg": "Error inesperado, por favor intente de nuevo"}
+        logger.error("Error en la herramienta top_productos_mas_vendidos: %s", error)
+        return {"msg": "Error inesperado, por favor intente de nuevo"}
+
+# ? ----------------- Ejecución por lotes
+
+BATCH_MAX_ITEMS = int(env.get("BATCH_MAX_ITEMS", 20))
+BATCH_MAX_CONCURRENCY = int(env.get("BATCH_MAX_CONCURRENCY", 8))
+# Deadline del lote completo; cada herramienta del lote usa el menor entre el suyo y lo que le queda al lote
+BATCH_TIMEOUT_MS = int(env.get("BATCH_TIMEOUT_MS", 20000))
+
+async def _run_batch_item(index: int, invocation: Dict[str, Any], semaphore: asyncio.Semaphore):
+    name = invocation.get("tool") if isinstance(invocation, dict) else None
+    fn = TOOLS.get(name)
+    if fn is None or name == "ejecutar_lote":
+        return {"indice": index, "tool": name, "ok": False, "error": f"Herramienta desconocida: {name}"}
+    args = invocation.get("args") or {}
+    if not isinstance(args, dict):
+        return {"indice": index, "tool": name, "ok": False, "error": "'args' debe ser un objeto"}
+    try:
+        # Misma validación y conversión de tipos que una llamada MCP
+        args = TOOL_ARG_MODELS[name].model_validate(args).model_dump_one_level()
+    except ValidationError as error:
+        return {"indice": index, "tool": name, "ok": False, "error": f"Argumentos inválidos: {error}"}
+    try:
+        async with semaphore:
+            result = await fn(**args)
+        if is_timeout_result(result):
+            return {"indice": index, "tool": name, "ok": False, "tiempo_agotado": True, "error": result["msg"]}
+        if is_error_result(result):
+            return {"indice": index, "tool": name, "ok": False, "error": result.get("error") or result.get("msg")}
+        return {"indice": index, "tool": name, "ok": True, "resultado": result}
+    except TypeError as error:
+        return {"indice": index, "tool": name, "ok": False, "error": f"Argumentos inválidos: {error}"}
+    except Exception as error:
+        logger.error("Error en el lote, herramienta %s: %s", name, error)
+        return {"indice": index, "tool": name, "ok": False, "error": "Error inesperado, por favor intente de nuevo"}
+
+@tool("ejecutar_lote", timeout_ms=BATCH_TIMEOUT_MS)
+async def ejecutar_lote(invocaciones: List[Dict[str, Any]], max_concurrencia: int = BATCH_MAX_CONCURRENCY):
+    """
+    Ejecuta varias herramientas en una sola llamada, en paralelo, y devuelve todos los resultados.
+    Cada invocación es {"tool": "<nombre>", "args": {...}}. Usala cuando necesites varios datos a la vez
+    (p. ej. un panorama del mercado). Los errores se informan por cada invocación.
+    """
+    if len(invocaciones) > BATCH_MAX_ITEMS:
+        return {"msg": f"El lote admite como máximo {BATCH_MAX_ITEMS} invocaciones."}
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrencia, BATCH_MAX_CONCURRENCY)))
+    results = await asyncio.gather(*(
+        _run_batch_item(index, invocation, semaphore) for index, invocation in enumerate(invocaciones)
+    ))
+    return {"resultados": results}
+
+# ? ----------------- Arranque del servidor
+
+def build_app():
+    """
+    Construye la app ASGI de streamable HTTP y le añade las tareas de arranque.
+    El lifespan de FastMCP se ejecuta por sesión MCP, por eso el arranque
+    se engancha al lifespan de la app Starlette (una vez por proceso).
+    """
+    app = mcp.streamable_http_app()
+    session_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        try:
+            if env.get("SHADOW_BACKFILL", "true").lower() == "true":
+                logger.info("campos sombra normalizados", extra={"fields": await shadow_manager.backfill_all()})
+            await index_manager.bootstrap(
+                create=env.get("INDEX_BOOTSTRAP", "true").lower() == "true",
+                explain=env.get("INDEX_EXPLAIN", "true").lower() == "true",
+            )
+        except Exception as error:
+            # Un fallo en la verificación de índices no debe impedir arrancar
+            logger.error("Error en el arranque de índices / campos sombra: %s", error)
+        server_state["ready"] = True
+
+        # Jobs de fondo que mantienen los rollups de pedidos y los campos sombra (0 los desactiva)
+        background = []
+        rollup_interval = float(env.get("ROLLUP_REFRESH_SECONDS", 60))
+        if rollup_interval > 0:
+            background.append(asyncio.create_task(orders_rollups.run_periodically(rollup_interval)))
+        shadow_interval = float(env.get("SHADOW_REFRESH_SECONDS", 60))
+        if shadow_interval > 0:
+            background.append(asyncio.create_task(shadow_manager.run_periodically(shadow_interval)))
+        try:
+            async with session_lifespan(app):
+                yield
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+    app.router.lifespan_context = lifespan
+    return app
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
\ No newline at end of file
+    limit_concurrency = int(env.get("HTTP_LIMIT_CONCURRENCY", 0))
+    uvicorn.run(
+        build_app(),
+        host=mcp.settings.host,
+        port=mcp.settings.port,
+        # Conexiones HTTP simultáneas: pasado el límite uvicorn responde 503 (0 = sin límite)
+        limit_concurrency=limit_concurrency or None,
+        timeout_keep_alive=int(env.get("HTTP_KEEP_ALIVE_SECONDS", 15)),
+        timeout_graceful_shutdown=float(env.get("HTTP_GRACEFUL_TIMEOUT", 30)),
+    )
\ No newline at end of file
@@ -1,93 +1,157 @@
 from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from helpers.text import text_filter, MATCH_PREFIX
+from helpers.logs import get_logger, log_result
+from helpers.rows import find_rows
+
+logger = get_logger("services.companies")
 
 class CompaniesServicer:
-    def __init__(self, connector):
+    # Índices que necesitan las consultas de este servicer (ver IndexManager)
+    INDEXES = [
+        IndexModel([("registered_at", DESCENDING)]),
+        IndexModel([("last_activity", DESCENDING)]),
+        IndexModel([("sales_volume", DESCENDING)]),
+        IndexModel([("type_norm", ASCENDING), ("location_norm", ASCENDING)]),
+        IndexModel([("reputation_norm", ASCENDING), ("location_norm", ASCENDING)]),
+    ]
+
+    # Campos de texto con campo sombra normalizado (ver ShadowFieldManager)
+    SHADOW_FIELDS = ["type", "location", "reputation"]
+
+    # Columnas que devuelve cada listado (proyección + salida en filas, ver helpers.rows)
+    LISTING_COLUMNS = {
+        "top_by_sales_volume": ["name", "type", "location", "reputation", "sales_volume"],
+        "latest_active": ["name", "type", "location", "last_activity"],
+    }
+    # Orden de cada listado (el mismo que verifica query_plans)
+    LISTING_SORTS = {
+        "top_by_sales_volume": [("sales_volume", DESCENDING)],
+        "latest_active": [("last_activity", DESCENDING)],
+    }
+
+    def __init__(self, connector, match_mode: str = MATCH_PREFIX):
         self.connector = connector
         self.collection_name = "companies"
+        # Modo de los filtros de texto: exact, prefix o regex (fallback anterior)
+        self.match_mode = match_mode
+
+    def query_plans(self):
+        """
+        Consultas representativas para verificar el plan con explain(). Se
+        arman con los mismos constructores que los métodos, así no se desfasan.
+        """
+        return [
+            {"name": "registered_after", "filter": self._registered_after_query(2024)},
+            {"name": "active_in_year", "filter": self._active_in_year_query(2024)},
+            {"name": "high_sales_volume", "filter": self._high_sales_query(1000)},
+            {"name": "count_by_type_and_location", "filter": self._type_and_location_query("tienda", "formosa")},
+            {"name": "reputation_in_location", "filter": self._reputation_in_location_query("gold", "formosa")},
+            *({"name": name, "sort": sort, "limit": 10} for name, sort in self.LISTING_SORTS.items()),
+        ]
+
+    # --- Constructores de filtros ---
+
+    @staticmethod
+    def _registered_after_query(year: int):
+        return { "registered_at": { "$gt": datetime(year, 1, 1) } }
+
+    @staticmethod
+    def _active_in_year_query(year: int):
+        return { "last_activity": { "$gte": datetime(year, 1, 1), "$lt": datetime(year + 1, 1, 1) } }
+
+    @staticmethod
+    def _high_sales_query(min_volume: int):
+        return { "sales_volume": { "$gte": min_volume } }
+
+    def _type_and_location_query(self, company_type: str, location: str):
+        return {
+            **text_filter("type", company_type, self.match_mode),
+            **text_filter("location", location, self.match_mode)
+        }
+
+    def _reputation_in_location_query(self, reputation: str, location: str):
+        return {
+            **text_filter("reputation", reputation, self.match_mode),
+            **text_filter("location", location, self.match_mode)
+        }
 
     async def total_companies(self):
         """Devuelve el número total de compañías registradas."""
         result = await self.connector.count(self.collection_name)
-        print("Result in service total_companies:", result)
+        log_result(logger, "total_companies", result)
         return result
 
     async def count_by_type(self):
         """Agrupa y cuenta compañías por su tipo (type)."""
         pipeline = [{ "$group": { "_id": "$type", "count": { "$sum": 1 } } }]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service count_by_type:", result)
+        log_result(logger, "count_by_type", result)
         return result
 
     async def companies_by_location(self):
         """Agrupa y cuenta compañías por su ubicación (location)."""
         pipeline = [{ "$group": { "_id": "$location", "count": { "$sum": 1 } } }]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service companies_by_location:", result)
+        log_result(logger, "companies_by_location", result)
         return result
 
     async def companies_by_reputation(self):
         """Agrupa y cuenta compañías por su reputación (reputation)."""
         pipeline = [{ "$group": { "_id": "$reputation", "count": { "$sum": 1 } } }]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service companies_by_reputation:", result)
+        log_result(logger, "companies_by_reputation", result)
         return result
     
     
     async def registered_after(self, year: int):
         """Cuenta las compañías registradas después del 1 de enero del año dado."""
-        start_date = datetime(year, 1, 1)
-        query = { "registered_at": { "$gt": start_date } }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service registered_after:", result)
+        query = self._registered_after_query(year)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "registered_after", result)
         return result
 
     async def active_in_year(self, year: int):
         """Cuenta las compañías con actividad (last_activity) en el año dado."""
-        start_year = datetime(year, 1, 1)
-        end_year = datetime(year + 1, 1, 1)
-        query = { "last_activity": { "$gte": start_year, "$lt": end_year } }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service active_in_year:", result)
+        query = self._active_in_year_query(year)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "active_in_year", result)
         return result
 
     async def count_by_type_and_location(self, company_type: str, location: str):
-        """Cuenta compañías de un tipo y ubicación específicos (insensible a mayúsculas)."""
-        query = {
-            "type": { "$regex": company_type, "$options": "i" },
-            "location": { "$regex": location, "$options": "i" }
-        }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service count_by_type_and_location:", result)
+        """Cuenta compañías de un tipo y ubicación específicos (insensible a mayúsculas y acentos)."""
+        query = self._type_and_location_query(company_type, location)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "count_by_type_and_location", result)
         return result
 
     async def high_sales_volume(self, min_volume: int):
         """Cuenta las compañías con un volumen de ventas (sales_volume) superior o igual al mínimo dado."""
-        query = { "sales_volume": { "$gte": min_volume } }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service high_sales_volume:", result)
+        query = self._high_sales_query(min_volume)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "high_sales_volume", result)
         return result
 
     async def reputation_in_location(self, reputation: str, location: str):
-        """Cuenta compañías con una reputación y ubicación dadas (insensible a mayúsculas)."""
-        query = {
-            "reputation": { "$regex": reputation, "$options": "i" },
-            "location": { "$regex": location, "$options": "i" }
-        }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service reputation_in_location:", result)
+        """Cuenta compañías con una reputación y ubicación dadas (insensible a mayúsculas y acentos)."""
+        query = self._reputation_in_location_query(reputation, location)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "reputation_in_location", result)
         return result
 
 
     async def top_by_sales_volume(self, limit: int = 10):
         """Devuelve las compañías con mayor volumen de ventas."""
-        cursor = self.connector.db[self.collection_name].find().sort("sales_volume", -1).limit(limit)
-        result = await cursor.to_list(length=None)
-        print("Result in service top_by_sales_volume:", result)
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["top_by_sales_volume"], sort=self.LISTING_SORTS["top_by_sales_volume"], limit=limit
+        )
+        log_result(logger, "top_by_sales_volume", result["filas"])
         return result
 
     async def latest_active(self, limit: int = 10):
         """Devuelve las compañías con la actividad más reciente."""
-        cursor = self.connector.db[self.collection_name].find().sort("last_activity", -1).limit(limit)
-        result = await cursor.to_list(length=None)
-        print("Result in service latest_active:", result)
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["latest_active"], sort=self.LISTING_SORTS["latest_active"], limit=limit
+        )
+        log_result(logger, "latest_active", result["filas"])
         return result
\ No newline at end of file
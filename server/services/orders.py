@@ -1,9 +1,56 @@
 from datetime import datetime, timedelta
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from helpers.text import text_filter, MATCH_PREFIX
+from helpers.logs import get_logger, log_result
+from helpers.deadlines import QueryTimeout
+
+logger = get_logger("services.orders")
 
 class OrdersServicer:
-    def __init__(self, connector):
+    # Índices que necesitan las consultas de este servicer (ver IndexManager)
+    INDEXES = [
+        IndexModel([("ordered_at", DESCENDING)]),
+        IndexModel([("status_norm", ASCENDING), ("ordered_at", DESCENDING)]),
+    ]
+
+    # Campos de texto con campo sombra normalizado (ver ShadowFieldManager)
+    SHADOW_FIELDS = ["status"]
+
+    def __init__(self, connector, match_mode: str = MATCH_PREFIX, rollups=None, product_sales=None):
         self.connector = connector
         self.collection_name = "orders"
+        # Modo de los filtros de texto: exact, prefix o regex (fallback anterior)
+        self.match_mode = match_mode
+        # Agregados materializados (OrdersRollupServicer); si no están listos se escanea 'orders'
+        self.rollups = rollups
+        # Contadores de ventas por producto (ProductSalesServicer), alimentados por los rollups
+        self.product_sales = product_sales
+
+    def query_plans(self):
+        """
+        Consultas representativas para verificar el plan con explain(). Se
+        arman con los mismos constructores que los métodos, así no se desfasan.
+        """
+        return [
+            {"name": "orders_by_status_and_time", "filter": self._status_and_time_query("delivered", 30)},
+            {"name": "revenue_by_year", "filter": self._year_query(2024)},
+        ]
+
+    # --- Constructores de filtros ---
+
+    def _status_and_time_query(self, status: str, days: int):
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        return {
+            **text_filter("status", status, self.match_mode),
+            "ordered_at": { "$gte": cutoff_date }
+        }
+
+    @staticmethod
+    def _year_query(year: int):
+        return { "ordered_at": { "$gte": datetime(year, 1, 1), "$lt": datetime(year + 1, 1, 1) } }
+
+    async def _use_rollups(self):
+        return self.rollups is not None and await self.rollups.ready()
 
     # --- Consultas de Conteo y Total General ---
 
@@ -12,12 +59,17 @@ class OrdersServicer:
         try:
             result = await self.connector.count(self.collection_name)
             return result
+        except QueryTimeout:
+            # El deadline de la herramienta decide la respuesta: nada de 0 o [] engañosos
+            raise
         except Exception as e:
-            print(f"Error en total_orders: {e}")
+            logger.error("Error en total_orders: %s", e)
             return 0
 
     async def total_revenue(self):
         """Calcula el ingreso total sumando el campo 'total' de todos los pedidos."""
+        if await self._use_rollups():
+            return await self.rollups.total_revenue()
         pipeline = [
             { "$group": {
                 "_id": None,
@@ -28,24 +80,32 @@ class OrdersServicer:
         try:
             result = await self.connector.aggregate(self.collection_name, pipeline)
             return result[0]['total_revenue'] if result else 0
+        except QueryTimeout:
+            raise
         except Exception as e:
-            print(f"Error en total_revenue: {e}")
+            logger.error("Error en total_revenue: %s", e)
             return 0
 
     # --- Consultas de Estado y Agregación ---
 
     async def count_orders_by_status(self):
         """Agrupa y cuenta el número de pedidos por su estado (delivered, pending, etc.)."""
+        if await self._use_rollups():
+            return await self.rollups.count_by_status()
         pipeline = [{ "$group": { "_id": "$status", "count": { "$sum": 1 } } }]
         try:
             result = await self.connector.aggregate(self.collection_name, pipeline)
             return result
+        except QueryTimeout:
+            raise
         except Exception as e:
-            print(f"Error en count_orders_by_status: {e}")
+            logger.error("Error en count_orders_by_status: %s", e)
             return []
 
     async def average_order_total(self):
         """Calcula el valor promedio de los pedidos ('total')."""
+        if await self._use_rollups():
+            return await self.rollups.average_order_total()
         pipeline = [
             { "$group": {
                 "_id": None,
@@ -56,40 +116,34 @@ class OrdersServicer:
         try:
             result = await self.connector.aggregate(self.collection_name, pipeline)
             return result[0]['average_total'] if result else 0
+        except QueryTimeout:
+            raise
         except Exception as e:
-            print(f"Error en average_order_total: {e}")
+            logger.error("Error en average_order_total: %s", e)
             return 0
 
     # --- Consultas de Filtro y Tiempo ---
 
     async def orders_by_status_and_time(self, status: str, days: int):
         """Cuenta pedidos con un estado específico ('status') realizados en los últimos N días."""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Asumiendo que self.connector.db es accesible
-        collection = self.connector.db[self.collection_name] 
-        
-        query = {
-            "status": { "$regex": status, "$options": "i" },
-            "ordered_at": { "$gte": cutoff_date }
-        }
+        query = self._status_and_time_query(status, days)
         
         try:
-            result = await collection.count_documents(query)
+            # El corte depende de "ahora", así que no tiene sentido cachearlo.
+            result = await self.connector.count_documents(self.collection_name, query, cache=False)
             return result
+        except QueryTimeout:
+            raise
         except Exception as e:
-            print(f"Error en orders_by_status_and_time: {e}")
+            logger.error("Error en orders_by_status_and_time: %s", e)
             return 0
 
     async def revenue_by_year(self, year: int):
         """Calcula el ingreso total ('total') para pedidos realizados en un año específico."""
-        start_date = datetime(year, 1, 1)
-        end_date = datetime(year + 1, 1, 1)
-        
+        if await self._use_rollups():
+            return await self.rollups.revenue_by_year(year)
         pipeline = [
-            { "$match": { 
-                "ordered_at": { "$gte": start_date, "$lt": end_date } 
-            }},
+            { "$match": self._year_query(year) },
             { "$group": { 
                 "_id": None, 
                 "total_revenue_year": { "$sum": "$total" } 
@@ -100,15 +154,26 @@ class OrdersServicer:
         try:
             result = await self.connector.aggregate(self.collection_name, pipeline)
             return result[0]['total_revenue_year'] if result else 0
+        except QueryTimeout:
+            raise
         except Exception as e:
-            print(f"Error en revenue_by_year: {e}")
+            logger.error("Error en revenue_by_year: %s", e)
             return 0
 
     # --- Consulta Compleja (Corregida) ---
 
-    async def top_selling_products_by_quantity(self, limit: int = 10):
-        """Identifica los productos más vendidos y enriquece la información con la colección 'products'."""
-        
+    async def top_selling_products_by_quantity(self, limit: int = 10, by: str = "quantity", days: int = None):
+        """
+        Identifica los productos más vendidos y enriquece la información con la colección 'products'.
+        Si los contadores de ventas están listos, responde desde ellos (por cantidad o
+        ingreso y opcionalmente en los últimos N días) sin recorrer 'orders'.
+        """
+        if self.product_sales is not None and self.rollups is not None \
+                and await self.rollups.observer_ready(self.product_sales.name):
+            return await self.product_sales.top_products(limit, by, days)
+        if by != "quantity" or days:
+            raise ValueError("El ranking por ingreso o por ventana de días requiere los contadores de ventas (todavía no construidos).")
+
         pipeline = [
             # 1. Agrupar por product_id y sumar la cantidad total vendida.
             { "$group": { 
@@ -151,10 +216,11 @@ class OrdersServicer:
         try:
             # Asumiendo que self.collection es la colección de órdenes (Orders)
             result = await self.connector.aggregate(self.collection_name, pipeline)
-            # Imprimir para depuración (Debugging)
-            print(f"Resultado de top_selling_products_by_quantity: {result}") 
+            log_result(logger, "top_selling_products_by_quantity", result)
             return result
+        except QueryTimeout:
+            raise
         except Exception as e:
             # Si el error está aquí, el mensaje nos indicará qué falló en la agregación.
-            print(f"Error ejecutando top_selling_products_by_quantity: {e}")
+            logger.error("Error ejecutando top_selling_products_by_quantity: %s", e)
             return []
\ No newline at end of file
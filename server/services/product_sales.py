@@ -0,0 +1,277 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING, UpdateOne
+
+from db.lease import bulk_write_once, marked_update
+
+
+# Ficha del producto que se copia en cada contador (evita el $lookup por consulta)
+DETAIL_FIELDS = ("name", "brand", "category")
+
+
+def _product_key(product_id) -> str:
+    return str(product_id)
+
+
+def _as_object_id(product_id):
+    try:
+        return ObjectId(product_id)
+    except Exception:
+        return product_id
+
+
+class ProductSalesServicer:
+    """
+    Contadores de ventas por producto, mantenidos de forma incremental.
+
+    - 'product_sales': un documento por producto con la cantidad y el ingreso
+      acumulados y una copia de su ficha (nombre, marca, categoría). Los índices
+      descendentes sobre ambos totales hacen que el top-N sea una lectura de N
+      entradas de índice.
+    - 'product_sales_daily': los mismos totales por producto y día, para
+      rankings dentro de una ventana de tiempo.
+
+    Se alimenta de los lotes de pedidos de OrdersRollupServicer (add_observer),
+    así que comparte su marca de agua.
+    """
+
+    name = "product_sales"
+    PROJECTION = {"product_id": 1, "quantity": 1}
+
+    INDEXES = [
+        IndexModel([("total_quantity", DESCENDING)]),
+        IndexModel([("total_revenue", DESCENDING)]),
+    ]
+    DAILY_INDEXES = [
+        IndexModel([("day", ASCENDING), ("product_id", ASCENDING)]),
+    ]
+
+    SORT_FIELDS = {"quantity": "total_quantity", "revenue": "total_revenue"}
+
+    def __init__(self, connector):
+        self.connector = connector
+        self.collection_name = "product_sales"
+        self.daily_collection = "product_sales_daily"
+        self.source_collection = "orders"
+        self.products_collection = "products"
+        # Última pasada de refresh_details (ver maintain)
+        self.state_collection = "rollup_state"
+        self.details_state_id = "product_sales:details"
+
+    # --- Mantenimiento incremental ---
+
+    async def apply(self, orders, batch_id: str):
+        """
+        Suma un lote de pedidos a los contadores totales y diarios. Un lote
+        repetido (mismo 'batch_id') no vuelve a sumarse en los contadores que
+        ya lo tienen.
+        """
+        totals = defaultdict(lambda: {"quantity": 0, "revenue": 0})
+        daily = defaultdict(lambda: {"quantity": 0, "revenue": 0})
+        for order in orders:
+            if order.get("product_id") is None:
+                continue
+            key = _product_key(order["product_id"])
+            quantity = order.get("quantity") or 0
+            revenue = order.get("total") or 0
+            totals[key]["quantity"] += quantity
+            totals[key]["revenue"] += revenue
+            day = order["ordered_at"].strftime("%Y-%m-%d")
+            daily[(key, day)]["quantity"] += quantity
+            daily[(key, day)]["revenue"] += revenue
+
+        if not totals:
+            return
+
+        await bulk_write_once(self.connector.db[self.collection_name], [
+            marked_update(key, {"$inc": {"total_quantity": t["quantity"], "total_revenue": t["revenue"]}}, batch_id)
+            for key, t in totals.items()
+        ])
+        await bulk_write_once(self.connector.db[self.daily_collection], [
+            marked_update(
+                f"{key}:{day}",
+                {
+                    "$inc": {"quantity": t["quantity"], "revenue": t["revenue"]},
+                    "$setOnInsert": {"product_id": key, "day": day},
+                },
+                batch_id,
+            )
+            for (key, day), t in daily.items()
+        ])
+
+        await self._fill_details(list(totals))
+
+    async def _fill_details(self, product_ids=None):
+        """Copia la ficha del producto en los contadores que todavía no la tienen."""
+        sales = self.connector.db[self.collection_name]
+        query = {"name": {"$exists": False}}
+        if product_ids is not None:
+            query["_id"] = {"$in": product_ids}
+
+        pending = [doc["_id"] async for doc in sales.find(query, {"_id": 1})]
+        for start in range(0, len(pending), 1000):
+            chunk = pending[start:start + 1000]
+            products = self.connector.db[self.products_collection].find(
+                {"_id": {"$in": [_as_object_id(pid) for pid in chunk]}},
+                {field: 1 for field in DETAIL_FIELDS},
+            )
+            updates = [
+                UpdateOne(
+                    {"_id": _product_key(product["_id"])},
+                    {"$set": {field: product.get(field) for field in DETAIL_FIELDS}},
+                )
+                async for product in products
+            ]
+            if updates:
+                await sales.bulk_write(updates, ordered=False)
+
+    async def rebuild(self, watermark, last_id):
+        """Reconstruye ambos contadores con los pedidos hasta la marca de agua."""
+        db = self.connector.db
+        if watermark is None:
+            await db[self.collection_name].delete_many({})
+            await db[self.daily_collection].delete_many({})
+            return
+
+        match = {"$match": {
+            "product_id": {"$ne": None},
+            "ordered_at": {"$type": "date"},
+            "$or": [
+                {"ordered_at": {"$lt": watermark}},
+                {"ordered_at": watermark, "_id": {"$lte": last_id}},
+            ],
+        }}
+
+        # $out escribe en el servidor; luego se reemplaza la colección con rename
+        totals_tmp = f"{self.collection_name}_rebuild"
+        await db[self.source_collection].aggregate([
+            match,
+            {"$group": {
+                "_id": {"$toString": "$product_id"},
+                "total_quantity": {"$sum": "$quantity"},
+                "total_revenue": {"$sum": "$total"},
+            }},
+            {"$out": totals_tmp},
+        ], allowDiskUse=True).to_list(length=None)
+
+        daily_tmp = f"{self.daily_collection}_rebuild"
+        await db[self.source_collection].aggregate([
+            match,
+            {"$group": {
+                "_id": {
+                    "product_id": {"$toString": "$product_id"},
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$ordered_at"}},
+                },
+                "quantity": {"$sum": "$quantity"},
+                "revenue": {"$sum": "$total"},
+            }},
+            {"$project": {
+                "_id": {"$concat": ["$_id.product_id", ":", "$_id.day"]},
+                "product_id": "$_id.product_id",
+                "day": "$_id.day",
+                "quantity": 1,
+                "revenue": 1,
+            }},
+            {"$out": daily_tmp},
+        ], allowDiskUse=True).to_list(length=None)
+
+        for tmp, target, indexes in (
+            (totals_tmp, self.collection_name, self.INDEXES),
+            (daily_tmp, self.daily_collection, self.DAILY_INDEXES),
+        ):
+            if await db[tmp].estimated_document_count():
+                await db[tmp].create_indexes(indexes)
+                await db[tmp].rename(target, dropTarget=True)
+            else:
+                await db[target].delete_many({})
+
+        await self._fill_details()
+
+    async def refresh_details(self, since: datetime = None):
+        """
+        Vuelve a copiar la ficha de los productos modificados después de
+        'since' (por 'updated_at'), o de todos si no se indica. Devuelve la
+        cantidad de contadores actualizados.
+        """
+        sales = self.connector.db[self.collection_name]
+        query = {} if since is None else {"updated_at": {"$gt": since}}
+        products = self.connector.db[self.products_collection].find(query, {field: 1 for field in DETAIL_FIELDS})
+
+        updated = 0
+        batch = []
+        async for product in products:
+            batch.append(UpdateOne(
+                {"_id": _product_key(product["_id"])},
+                {"$set": {field: product.get(field) for field in DETAIL_FIELDS}},
+            ))
+            if len(batch) >= 1000:
+                updated += (await sales.bulk_write(batch, ordered=False)).modified_count
+                batch = []
+        if batch:
+            updated += (await sales.bulk_write(batch, ordered=False)).modified_count
+
+        if updated:
+            self.connector.invalidate(self.collection_name)
+        return updated
+
+    async def maintain(self):
+        """
+        Mantenimiento periódico (lo llama OrdersRollupServicer tras cada
+        refresh): copia la ficha de los productos modificados desde la pasada
+        anterior, así un renombre llega al ranking sin reconstruirlo.
+        """
+        states = self.connector.db[self.state_collection]
+        state = await states.find_one({"_id": self.details_state_id})
+        started = datetime.utcnow()
+        # La primera vez sólo se fija el punto de partida: rebuild/apply ya copiaron las fichas
+        updated = 0 if state is None else await self.refresh_details(since=state["since"])
+        await states.update_one({"_id": self.details_state_id}, {"$set": {"since": started}}, upsert=True)
+        return updated
+
+    # --- Lecturas ---
+
+    @staticmethod
+    def _format(doc):
+        return {
+            "product_name": doc.get("name"),
+            "product_brand": doc.get("brand"),
+            "product_category": doc.get("category"),
+            "total_quantity_sold": doc.get("total_quantity", 0),
+            "total_revenue": doc.get("total_revenue", 0),
+        }
+
+    async def top_products(self, limit: int = 10, by: str = "quantity", days: int = None):
+        """
+        Top-N de productos por cantidad vendida o ingreso ('by'). Con 'days'
+        se limita a los pedidos de los últimos N días.
+        """
+        sort_field = self.SORT_FIELDS.get(by)
+        if sort_field is None:
+            raise ValueError(f"Criterio inválido: {by}. Opciones: {', '.join(self.SORT_FIELDS)}")
+
+        if not days:
+            docs = await self.connector.find(
+                self.collection_name, {"name": {"$exists": True}}, sort=[(sort_field, -1)], limit=limit
+            )
+            return [self._format(doc) for doc in docs]
+
+        since = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+        ranked = await self.connector.aggregate(self.daily_collection, [
+            {"$match": {"day": {"$gte": since}}},
+            {"$group": {
+                "_id": "$product_id",
+                "total_quantity": {"$sum": "$quantity"},
+                "total_revenue": {"$sum": "$revenue"},
+            }},
+            {"$sort": {sort_field: -1}},
+            {"$limit": limit},
+        ])
+        details = await self.connector.find(
+            self.collection_name,
+            {"_id": {"$in": [row["_id"] for row in ranked]}},
+            {field: 1 for field in DETAIL_FIELDS},
+        )
+        by_id = {doc["_id"]: doc for doc in details}
+        return [self._format({**by_id.get(row["_id"], {}), **row}) for row in ranked]
@@ -1,90 +1,222 @@
+from datetime import datetime, timedelta
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo import TEXT
+from helpers.text import text_filter, MATCH_PREFIX, MATCH_REGEX
+from helpers.logs import get_logger, log_result
+from helpers.deadlines import QueryTimeout
+from helpers.rows import find_rows
+
+logger = get_logger("services.products")
+
+
 class ProductsServicer:
-    def __init__(self, connector):
+    # Índices que necesitan las consultas de este servicer (ver IndexManager)
+    INDEXES = [
+        IndexModel([("price", DESCENDING)]),
+        IndexModel([("stock", ASCENDING)]),
+        IndexModel([("published_at", DESCENDING)]),
+        IndexModel([("updated_at", DESCENDING)]),
+        IndexModel([("brand_norm", ASCENDING), ("category_norm", ASCENDING)]),
+        IndexModel([("shipping_norm", ASCENDING), ("reputation_norm", ASCENDING)]),
+        IndexModel([("name_norm", ASCENDING)]),
+        IndexModel([("category_norm", ASCENDING)]),
+        # Índice de texto para search_products (sólo puede haber uno por colección)
+        IndexModel(
+            [("name", TEXT), ("brand", TEXT), ("category", TEXT)],
+            weights={"name": 10, "brand": 5, "category": 2},
+            default_language="spanish",
+            name="products_text_search",
+        ),
+    ]
+
+    # Campos de texto con campo sombra normalizado (ver ShadowFieldManager)
+    SHADOW_FIELDS = ["name", "brand", "category", "shipping", "reputation"]
+
+    # Límites de search_products: acotan la latencia aunque crezca el catálogo
+    SEARCH_MAX_LIMIT = 50
+    SEARCH_MAX_OFFSET = 500
+    # Orden estable para paginar: desempate por _id (sin él, skip puede repetir o saltear productos)
+    SEARCH_TEXT_SORT = [("score", {"$meta": "textScore"}), ("_id", ASCENDING)]
+    SEARCH_SORT = [("name_norm", ASCENDING), ("_id", ASCENDING)]
+
+    # Columnas que devuelve cada listado (proyección + salida en filas, ver helpers.rows)
+    LISTING_COLUMNS = {
+        "top_by_price": ["name", "brand", "category", "price", "stock"],
+        "top_by_price_ascending": ["name", "brand", "category", "price", "stock"],
+        "latest_published": ["name", "brand", "category", "price", "published_at"],
+        "recently_updated_products": ["name", "brand", "category", "price", "stock", "updated_at"],
+    }
+    # Orden de cada listado (el mismo que verifica query_plans)
+    LISTING_SORTS = {
+        "top_by_price": [("price", DESCENDING)],
+        "top_by_price_ascending": [("price", ASCENDING)],
+        "latest_published": [("published_at", DESCENDING)],
+    }
+    # recently_updated_products: orden y tope de documentos
+    RECENTLY_UPDATED_SORT = [("updated_at", DESCENDING)]
+    RECENTLY_UPDATED_LIMIT = 100
+
+    def __init__(self, connector, match_mode: str = MATCH_PREFIX):
         self.connector = connector
         self.collection_name = "products"
+        # Modo de los filtros de texto: exact, prefix o regex (fallback anterior)
+        self.match_mode = match_mode
+
+    def query_plans(self):
+        """
+        Consultas representativas para verificar el plan con explain(). Se
+        arman con los mismos constructores que los métodos, así no se desfasan.
+        """
+        if self.match_mode == MATCH_REGEX:
+            search = [{"name": "search_products", "filter": self._search_regex_query("samsung galaxy"), "sort": self.SEARCH_SORT, "limit": 10}]
+        else:
+            search = [
+                {"name": "search_products", "filter": self._search_text_query("samsung galaxy"), "limit": 10},
+                {"name": "search_products_prefix", "filter": self._search_prefix_query("sams"), "sort": self.SEARCH_SORT, "limit": 10},
+            ]
+        return [
+            {"name": "products_in_stock", "filter": self._in_stock_query(1)},
+            {"name": "products_by_price_range", "filter": self._price_range_query(100, 500)},
+            {"name": "out_of_stock_products", "filter": self._out_of_stock_query()},
+            *({"name": name, "sort": sort, "limit": 10} for name, sort in self.LISTING_SORTS.items()),
+            {"name": "products_by_brand_and_category", "filter": self._brand_and_category_query("samsung", "celulares")},
+            {"name": "free_shipping_by_reputation", "filter": self._free_shipping_query("platinum")},
+            *search,
+            {
+                "name": "recently_updated_products",
+                "filter": self._recently_updated_query(30),
+                "sort": self.RECENTLY_UPDATED_SORT,
+                "limit": self.RECENTLY_UPDATED_LIMIT,
+            },
+        ]
+
+    # --- Constructores de filtros ---
+
+    @staticmethod
+    def _in_stock_query(min_stock: int):
+        return { "stock": { "$gte": min_stock } }
+
+    @staticmethod
+    def _price_range_query(min_price: float, max_price: float):
+        return { "price": { "$gte": min_price, "$lte": max_price } }
+
+    @staticmethod
+    def _out_of_stock_query():
+        return { "stock": 0 }
+
+    @staticmethod
+    def _recently_updated_query(days: int):
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        return { "updated_at": { "$gte": cutoff_date } }
+
+    def _brand_and_category_query(self, brand: str, category: str):
+        return {
+            **text_filter("brand", brand, self.match_mode),
+            **text_filter("category", category, self.match_mode)
+        }
+
+    def _free_shipping_query(self, reputation: str):
+        return {
+            **text_filter("shipping", "Free", self.match_mode),
+            **text_filter("reputation", reputation, self.match_mode)
+        }
+
+    @staticmethod
+    def _search_text_query(query: str):
+        return {"$text": {"$search": query}}
+
+    @staticmethod
+    def _search_prefix_query(query: str):
+        return {"$or": [
+            text_filter("name", query, MATCH_PREFIX),
+            text_filter("brand", query, MATCH_PREFIX),
+            text_filter("category", query, MATCH_PREFIX),
+        ]}
+
+    @staticmethod
+    def _search_regex_query(query: str):
+        regex_query = {"$regex": query, "$options": "i"}
+        return {"$or": [{"name": regex_query}, {"brand": regex_query}, {"category": regex_query}]}
 
     async def total_products(self):
         """Devuelve el número total de productos publicados."""
         result = await self.connector.count(self.collection_name)
-        print("Result in service total_products:", result)
+        log_result(logger, "total_products", result)
         return result
 
     async def count_by_brand(self):
         """Agrupa y cuenta productos por marca (brand)."""
         pipeline = [{ "$group": { "_id": "$brand", "count": { "$sum": 1 } } }]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service count_by_brand:", result)
+        log_result(logger, "count_by_brand", result)
         return result
 
     async def count_by_category(self):
         """Agrupa y cuenta productos por categoría (category)."""
         pipeline = [{ "$group": { "_id": "$category", "count": { "$sum": 1 } } }]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service count_by_category:", result)
+        log_result(logger, "count_by_category", result)
         return result
 
     async def count_by_shipping(self):
         """Agrupa y cuenta productos por tipo de envío (shipping)."""
         pipeline = [{ "$group": { "_id": "$shipping", "count": { "$sum": 1 } } }]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service count_by_shipping:", result)
+        log_result(logger, "count_by_shipping", result)
         return result
     
     async def products_in_stock(self, min_stock: int = 1):
         """Cuenta los productos que tienen un stock mayor o igual al valor mínimo."""
-        query = { "stock": { "$gte": min_stock } }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service products_in_stock:", result)
+        query = self._in_stock_query(min_stock)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "products_in_stock", result)
         return result
 
     async def products_by_brand_and_category(self, brand: str, category: str):
-        """Cuenta productos de una marca y categoría específicas (insensible a mayúsculas)."""
-        query = {
-            "brand": { "$regex": brand, "$options": "i" },
-            "category": { "$regex": category, "$options": "i" }
-        }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service products_by_brand_and_category:", result)
+        """Cuenta productos de una marca y categoría específicas (insensible a mayúsculas y acentos)."""
+        query = self._brand_and_category_query(brand, category)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "products_by_brand_and_category", result)
         return result
 
     async def products_by_price_range(self, min_price: float, max_price: float):
         """Cuenta productos dentro de un rango de precios (price)."""
-        query = { "price": { "$gte": min_price, "$lte": max_price } }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service products_by_price_range:", result)
+        query = self._price_range_query(min_price, max_price)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "products_by_price_range", result)
         return result
 
     async def free_shipping_by_reputation(self, reputation: str):
         """Cuenta los productos con envío 'Free' y una reputación de compañía específica."""
-        query = {
-            "shipping": { "$regex": "Free", "$options": "i" },
-            "reputation": { "$regex": reputation, "$options": "i" }
-        }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service free_shipping_by_reputation:", result)
+        query = self._free_shipping_query(reputation)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "free_shipping_by_reputation", result)
         return result
 
     # --- Consultas de Listado y Ranking ---
 
     async def top_by_price(self, limit: int = 10):
         """Devuelve los productos más caros (orden descendente por price)."""
-        cursor = self.connector.db[self.collection_name].find().sort("price", -1).limit(limit)
-        result = await cursor.to_list(length=None)
-        print("Result in service top_by_price:", result)
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["top_by_price"], sort=self.LISTING_SORTS["top_by_price"], limit=limit
+        )
+        log_result(logger, "top_by_price", result["filas"])
         return result
     
     async def top_by_price_ascending(self, limit: int = 10):
         """Devuelve los productos más baratos (orden ascendente por price)."""
         # Ordenamos por 'price' de forma ascendente (1) para obtener los más bajos.
-        cursor = self.connector.db[self.collection_name].find().sort("price", 1).limit(limit)
-        result = await cursor.to_list(length=None)
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["top_by_price_ascending"], sort=self.LISTING_SORTS["top_by_price_ascending"], limit=limit
+        )
         return result
 
     async def latest_published(self, limit: int = 10):
         """Devuelve los productos publicados más recientemente."""
-        cursor = self.connector.db[self.collection_name].find().sort("published_at", -1).limit(limit)
-        result = await cursor.to_list(length=None)
-        print("Result in service latest_published:", result)
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["latest_published"], sort=self.LISTING_SORTS["latest_published"], limit=limit
+        )
+        log_result(logger, "latest_published", result["filas"])
         return result
 
     async def average_price_by_category(self):
@@ -97,58 +229,53 @@ class ProductsServicer:
             }}
         ]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service average_price_by_category:", result)
+        log_result(logger, "average_price_by_category", result)
         return result
 
     async def count_by_reputation(self):
         """Agrupa y cuenta productos por reputación de la compañía (reputation)."""
         pipeline = [{ "$group": { "_id": "$reputation", "count": { "$sum": 1 } } }]
         result = await self.connector.aggregate(self.collection_name, pipeline)
-        print("Result in service count_by_reputation:", result)
+        log_result(logger, "count_by_reputation", result)
         return result
 
     async def out_of_stock_products(self):
         """Cuenta los productos que actualmente tienen stock 0."""
-        query = { "stock": 0 }
-        result = await self.connector.db[self.collection_name].count_documents(query)
-        print("Result in service out_of_stock_products:", result)
+        query = self._out_of_stock_query()
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "out_of_stock_products", result)
         return result
 
     async def recently_updated_products(self, days: int):
         """Devuelve los productos actualizados en los últimos N días."""
-        # Calcula la fecha hace N días
-        from datetime import datetime, timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        query = { "updated_at": { "$gte": cutoff_date } }
+        query = self._recently_updated_query(days)
         
         # Limitamos el resultado a 100 documentos por eficiencia, si se pide un número muy alto de días
-        cursor = self.connector.db[self.collection_name].find(query).sort("updated_at", -1).limit(100)
-        result = await cursor.to_list(length=None)
+        # El corte depende de "ahora", así que no tiene sentido cachearlo.
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["recently_updated_products"], query,
+            sort=self.RECENTLY_UPDATED_SORT, limit=self.RECENTLY_UPDATED_LIMIT, cache=False
+        )
         
-        print("Result in service recently_updated_products:", result)
+        log_result(logger, "recently_updated_products", result["filas"])
         return result
     
-    async def search_products(self, query: str, limit: int = 10):
+    async def search_products(self, query: str, limit: int = 10, page: int = 1):
         """
-        Busca productos por nombre, marca o categoría utilizando una consulta de texto
-        que ignora mayúsculas/minúsculas ($regex con $options: 'i').
-    
-        Devuelve los resultados clave del producto.
+        Busca productos por nombre, marca o categoría ordenados por relevancia.
+
+        Usa el índice de texto de 'products' (pesos: nombre > marca > categoría).
+        Si no hay coincidencias de palabra completa (p. ej. "sams"), recurre a
+        una búsqueda por prefijo sobre los campos sombra normalizados.
+        Devuelve una página de resultados e indica si hay más.
         """
-        # 1. Configurar la consulta de expresión regular case-insensitive
-        regex_query = {"$regex": query, "$options": "i"}
-    
-        # 2. Construir el filtro $or para buscar en name, brand o category
-        filter_query = {
-            "$or": [
-                {"name": regex_query},
-                {"brand": regex_query},
-                {"category": regex_query}
-            ]
-        }
-    
-        # 3. Definir la proyección (qué campos devolver, excluyendo el _id sensible)
+        limit = max(1, min(limit, self.SEARCH_MAX_LIMIT))
+        page = max(1, page)
+        skip = (page - 1) * limit
+        if skip >= self.SEARCH_MAX_OFFSET:
+            return {"query": query, "pagina": page, "limite": limit, "resultados": [], "hay_mas": False}
+
+        # Proyección (qué campos devolver, excluyendo el _id sensible)
         projection = {
             "_id": 0, # Excluir ID sensible del producto
             "name": 1,
@@ -161,12 +288,46 @@ class ProductsServicer:
             "published_at": 1,
             "updated_at": 1,
         }
-    
+
         try:
-            # Asumiendo self.collection es la colección de productos
-            cursor = self.collection.find(filter_query, projection).limit(limit)
-            result = await cursor.to_list(length=limit)
-            return result
+            if self.match_mode == MATCH_REGEX:
+                # Fallback explícito: el $or de regex sin anclar anterior (sin índice)
+                result = await self.connector.find(
+                    self.collection_name, self._search_regex_query(query), projection,
+                    sort=self.SEARCH_SORT, skip=skip, limit=limit + 1
+                )
+            else:
+                # 1. Búsqueda de texto con ranking por textScore
+                text_query = self._search_text_query(query)
+                result = await self.connector.find(
+                    self.collection_name,
+                    text_query,
+                    {**projection, "score": {"$meta": "textScore"}},
+                    sort=self.SEARCH_TEXT_SORT,
+                    skip=skip,
+                    limit=limit + 1,
+                )
+                # 2. Sin coincidencias de palabra completa: prefijo normalizado (usa índices).
+                # Se decide por la consulta, no por la página: si el texto no encuentra
+                # nada en ninguna página, todas las páginas salen del prefijo.
+                if not result and (skip == 0 or not await self.connector.find(
+                    self.collection_name, text_query, {"_id": 1}, limit=1
+                )):
+                    result = await self.connector.find(
+                        self.collection_name, self._search_prefix_query(query), projection,
+                        sort=self.SEARCH_SORT, skip=skip, limit=limit + 1
+                    )
+
+            return {
+                "query": query,
+                "pagina": page,
+                "limite": limit,
+                "resultados": result[:limit],
+                "hay_mas": len(result) > limit,
+            }
+        except QueryTimeout:
+            # El deadline de la herramienta decide la respuesta: nada de 0 o [] engañosos
+            raise
         except Exception as e:
-            print(f"Error en la búsqueda de productos: {e}")
-            return []
\ No newline at end of file
+            logger.error("Error en la búsqueda de productos: %s", e)
+            return {"query": query, "pagina": page, "limite": limit, "resultados": [], "hay_mas": False}
@@ -0,0 +1,417 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import IndexModel, ASCENDING
+from db.lease import LeaseLost, MongoLease, bulk_write_once, marked_update
+from helpers.logs import get_logger
+
+logger = get_logger("services.rollups")
+
+
+def _period_keys(ordered_at: datetime):
+    """Claves de los buckets diario, mensual y anual de una fecha."""
+    return {
+        "day": ordered_at.strftime("%Y-%m-%d"),
+        "month": ordered_at.strftime("%Y-%m"),
+        "year": ordered_at.strftime("%Y"),
+    }
+
+
+def _status_key(status) -> str:
+    """Los estados se usan como nombre de campo: se evitan '.' y '$' iniciales."""
+    key = str(status if status is not None else "sin_estado").replace(".", "_")
+    return key.lstrip("$") or "sin_estado"
+
+
+def _batch_id(batch) -> str:
+    """Marca de un lote: la marca de agua (ordered_at, _id) de su último pedido."""
+    return f"{batch['watermark'].isoformat()}|{batch['last_id']}"
+
+
+class OrdersRollupServicer:
+    """
+    Agregados materializados de la colección 'orders'.
+
+    Mantiene en 'orders_rollups' un documento por bucket diario, mensual y
+    anual con la cantidad de pedidos, la suma de 'total' y la cantidad por
+    'status'. Se actualiza de forma incremental con una marca de agua
+    (ordered_at, _id) guardada en 'rollup_state', o se reconstruye completo.
+
+    Los pedidos insertados con un 'ordered_at' anterior a la marca de agua no
+    se ven en el incremental: para esos casos está rebuild().
+
+    Otros agregados de pedidos pueden colgarse del mismo recorrido con
+    add_observer() y comparten así la marca de agua.
+
+    refresh() y rebuild() toman un lease en Mongo, así que no se pisan entre
+    workers ni con el CLI. Cada lote es idempotente: antes de escribir se
+    guarda su rango como 'pending' en el estado, cada bucket registra la marca
+    del lote que ya sumó y, si el proceso se cae antes de avanzar la marca de
+    agua, el siguiente refresh repite exactamente ese rango y sólo suma en
+    los buckets que no la tienen.
+    """
+
+    INDEXES = [
+        IndexModel([("granularity", ASCENDING), ("period", ASCENDING)]),
+    ]
+
+    def __init__(self, connector, batch_size: int = 5000, lease_ttl: float = 300):
+        self.connector = connector
+        self.collection_name = "orders_rollups"
+        self.source_collection = "orders"
+        self.state_collection = "rollup_state"
+        self.state_id = "orders"
+        self.batch_size = batch_size
+        # El lock ordena las llamadas del proceso; el lease, las de todos los procesos
+        self._lock = asyncio.Lock()
+        self.lease = MongoLease(connector, self.state_id, self.state_collection, ttl=lease_ttl)
+        self._ready = False
+        self._built = set()
+        self._observers = []
+
+    def add_observer(self, observer):
+        """
+        Registra un agregado que se alimenta de los mismos lotes de pedidos.
+        'observer' expone 'name', 'PROJECTION' (campos de 'orders' que necesita),
+        'async apply(orders, batch_id)' (idempotente por 'batch_id', ver
+        db.lease.marked_update), 'async rebuild(watermark, last_id)' y,
+        opcionalmente, 'async maintain()', que corre tras cada refresh con el
+        lease tomado.
+        """
+        self._observers.append(observer)
+
+    # --- Estado / marca de agua ---
+
+    async def get_state(self):
+        return await self.connector.db[self.state_collection].find_one({"_id": self.state_id})
+
+    async def ready(self) -> bool:
+        """Indica si los rollups ya fueron construidos al menos una vez."""
+        if not self._ready:
+            self._ready = await self.get_state() is not None
+        return self._ready
+
+    async def observer_ready(self, name: str) -> bool:
+        """Indica si el observador 'name' ya fue construido hasta la marca de agua."""
+        if name not in self._built:
+            state = await self.get_state()
+            if state is not None:
+                self._built.update(state.get("built", []))
+        return name in self._built
+
+    async def _save_state(self, watermark, last_id, processed):
+        await self.connector.db[self.state_collection].update_one(
+            {"_id": self.state_id},
+            {
+                "$set": {"watermark": watermark, "last_id": last_id, "updated_at": datetime.utcnow()},
+                "$inc": {"processed": processed},
+                "$unset": {"pending": ""},
+            },
+            upsert=True,
+        )
+
+    async def _compare_and_set(self, watermark, last_id, update):
+        """Actualiza el estado sólo si la marca de agua sigue siendo (watermark, last_id)."""
+        result = await self.connector.db[self.state_collection].update_one(
+            {"_id": self.state_id, "watermark": watermark, "last_id": last_id}, update
+        )
+        if result.matched_count == 0:
+            raise LeaseLost("La marca de agua de los rollups cambió durante el refresh")
+
+    # --- Construcción ---
+
+    def _accumulate(self, orders):
+        """Suma un lote de pedidos en memoria: {(granularidad, periodo): acumulado}."""
+        buckets = defaultdict(lambda: {"count": 0, "sum_total": 0, "status": defaultdict(int)})
+        for order in orders:
+            ordered_at = order.get("ordered_at")
+            if not isinstance(ordered_at, datetime):
+                continue
+            total = order.get("total") or 0
+            status = _status_key(order.get("status"))
+            for granularity, period in _period_keys(ordered_at).items():
+                bucket = buckets[(granularity, period)]
+                bucket["count"] += 1
+                bucket["sum_total"] += total
+                bucket["status"][status] += 1
+        return buckets
+
+    @staticmethod
+    def _bucket_updates(buckets, batch_id: str):
+        updates = []
+        for (granularity, period), bucket in buckets.items():
+            increments = {"count": bucket["count"], "sum_total": bucket["sum_total"]}
+            increments.update({f"status.{name}": n for name, n in bucket["status"].items()})
+            updates.append(marked_update(
+                f"{granularity}:{period}",
+                {"$inc": increments, "$setOnInsert": {"granularity": granularity, "period": period}},
+                batch_id,
+            ))
+        return updates
+
+    @staticmethod
+    def _range_query(watermark, last_id, upto=None):
+        """Pedidos posteriores a (watermark, last_id) y, si se indica, hasta 'upto' inclusive."""
+        clauses = [{"ordered_at": {"$type": "date"}}]
+        if watermark is not None:
+            clauses.append({"$or": [
+                {"ordered_at": {"$gt": watermark}},
+                {"ordered_at": watermark, "_id": {"$gt": last_id}},
+            ]})
+        if upto is not None:
+            clauses.append({"$or": [
+                {"ordered_at": {"$lt": upto["watermark"]}},
+                {"ordered_at": upto["watermark"], "_id": {"$lte": upto["last_id"]}},
+            ]})
+        return {"$and": clauses}
+
+    async def refresh(self):
+        """
+        Procesa los pedidos posteriores a la marca de agua y suma sus aportes
+        a los buckets. Devuelve la cantidad de pedidos procesados (0 si otro
+        proceso tiene el lease).
+        """
+        async with self._lock:
+            if not await self.lease.acquire():
+                logger.info("rollups de pedidos en curso en otro proceso")
+                return 0
+            try:
+                return await self._refresh()
+            finally:
+                await self.lease.release()
+
+    async def _refresh(self):
+        state = await self.get_state()
+        if state is None:
+            return await self._rebuild()
+
+        # Observadores agregados después del último rebuild: se construyen hasta la marca actual
+        for observer in self._observers:
+            if observer.name not in state.get("built", []):
+                await observer.rebuild(state["watermark"], state["last_id"])
+                await self.connector.db[self.state_collection].update_one(
+                    {"_id": self.state_id}, {"$addToSet": {"built": observer.name}}
+                )
+
+        source = self.connector.db[self.source_collection]
+        rollups = self.connector.db[self.collection_name]
+        projection = {"ordered_at": 1, "status": 1, "total": 1}
+        for observer in self._observers:
+            projection.update(observer.PROJECTION)
+        order = [("ordered_at", ASCENDING), ("_id", ASCENDING)]
+
+        watermark, last_id = state["watermark"], state["last_id"]
+        # Lote que quedó a medio aplicar (caída entre las escrituras y el avance de la marca)
+        pending = state.get("pending")
+        processed = 0
+        while True:
+            await self.lease.renew()
+            recovered = pending is not None
+            if recovered:
+                query = self._range_query(watermark, last_id, upto=pending)
+                orders = await source.find(query, projection).sort(order).to_list(length=None)
+            else:
+                query = self._range_query(watermark, last_id)
+                orders = await source.find(query, projection).sort(order).limit(self.batch_size).to_list(length=None)
+                if not orders:
+                    break
+                pending = {"watermark": orders[-1]["ordered_at"], "last_id": orders[-1]["_id"]}
+                await self._compare_and_set(watermark, last_id, {"$set": {"pending": pending}})
+
+            batch_id = _batch_id(pending)
+            if orders:
+                await bulk_write_once(rollups, self._bucket_updates(self._accumulate(orders), batch_id))
+                for observer in self._observers:
+                    await observer.apply(orders, batch_id)
+
+            await self._compare_and_set(watermark, last_id, {
+                "$set": {"watermark": pending["watermark"], "last_id": pending["last_id"], "updated_at": datetime.utcnow()},
+                "$inc": {"processed": len(orders)},
+                "$unset": {"pending": ""},
+            })
+            watermark, last_id, pending = pending["watermark"], pending["last_id"], None
+            processed += len(orders)
+            if not recovered and len(orders) < self.batch_size:
+                break
+
+        for observer in self._observers:
+            if hasattr(observer, "maintain"):
+                await self.lease.renew()
+                await observer.maintain()
+
+        if processed:
+            self.connector.invalidate(self.source_collection)
+            self.connector.invalidate(self.collection_name)
+            for observer in self._observers:
+                self.connector.invalidate(observer.collection_name)
+        return processed
+
+    async def rebuild(self, wait: float = 0):
+        """
+        Reconstruye todos los buckets desde cero a partir de 'orders'. Espera
+        como mucho 'wait' segundos a que otro proceso suelte el lease
+        (db.lease.LeaseHeld si no).
+        """
+        async with self._lock:
+            async with self.lease.hold(wait):
+                return await self._rebuild()
+
+    async def _rebuild(self):
+        source = self.connector.db[self.source_collection]
+
+        # 1. Fijar la marca de agua antes de agregar, para que el incremental siga desde ahí
+        latest = await source.find({"ordered_at": {"$type": "date"}}, {"ordered_at": 1}) \
+            .sort([("ordered_at", -1), ("_id", -1)]).limit(1).to_list(length=1)
+        if not latest:
+            await self.connector.db[self.collection_name].delete_many({})
+            for observer in self._observers:
+                await observer.rebuild(None, None)
+            await self._save_state(None, None, 0)
+            await self.connector.db[self.state_collection].update_one(
+                {"_id": self.state_id}, {"$set": {"built": [o.name for o in self._observers]}}
+            )
+            self._ready = True
+            return 0
+        watermark, last_id = latest[0]["ordered_at"], latest[0]["_id"]
+        upto = {"$or": [
+            {"ordered_at": {"$lt": watermark}},
+            {"ordered_at": watermark, "_id": {"$lte": last_id}},
+        ]}
+
+        # 2. Agregar por día y estado en Mongo; meses y años se derivan de los días
+        pipeline = [
+            {"$match": {"ordered_at": {"$type": "date"}, **upto}},
+            {"$group": {
+                "_id": {
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$ordered_at"}},
+                    "status": "$status",
+                },
+                "count": {"$sum": 1},
+                "sum_total": {"$sum": "$total"},
+            }},
+        ]
+        buckets = defaultdict(lambda: {"count": 0, "sum_total": 0, "status": defaultdict(int)})
+        processed = 0
+        async for row in source.aggregate(pipeline, allowDiskUse=True):
+            day = row["_id"]["day"]
+            status = _status_key(row["_id"].get("status"))
+            for granularity, period in (("day", day), ("month", day[:7]), ("year", day[:4])):
+                bucket = buckets[(granularity, period)]
+                bucket["count"] += row["count"]
+                bucket["sum_total"] += row["sum_total"]
+                bucket["status"][status] += row["count"]
+            processed += row["count"]
+
+        # 3. Escribir en una colección temporal y reemplazar la anterior de forma atómica
+        await self.lease.renew()
+        docs = [
+            {
+                "_id": f"{granularity}:{period}",
+                "granularity": granularity,
+                "period": period,
+                "count": bucket["count"],
+                "sum_total": bucket["sum_total"],
+                "status": dict(bucket["status"]),
+            }
+            for (granularity, period), bucket in buckets.items()
+        ]
+        tmp = self.connector.db[f"{self.collection_name}_rebuild"]
+        await tmp.drop()
+        if docs:
+            await tmp.insert_many(docs)
+            await tmp.create_indexes(self.INDEXES)
+            await tmp.rename(self.collection_name, dropTarget=True)
+        else:
+            await self.connector.db[self.collection_name].delete_many({})
+
+        for observer in self._observers:
+            await self.lease.renew()
+            await observer.rebuild(watermark, last_id)
+
+        await self.lease.renew()
+        await self.connector.db[self.state_collection].update_one(
+            {"_id": self.state_id},
+            {"$unset": {"pending": ""}, "$set": {
+                "watermark": watermark,
+                "last_id": last_id,
+                "processed": processed,
+                "rebuilt_at": datetime.utcnow(),
+                "built": [observer.name for observer in self._observers],
+            }},
+            upsert=True,
+        )
+        self.connector.invalidate(self.source_collection)
+        self.connector.invalidate(self.collection_name)
+        for observer in self._observers:
+            self.connector.invalidate(observer.collection_name)
+        self._ready = True
+        return processed
+
+    async def run_periodically(self, interval: float):
+        """Job de fondo: refresca los rollups cada 'interval' segundos."""
+        while True:
+            try:
+                processed = await self.refresh()
+                if processed:
+                    logger.info("pedidos nuevos procesados", extra={"fields": {"processed": processed}})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error refrescando rollups de pedidos: %s", e)
+            await asyncio.sleep(interval)
+
+    # --- Lecturas (O(buckets)) ---
+
+    async def _buckets(self, granularity: str, period: str = None):
+        query = {"granularity": granularity}
+        if period is not None:
+            query["period"] = period
+        return await self.connector.find(self.collection_name, query)
+
+    async def totals(self):
+        """Cantidad de pedidos y suma de 'total' sobre todos los años."""
+        years = await self._buckets("year")
+        return sum(b["count"] for b in years), sum(b["sum_total"] for b in years)
+
+    async def total_revenue(self):
+        _, revenue = await self.totals()
+        return revenue
+
+    async def average_order_total(self):
+        count, revenue = await self.totals()
+        return revenue / count if count else 0
+
+    async def count_by_status(self):
+        counts = defaultdict(int)
+        for bucket in await self._buckets("year"):
+            for status, n in bucket.get("status", {}).items():
+                counts[status] += n
+        return [{"_id": status, "count": n} for status, n in counts.items()]
+
+    async def revenue_by_year(self, year: int):
+        buckets = await self._buckets("year", str(year))
+        return buckets[0]["sum_total"] if buckets else 0
+
+
+if __name__ == "__main__":
+    # Reconstrucción completa desde la línea de comandos:
+    #   python -m services.rollups
+    from config.env import EnvConfig
+    from db.connection import MongoConnector
+
+    async def _main():
+        from db.lease import LeaseHeld
+        from services.product_sales import ProductSalesServicer
+
+        connector = MongoConnector(EnvConfig().get("MONGO_URL"), "competition_manager")
+        rollups = OrdersRollupServicer(connector)
+        rollups.add_observer(ProductSalesServicer(connector))
+        try:
+            processed = await rollups.rebuild(wait=rollups.lease.ttl)
+        except LeaseHeld as error:
+            print(f"No se pudo reconstruir: {error}")
+            return
+        print(f"Rollups reconstruidos a partir de {processed} pedidos.")
+
+    asyncio.run(_main())
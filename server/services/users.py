@@ -1,77 +1,138 @@
 from datetime import datetime
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from helpers.text import text_filter, MATCH_PREFIX, MATCH_REGEX, MATCH_EXACT
+from helpers.logs import get_logger, log_result
+from helpers.rows import find_rows
+
+logger = get_logger("services.users")
 
 
 class UsersServicer:
-    def __init__(self, connector):
+    # Índices que necesitan las consultas de este servicer (ver IndexManager)
+    INDEXES = [
+        IndexModel([("fecha_registro", DESCENDING)]),
+        IndexModel([("ultima_compra", DESCENDING)]),
+        IndexModel([("tipo_norm", ASCENDING), ("ubicacion_norm", ASCENDING)]),
+        IndexModel([("empresa_norm", ASCENDING), ("fecha_registro", ASCENDING)]),
+    ]
+
+    # Campos de texto con campo sombra normalizado (ver ShadowFieldManager)
+    SHADOW_FIELDS = ["tipo", "ubicacion", "empresa"]
+
+    # Columnas que devuelve cada listado (proyección + salida en filas, ver helpers.rows)
+    LISTING_COLUMNS = {
+        "latest_registered": ["nombre", "tipo", "ubicacion", "empresa", "fecha_registro"],
+        "latest_purchases": ["nombre", "tipo", "ubicacion", "ultima_compra"],
+    }
+    # Orden de cada listado (el mismo que verifica query_plans)
+    LISTING_SORTS = {
+        "latest_registered": [("fecha_registro", DESCENDING)],
+        "latest_purchases": [("ultima_compra", DESCENDING)],
+    }
+
+    def __init__(self, connector, match_mode: str = MATCH_PREFIX):
         self.connector = connector
+        self.collection_name = "users"
+        # Modo de los filtros de texto: exact, prefix o regex (fallback anterior)
+        self.match_mode = match_mode
+
+    def query_plans(self):
+        """
+        Consultas representativas para verificar el plan con explain(). Se
+        arman con los mismos constructores que los métodos, así no se desfasan.
+        """
+        return [
+            {"name": "registered_after", "filter": self._registered_after_query(2024)},
+            {"name": "last_purchase_in_year", "filter": self._last_purchase_query(2024)},
+            {"name": "buyers_in_location", "filter": self._buyers_in_location_query("formosa")},
+            {"name": "registered_in_company_year", "filter": self._company_year_query("acme", 2024)},
+            *({"name": name, "sort": sort, "limit": 10} for name, sort in self.LISTING_SORTS.items()),
+        ]
+
+    # --- Constructores de filtros ---
+
+    @staticmethod
+    def _registered_after_query(year: int):
+        return { "fecha_registro": { "$gt": datetime(year, 1, 1) } }
+
+    @staticmethod
+    def _last_purchase_query(year: int):
+        return { "ultima_compra": { "$gte": datetime(year, 1, 1), "$lt": datetime(year + 1, 1, 1) } }
+
+    def _buyers_in_location_query(self, location: str):
+        if self.match_mode == MATCH_REGEX:
+            tipo = { "tipo": { "$regex": "^comprador$", "$options": "i" } }
+        else:
+            tipo = text_filter("tipo", "comprador", MATCH_EXACT)
+        return {
+            **tipo,
+            **text_filter("ubicacion", location, self.match_mode)
+        }
+
+    def _company_year_query(self, empresa: str, year: int):
+        return {
+            **text_filter("empresa", empresa, self.match_mode),
+            "fecha_registro": { "$gte": datetime(year, 1, 1), "$lt": datetime(year + 1, 1, 1) }
+        }
 
     async def count_by_type(self):
         pipeline = [{ "$group": { "_id": "$tipo", "count": { "$sum": 1 } } }]
-        result = await self.connector.aggregate("users", pipeline)
-        print( "Result in service count_by_type:", result )
+        result = await self.connector.aggregate(self.collection_name, pipeline)
+        log_result(logger, "count_by_type", result)
         return result
 
     async def total_users(self):
-        result =  await self.connector.count("users")
-        print( "Result in service total_users :", result )
+        result =  await self.connector.count(self.collection_name)
+        log_result(logger, "total_users", result)
         return result
 
     async def users_by_location(self):
         pipeline = [{ "$group": { "_id": "$ubicacion", "count": { "$sum": 1 } } }]
-        result = await self.connector.aggregate("users", pipeline)
-        print( "Result in service users_by_location :", result )
+        result = await self.connector.aggregate(self.collection_name, pipeline)
+        log_result(logger, "users_by_location", result)
         return result
     
     async def users_by_companies(self):
         pipeline = [{ "$group": { "_id": "$empresa", "count": { "$sum": 1 } } }]
-        result = await self.connector.aggregate("users", pipeline)
-        print( "Result in service users_by_location :", result )
+        result = await self.connector.aggregate(self.collection_name, pipeline)
+        log_result(logger, "users_by_location", result)
         return result
     
     async def registered_after(self, year: int):
-        fecha = datetime(year, 1, 1)
-        query = { "fecha_registro": { "$gt": fecha } }
-        result = await self.connector.db["users"].count_documents(query)
-        print("Result in service registered_after:", result)
+        query = self._registered_after_query(year)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "registered_after", result)
         return result
 
     async def last_purchase_in_year(self, year: int):
-        inicio = datetime(year, 1, 1)
-        fin = datetime(year + 1, 1, 1)
-        query = { "ultima_compra": { "$gte": inicio, "$lt": fin } }
-        result = await self.connector.db["users"].count_documents(query)
-        print("Result in service last_purchase_in_year:", result)
+        query = self._last_purchase_query(year)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "last_purchase_in_year", result)
         return result
 
     async def buyers_in_location(self, location: str):
-        query = {
-            "tipo": { "$regex": "^comprador$", "$options": "i" },
-            "ubicacion": { "$regex": location, "$options": "i" }
-        }
-        result = await self.connector.db["users"].count_documents(query)
-        print("Result in service buyers_in_location:", result)
+        query = self._buyers_in_location_query(location)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "buyers_in_location", result)
         return result
     
     async def registered_in_company_year(self, empresa: str, year: int):
-        inicio = datetime(year, 1, 1)
-        fin = datetime(year + 1, 1, 1)
-        query = {
-            "empresa": { "$regex": empresa, "$options": "i" },
-            "fecha_registro": { "$gte": inicio, "$lt": fin }
-        }
-        result = await self.connector.db["users"].count_documents(query)
-        print("Result in service registered_in_company_year:", result)
+        query = self._company_year_query(empresa, year)
+        result = await self.connector.count_documents(self.collection_name, query)
+        log_result(logger, "registered_in_company_year", result)
         return result
 
     async def latest_registered(self, limit: int = 10):
-        cursor = self.connector.db["users"].find().sort("fecha_registro", -1).limit(limit)
-        result = await cursor.to_list(length=None)
-        print("Result in service latest_registered:", result)
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["latest_registered"], sort=self.LISTING_SORTS["latest_registered"], limit=limit
+        )
+        log_result(logger, "latest_registered", result["filas"])
         return result
 
     async def latest_purchases(self, limit: int = 10):
-        cursor = self.connector.db["users"].find().sort("ultima_compra", -1).limit(limit)
-        result = await cursor.to_list(length=None)
-        print("Result in service latest_purchases:", result)
+        result = await find_rows(
+            self.connector, self.collection_name, self.LISTING_COLUMNS["latest_purchases"], sort=self.LISTING_SORTS["latest_purchases"], limit=limit
+        )
+        log_result(logger, "latest_purchases", result["filas"])
         return result
 